@@ -4,38 +4,128 @@ from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
 from flask_mail import Mail
 from flask_migrate import Migrate
-from apscheduler.schedulers.background import BackgroundScheduler
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from .config import Config
+from .db_routing import RoutingSession
 from dotenv import load_dotenv
 import os
 
 dotenv_path = os.path.join(os.path.dirname(__file__), '../.env')
 load_dotenv(dotenv_path)
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 bcrypt = Bcrypt()
 login_manager = LoginManager()
 mail = Mail()
 migrate = Migrate()
 
-def check_document_expirations():
-    app = create_app()
+# Expiry emails/SMS are sent by process_reminders; this daily job only
+# refreshes the compliance alerts, which is a pair of set-based statements.
+def check_document_expirations(app):
     with app.app_context():
-        from .models import Document
-        from .routes import notify_user
+        from .compliance import generate_compliance_alerts
+        from .metrics import JOB_DURATION
 
-        current_time = datetime.utcnow()
-        documents = Document.query.all()
-        for document in documents:
-            if 0 <= (document.end_date - current_time).days <= 10:
-                notify_user(document)
+        with JOB_DURATION.labels("check_document_expirations").time():
+            generate_compliance_alerts()
+            db.session.commit()
+
+# Queues the reminders that are due, then moves its own next run to the
+# earliest next_reminder_at if that comes before the next poll. Polling
+# every REMINDER_POLL_SECONDS picks up documents added by other processes.
+def process_reminders(app, scheduler=None):
+    with app.app_context():
+        from .reminders import next_due, send_due_reminders
+        from .metrics import JOB_DURATION
+
+        with JOB_DURATION.labels("process_reminders").time():
+            send_due_reminders()
+        wake = next_due()
+    if scheduler is None or wake is None:
+        return
+    now = datetime.now(timezone.utc)
+    wake = max(wake.replace(tzinfo=timezone.utc), now)
+    if wake < now + timedelta(seconds=app.config["REMINDER_POLL_SECONDS"]):
+        scheduler.modify_job("reminders", next_run_time=wake)
+
+def generate_document_previews(app):
+    with app.app_context():
+        from .previews import generate_previews
+        from .metrics import JOB_DURATION
+
+        with JOB_DURATION.labels("generate_document_previews").time():
+            generate_previews()
+
+def compress_stored_documents(app):
+    with app.app_context():
+        from .compression import compress_all
+        from .metrics import JOB_DURATION
+
+        with JOB_DURATION.labels("compress_stored_documents").time():
+            compress_all()
+
+def dispatch_outbox(app):
+    with app.app_context():
+        from .outbox import dispatch
+        from .metrics import JOB_DURATION
+
+        with JOB_DURATION.labels("dispatch_outbox").time():
+            dispatch()
+
+def flush_delivery_events(app):
+    with app.app_context():
+        from .delivery import flush_events
+        from .metrics import JOB_DURATION
+
+        with JOB_DURATION.labels("flush_delivery_events").time():
+            flush_events()
+
+def purge_deleted_accounts(app):
+    with app.app_context():
+        from .purge import purge_deleted_accounts as purge
+        from .metrics import JOB_DURATION
+
+        with JOB_DURATION.labels("purge_deleted_accounts").time():
+            purge()
+
+def archive_expired_documents(app):
+    with app.app_context():
+        from .archive import archive_expired
+        from .metrics import JOB_DURATION
+
+        with JOB_DURATION.labels("archive_expired_documents").time():
+            archive_expired()
+
+def reconcile_user_stats(app):
+    with app.app_context():
+        from .counters import reconcile_user_stats as reconcile
+        from .metrics import JOB_DURATION
+
+        with JOB_DURATION.labels("reconcile_user_stats").time():
+            reconcile()
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    if app.config["PROXY_FIX_X_FOR"]:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["PROXY_FIX_X_FOR"])
+
+    from .db_pool import configure_engines, engine_options
+    from . import db_routing, metrics, sql_profiler
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config))
+    if app.config["DATABASE_REPLICA_URLS"]:
+        app.config["SQLALCHEMY_BINDS"] = {
+            **app.config.get("SQLALCHEMY_BINDS", {}),
+            **db_routing.replica_binds(app.config),
+        }
     db.init_app(app)
+    with app.app_context():
+        configure_engines(app, db.engines)
+        db_routing.init_app(app, db.engines)
+        metrics.init_app(app)
+        sql_profiler.init_app(app)
     bcrypt.init_app(app)
     login_manager.init_app(app)
     mail.init_app(app)
@@ -48,13 +138,91 @@ def create_app(config_class=Config):
         from .models import User
         @login_manager.user_loader
         def load_user(user_id):
-            return User.query.get(int(user_id))
+            user = User.query.get(int(user_id))
+            # Deleted accounts are logged out at once, before the purge.
+            return user if user and user.deleted_at is None else None
 
     from .routes import main
     app.register_blueprint(main)
 
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(check_document_expirations, "interval", hours=24)
-    scheduler.start()
+    from . import archive, compression, counters, delivery, outbox, previews, purge, reminders
+    previews.init_app(app)
+    compression.init_app(app)
+    reminders.init_app(app)
+    outbox.init_app(app)
+    delivery.init_app(app)
+    purge.init_app(app)
+    archive.init_app(app)
+    counters.init_app(app)
+
+    if app.config["SCHEDULER_ENABLED"]:
+        start_scheduler(app)
 
-    return app
\ No newline at end of file
+    return app
+
+
+# Only one process per deployment should run the jobs: either a single web
+# process with SCHEDULER_ENABLED=true, or the dedicated scheduler.py process.
+def start_scheduler(app, blocking=False):
+    if blocking:
+        from apscheduler.schedulers.blocking import BlockingScheduler as Scheduler
+    else:
+        from apscheduler.schedulers.background import BackgroundScheduler as Scheduler
+
+    scheduler = Scheduler(timezone=app.config["TIMEZONE"])
+    scheduler.add_job(check_document_expirations, "interval", hours=24, args=[app])
+    scheduler.add_job(
+        process_reminders,
+        "interval",
+        seconds=app.config["REMINDER_POLL_SECONDS"],
+        args=[app, scheduler],
+        id="reminders",
+        next_run_time=datetime.now(timezone.utc),
+        coalesce=True,
+        misfire_grace_time=None,
+    )
+    scheduler.add_job(
+        generate_document_previews,
+        "interval",
+        seconds=app.config["PREVIEW_INTERVAL_SECONDS"],
+        args=[app],
+    )
+    scheduler.add_job(
+        dispatch_outbox,
+        "interval",
+        seconds=app.config["OUTBOX_POLL_SECONDS"],
+        args=[app],
+        coalesce=True,
+    )
+    scheduler.add_job(
+        flush_delivery_events,
+        "interval",
+        seconds=app.config["DELIVERY_FLUSH_SECONDS"],
+        args=[app],
+        coalesce=True,
+    )
+    scheduler.add_job(
+        purge_deleted_accounts,
+        "interval",
+        seconds=app.config["ACCOUNT_PURGE_INTERVAL_SECONDS"],
+        args=[app],
+        coalesce=True,
+    )
+    if app.config["DOCUMENT_ARCHIVE_AFTER_DAYS"]:
+        scheduler.add_job(
+            archive_expired_documents,
+            "interval",
+            seconds=app.config["DOCUMENT_ARCHIVE_INTERVAL_SECONDS"],
+            args=[app],
+            coalesce=True,
+        )
+    scheduler.add_job(
+        reconcile_user_stats,
+        "interval",
+        seconds=app.config["USER_STATS_RECONCILE_INTERVAL_SECONDS"],
+        args=[app],
+        coalesce=True,
+    )
+    scheduler.add_job(compress_stored_documents, "interval", hours=24, args=[app])
+    scheduler.start()
+    return scheduler
\ No newline at end of file
@@ -0,0 +1,98 @@
+import logging
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, insert, literal, select, tuple_
+
+from app import db
+from app.compliance import mark_compliance_stale, superseded
+from app.counters import remove_documents
+from app.models import ArchivedDocument, ComplianceAlert, Document
+
+# Hot/cold split. Documents whose end_date is more than
+# DOCUMENT_ARCHIVE_AFTER_DAYS in the past and that have been replaced by a
+# later document of the same type on the same vehicle move from document to
+# archived_document, DOCUMENT_ARCHIVE_BATCH_SIZE per transaction, so the
+# table every listing, search and expiry scan reads grows with the
+# documents still in use rather than with years of superseded ones.
+# renew_document updates a document in place, so an old end_date on its
+# own usually means a document that was never renewed: that is a live
+# compliance gap, and it stays in the hot table with its alerts. Batches
+# walk the end_date index from the oldest, each starting after the last
+# document the previous one moved. Archived rows keep their id and file
+# (app/storage.py counts them as references); their compliance alerts go,
+# and their history stays as it was.
+
+COLUMNS = [column.name for column in ArchivedDocument.__table__.columns if column.name != "archived_at"]
+
+
+def archivable_query(cutoff, size, after=None):
+    # Superseded documents that ended before cutoff, oldest first, after the
+    # (end_date, id) position after.
+    query = (
+        select(Document.id, Document.end_date)
+        .where(Document.end_date < cutoff, superseded())
+        .order_by(Document.end_date, Document.id)
+        .limit(size)
+    )
+    if after is not None:
+        query = query.where(tuple_(Document.end_date, Document.id) > after)
+    return query
+
+
+def archive_batch(cutoff, size, now=None, after=None):
+    # Moves up to size documents from archivable_query(); returns how many
+    # and the position to pass as after for the next batch.
+    rows = db.session.execute(archivable_query(cutoff, size, after)).all()
+    if not rows:
+        return 0, after
+    ids = [row.id for row in rows]
+    moved = Document.id.in_(ids)
+    remove_documents(moved)
+    mark_compliance_stale(db.session, db.session.scalars(select(Document.user_id).where(moved).distinct()))
+    db.session.execute(
+        insert(ArchivedDocument).from_select(
+            COLUMNS + ["archived_at"],
+            select(*[Document.__table__.c[name] for name in COLUMNS], literal(now or datetime.utcnow(), db.DateTime))
+            .where(moved),
+        )
+    )
+    db.session.execute(
+        delete(ComplianceAlert)
+        .where(ComplianceAlert.document_id.in_(ids))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(delete(Document).where(moved).execution_options(synchronize_session=False))
+    db.session.commit()
+    return len(ids), (rows[-1].end_date, rows[-1].id)
+
+
+def archive_expired(now=None):
+    days = current_app.config["DOCUMENT_ARCHIVE_AFTER_DAYS"]
+    if not days:
+        return 0
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=days)
+    size = current_app.config["DOCUMENT_ARCHIVE_BATCH_SIZE"]
+    total = 0
+    after = None
+    while True:
+        moved, after = archive_batch(cutoff, size, now, after)
+        total += moved
+        if moved < size:
+            break
+    if total:
+        logging.info(f"Archived {total} superseded documents that ended before {cutoff:%Y-%m-%d}")
+    return total
+
+
+def archived_documents_query(*criteria):
+    # Newest first; pass ArchivedDocument.vehicle_id == ... or user_id == ...
+    return select(ArchivedDocument).where(*criteria).order_by(ArchivedDocument.end_date.desc())
+
+
+def init_app(app):
+    @app.cli.command("archive-documents")
+    def archive_documents_command():
+        """Move long-expired documents that were replaced to the archive table."""
+        print(f"Archived {archive_expired()} documents")
@@ -0,0 +1,144 @@
+import logging
+import os
+import time
+from datetime import datetime
+
+import sqlalchemy as sa
+from alembic import op
+
+from app.models import BackfillProgress
+
+# Online schema changes for big tables, for use in migrations. Instead of
+# one ALTER that rewrites or scans the table under an exclusive lock:
+#
+#   add_column()        adds the column as nullable, a catalog-only change,
+#                       and gives rows inserted from then on its default;
+#   backfill()          fills the existing rows in primary-key batches of
+#                       BACKFILL_BATCH_SIZE, each committed on its own and
+#                       followed by a BACKFILL_PAUSE_SECONDS pause. Progress
+#                       is kept in backfill_progress, so a migration that is
+#                       interrupted picks up where it stopped when rerun;
+#   enforce_not_null()  then tightens the column. On PostgreSQL a NOT VALID
+#                       check constraint is validated first, which doesn't
+#                       block writes, so SET NOT NULL needn't scan the table.
+#
+# A batch whose progress wasn't recorded runs again, so backfill values must
+# be safe to apply twice. backfill() commits the schema changes made before
+# it, so on a rerun add_column() and enforce_not_null() skip whatever an
+# earlier run already did, and migrations create backfill_progress only if
+# it isn't there yet.
+
+progress = BackfillProgress.__table__
+
+
+def _quote(name):
+    return op.get_bind().dialect.identifier_preparer.quote(name)
+
+
+def _column(table, name):
+    columns = sa.inspect(op.get_bind()).get_columns(table)
+    return next((column for column in columns if column["name"] == name), None)
+
+
+def add_column(table, column):
+    if _column(table, column.name) is not None:
+        return
+    default = column.server_default
+    column.nullable = True
+    if op.get_bind().dialect.name == "postgresql":
+        # A default in ADD COLUMN rewrites the table before PostgreSQL 11.
+        column.server_default = None
+        op.add_column(table, column)
+        if default is not None:
+            op.alter_column(table, column.name, server_default=default.arg, existing_type=column.type)
+    else:
+        # SQLite stores the default in the schema and fills existing rows
+        # from it without touching them; backfill() then finds nothing to do.
+        op.add_column(table, column)
+
+
+def _resume(bind, name):
+    row = bind.execute(sa.select(progress).where(progress.c.name == name)).first()
+    if row is None:
+        bind.execute(sa.insert(progress).values(name=name, last_id=0, updated_at=datetime.utcnow()))
+        return 0, False
+    return row.last_id, row.completed_at is not None
+
+
+def backfill(table, values, where=None, name=None, key="id", batch_size=None, pause=None):
+    # values maps column names to SQL expressions; where (SQL text) limits
+    # the rows touched, e.g. "notifications_enabled IS NULL". Returns the
+    # number of rows updated by this run.
+    name = name or f"{table}:{','.join(sorted(values))}"
+    batch_size = batch_size or int(os.environ.get("BACKFILL_BATCH_SIZE", 1000))
+    if pause is None:
+        pause = float(os.environ.get("BACKFILL_PAUSE_SECONDS", 0.1))
+    target = sa.table(table, sa.column(key), *(sa.column(column) for column in values))
+    pk = target.c[key]
+
+    total = 0
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        last_id, done = _resume(bind, name)
+        if done:
+            return 0
+        if last_id:
+            logging.info(f"Resuming backfill {name} after {key} {last_id}")
+        while True:
+            upper = bind.scalar(sa.select(pk).where(pk > last_id).order_by(pk).offset(batch_size - 1).limit(1))
+            stmt = sa.update(target).where(pk > last_id).values(values)
+            if upper is not None:
+                stmt = stmt.where(pk <= upper)
+            if where is not None:
+                stmt = stmt.where(sa.text(where))
+            total += bind.execute(stmt).rowcount
+            if upper is None:
+                break
+            last_id = upper
+            bind.execute(
+                sa.update(progress)
+                .where(progress.c.name == name)
+                .values(last_id=last_id, updated_at=datetime.utcnow())
+            )
+            time.sleep(pause)
+        now = datetime.utcnow()
+        bind.execute(
+            sa.update(progress).where(progress.c.name == name).values(updated_at=now, completed_at=now)
+        )
+    logging.info(f"Backfill {name} updated {total} rows")
+    return total
+
+
+def enforce_not_null(table, column, existing_type):
+    nullable = _column(table, column)["nullable"]
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        if nullable:
+            with op.batch_alter_table(table, schema=None) as batch_op:
+                batch_op.alter_column(column, existing_type=existing_type, nullable=False)
+        return
+
+    check = f"{table}_{column}_not_null"
+    drop_check = f"ALTER TABLE {_quote(table)} DROP CONSTRAINT IF EXISTS {_quote(check)}"
+    with op.get_context().autocommit_block():
+        # Each statement commits on its own, so the exclusive locks taken by
+        # ADD CONSTRAINT and SET NOT NULL are short; VALIDATE takes one that
+        # lets reads and writes through while it scans. A run interrupted
+        # part way through may have left the check constraint behind.
+        if nullable:
+            op.execute(drop_check)
+            op.execute(
+                f"ALTER TABLE {_quote(table)} ADD CONSTRAINT {_quote(check)} "
+                f"CHECK ({_quote(column)} IS NOT NULL) NOT VALID"
+            )
+            op.execute(f"ALTER TABLE {_quote(table)} VALIDATE CONSTRAINT {_quote(check)}")
+            op.alter_column(table, column, nullable=False, existing_type=existing_type)
+        op.execute(drop_check)
+
+
+def add_column_with_backfill(table, column, value, **backfill_args):
+    # The three steps for a NOT NULL column whose existing rows get value.
+    existing_type = column.type
+    add_column(table, column)
+    backfill(table, {column.name: value}, where=f"{_quote(column.name)} IS NULL", **backfill_args)
+    enforce_not_null(table, column.name, existing_type)
@@ -0,0 +1,245 @@
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import String, and_, case, cast, event, exists, func, insert, literal, select, update
+from sqlalchemy.orm import Session, aliased
+
+from app import db
+from app.models import ComplianceAlert, Document, Vehicle
+from app.ttl_store import get_store
+
+# Dashboard windows in days; each count is cumulative ("expires within N days").
+EXPIRY_WINDOWS = (7, 30, 90)
+
+# Summaries are cached per process for COMPLIANCE_CACHE_TTL, tagged with
+# the user's version token from the shared store; invalidating replaces the
+# token, so every worker drops its copy on the next read.
+_cache = {}
+_cache_lock = threading.Lock()
+_cache_writes = 0
+
+
+def _count_where(condition):
+    return func.sum(case((condition, 1), else_=0))
+
+
+def _empty_counts():
+    counts = {"expired": 0}
+    counts.update({f"within_{days}": 0 for days in EXPIRY_WINDOWS})
+    return counts
+
+
+def superseded():
+    # A later document of the same type on the same vehicle has replaced
+    # the Document row in the enclosing query.
+    newer = aliased(Document)
+    return exists().where(
+        newer.vehicle_id == Document.vehicle_id,
+        newer.document_type == Document.document_type,
+        newer.end_date > Document.end_date,
+    )
+
+
+def compliance_summary_query(user_id, now):
+    horizon = now + timedelta(days=max(EXPIRY_WINDOWS))
+
+    columns = [_count_where(Document.end_date < now).label("expired")]
+    for days in EXPIRY_WINDOWS:
+        columns.append(
+            _count_where(
+                and_(Document.end_date >= now, Document.end_date < now + timedelta(days=days))
+            ).label(f"within_{days}")
+        )
+
+    # One pass over ix_document_user_id_end_date: only documents that are
+    # expired or expire inside the widest window are touched at all, and
+    # those a newer document has replaced don't count.
+    return (
+        select(
+            Vehicle.id,
+            Vehicle.name,
+            Vehicle.vehicle_number,
+            Document.document_type,
+            *columns,
+        )
+        .join(Vehicle, Document.vehicle_id == Vehicle.id)
+        .where(Document.user_id == user_id, Document.end_date < horizon, ~superseded())
+        .group_by(Vehicle.id, Vehicle.name, Vehicle.vehicle_number, Document.document_type)
+    )
+
+
+def build_compliance_summary(user_id, now=None):
+    now = now or datetime.utcnow()
+    stmt = compliance_summary_query(user_id, now)
+
+    totals = _empty_counts()
+    by_type = {}
+    by_vehicle = {}
+    for row in db.session.execute(stmt):
+        counts = {key: row._mapping[key] or 0 for key in totals}
+        type_counts = by_type.setdefault(row.document_type, _empty_counts())
+        vehicle = by_vehicle.setdefault(
+            row.id,
+            {
+                "id": row.id,
+                "name": row.name,
+                "vehicle_number": row.vehicle_number,
+                "counts": _empty_counts(),
+                "by_type": {},
+            },
+        )
+        vehicle["by_type"][row.document_type] = counts
+        for key, value in counts.items():
+            totals[key] += value
+            type_counts[key] += value
+            vehicle["counts"][key] += value
+
+    vehicles = sorted(
+        by_vehicle.values(),
+        key=lambda v: (-v["counts"]["expired"], -v["counts"]["within_7"], v["name"]),
+    )
+    return {
+        "generated_at": now,
+        "totals": totals,
+        "by_type": dict(sorted(by_type.items())),
+        "vehicles": vehicles,
+    }
+
+
+def _version_key(user_id):
+    return f"compliance-version:{user_id}"
+
+
+def get_compliance_summary(user_id):
+    global _cache_writes
+    ttl = current_app.config["COMPLIANCE_CACHE_TTL"]
+    version = get_store("COMPLIANCE_CACHE_STORE_URL").get(_version_key(user_id))
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(user_id)
+    if cached and cached[0] > now and cached[1] == version:
+        return cached[2]
+
+    summary = build_compliance_summary(user_id)
+    with _cache_lock:
+        _cache_writes += 1
+        if _cache_writes % 256 == 0:
+            for key in [key for key, entry in _cache.items() if entry[0] <= now]:
+                del _cache[key]
+        _cache[user_id] = (now + ttl, version, summary)
+    return summary
+
+
+def open_compliance_alerts(user_id):
+    return (
+        ComplianceAlert.query.filter_by(user_id=user_id, resolved_at=None)
+        .order_by(ComplianceAlert.created_at.desc())
+        .all()
+    )
+
+
+# Opens an alert for every document that is expired or expires within
+# COMPLIANCE_ALERT_WINDOW_DAYS, hasn't been replaced by a newer one and has
+# no open alert yet, then resolves open alerts whose document has moved out
+# of the window or been replaced. Both steps are single set-based
+# statements; the caller commits.
+def generate_compliance_alerts(now=None):
+    now = now or datetime.utcnow()
+    horizon = now + timedelta(days=current_app.config["COMPLIANCE_ALERT_WINDOW_DAYS"])
+
+    expiry_date = func.substr(cast(Document.end_date, String), 1, 10)
+    message = func.substr(
+        Document.document_type
+        + " for "
+        + Vehicle.name
+        + " ("
+        + Vehicle.vehicle_number
+        + ")"
+        + case((Document.end_date < now, " expired on "), else_=" expires on ")
+        + expiry_date,
+        1,
+        250,
+    )
+    has_open_alert = exists().where(
+        ComplianceAlert.document_id == Document.id,
+        ComplianceAlert.resolved_at.is_(None),
+    )
+    due = (
+        select(Document.user_id, Document.id, message, literal(now, db.DateTime))
+        .join(Vehicle, Document.vehicle_id == Vehicle.id)
+        .where(Document.end_date < horizon, ~superseded(), ~has_open_alert)
+    )
+    created = db.session.execute(
+        insert(ComplianceAlert).from_select(
+            ["user_id", "document_id", "message", "created_at"], due
+        )
+    ).rowcount
+
+    no_longer_due = select(Document.id).where((Document.end_date >= horizon) | superseded())
+    resolved = db.session.execute(
+        update(ComplianceAlert)
+        .where(
+            ComplianceAlert.resolved_at.is_(None),
+            ComplianceAlert.document_id.in_(no_longer_due),
+        )
+        .values(resolved_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    return created, resolved
+
+
+def resolve_compliance_alerts(document_id, now=None):
+    return db.session.execute(
+        update(ComplianceAlert)
+        .where(
+            ComplianceAlert.document_id == document_id,
+            ComplianceAlert.resolved_at.is_(None),
+        )
+        .values(resolved_at=now or datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def invalidate_compliance_summary(*user_ids):
+    # The token outlives any entry cached under the one it replaces, so an
+    # expired token can't make an old entry look current again.
+    store = get_store("COMPLIANCE_CACHE_STORE_URL")
+    ttl = current_app.config["COMPLIANCE_CACHE_TTL"]
+    for user_id in set(user_ids):
+        store.set(_version_key(user_id), secrets.token_hex(8), ttl)
+        with _cache_lock:
+            _cache.pop(user_id, None)
+
+
+def mark_compliance_stale(session, user_ids):
+    # For bulk statements that bypass the ORM events below; the summaries
+    # are invalidated once the session commits.
+    session.info.setdefault("compliance_stale", set()).update(user_ids)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_document_writes(session, flush_context):
+    users = {
+        obj.user_id
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if isinstance(obj, Document)
+    }
+    if users:
+        mark_compliance_stale(session, users)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    # After the commit, so no worker can rebuild from the old rows and
+    # cache them under the new token.
+    users = session.info.pop("compliance_stale", None)
+    if users:
+        invalidate_compliance_summary(*users)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("compliance_stale", None)
@@ -0,0 +1,118 @@
+import logging
+import os
+
+from flask import current_app
+from sqlalchemy import and_, func, or_, select, update
+
+from app import db
+from app.models import Document
+from app.storage import COMPRESSIBLE_TYPES, SUFFIXES, get_store, readable_encodings
+
+# Background recompression of stored document files. Documents uploaded
+# before compression was enabled (file_encoding NULL), and gzip files once
+# zstandard is installed, are re-stored with the current codec; the result
+# is written to every document sharing the file, like preview_status in
+# app/previews.py. zstd files can't be read without zstandard, so they are
+# left as they are until it is installed.
+
+
+def _pending(codec):
+    pending = Document.file_encoding.is_(None)
+    if codec:
+        pending = or_(pending, and_(
+            Document.file_mimetype.in_(COMPRESSIBLE_TYPES),
+            Document.file_encoding.notin_((codec, "identity")),
+            Document.file_encoding.in_(readable_encodings()),
+        ))
+    return pending
+
+
+def compress_documents(limit=None):
+    # Returns {"files", "before_bytes", "after_bytes"} for this batch.
+    limit = limit or current_app.config["DOCUMENT_COMPRESSION_BATCH_SIZE"]
+    store = get_store()
+    pending = db.session.execute(
+        select(Document.file_path, Document.file_mimetype)
+        .where(Document.file_path.isnot(None), _pending(store.codec))
+        .distinct()
+        .limit(limit)
+    ).all()
+
+    stats = {"files": 0, "before_bytes": 0, "after_bytes": 0}
+    for digest, mimetype in pending:
+        try:
+            encoding, before, after = store.recompress(digest, mimetype)
+        except Exception as e:
+            logging.warning(f"Could not recompress stored file {digest}: {e}")
+            encoding, before, after = None, 0, 0
+        if encoding is None:
+            # Missing or unreadable: don't pick it up again every batch.
+            encoding = "identity"
+        db.session.execute(
+            update(Document)
+            .where(Document.file_path == digest)
+            .values(file_encoding=encoding)
+        )
+        stats["files"] += 1
+        stats["before_bytes"] += before
+        stats["after_bytes"] += after
+    db.session.commit()
+    return stats
+
+
+def compress_all():
+    totals = {"files": 0, "before_bytes": 0, "after_bytes": 0}
+    while True:
+        stats = compress_documents()
+        if not stats["files"]:
+            return totals
+        for key, value in stats.items():
+            totals[key] += value
+
+
+def storage_report():
+    # Original vs on-disk bytes per encoding, one entry per distinct file.
+    store = get_store()
+    rows = db.session.execute(
+        select(Document.file_path, func.max(Document.file_size), func.max(Document.file_encoding))
+        .where(Document.file_path.isnot(None))
+        .group_by(Document.file_path)
+    ).all()
+    report = {}
+    for digest, size, encoding in rows:
+        path, stored_as = store.locate(digest)
+        if path is None:
+            continue
+        entry = report.setdefault(stored_as, {"files": 0, "original_bytes": 0, "stored_bytes": 0})
+        entry["files"] += 1
+        entry["original_bytes"] += size or 0
+        entry["stored_bytes"] += os.path.getsize(path)
+    return report
+
+
+def _mb(n):
+    return f"{n / (1024 * 1024):.1f} MB"
+
+
+def init_app(app):
+    @app.cli.command("compress-documents")
+    def compress_documents_command():
+        """Recompress stored document files and report the bytes saved."""
+        stats = compress_all()
+        saved = stats["before_bytes"] - stats["after_bytes"]
+        print(f"Recompressed {stats['files']} files, saved {_mb(saved)}")
+
+    @app.cli.command("document-storage-report")
+    def document_storage_report_command():
+        """Show how much disk the document store saves by compressing."""
+        report = storage_report()
+        original = sum(entry["original_bytes"] for entry in report.values())
+        stored = sum(entry["stored_bytes"] for entry in report.values())
+        for encoding in sorted(report, key=lambda e: list(SUFFIXES).index(e)):
+            entry = report[encoding]
+            print(
+                f"{encoding:<9} {entry['files']:>6} files  {_mb(entry['original_bytes']):>10} "
+                f"-> {_mb(entry['stored_bytes']):>10}"
+            )
+        ratio = f" ({(original - stored) / original:.0%})" if original else ""
+        print(f"Saved {_mb(original - stored)} of {_mb(original)}{ratio}")
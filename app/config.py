@@ -3,15 +3,113 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+
+def _env_int(name):
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+def _env_bool(name):
+    value = os.environ.get(name)
+    return value.lower() == "true" if value else None
+
+
+def _env_list(name, default=()):
+    value = os.environ.get(name)
+    if value is None:
+        return tuple(default)
+    return tuple(item.strip() for item in value.split(",") if item.strip())
+
+
 class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY") or "Forget-and-Forgive"
     SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Connection pool settings; unset values fall back to the defaults
+    # in app/db_pool.py. DB_POOL_MODE=transaction is for running
+    # behind PgBouncer in transaction pooling mode.
+    DB_POOL_MODE = os.environ.get("DB_POOL_MODE", "session")
+    DB_POOL_SIZE = _env_int("DB_POOL_SIZE")
+    DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW")
+    DB_POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT")
+    DB_POOL_RECYCLE = _env_int("DB_POOL_RECYCLE")
+    DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING")
+    DB_STATEMENT_TIMEOUT_MS = _env_int("DB_STATEMENT_TIMEOUT_MS")
+
+    # Comma-separated read replica URLs; GETs to DB_REPLICA_ENDPOINTS read
+    # from them (see app/db_routing.py). A user who just wrote reads from
+    # the primary for DB_READ_YOUR_WRITES_SECONDS.
+    DATABASE_REPLICA_URLS = _env_list("DATABASE_REPLICA_URLS")
+    DB_REPLICA_ENDPOINTS = _env_list("DB_REPLICA_ENDPOINTS", (
+        "main.home",
+        "main.list_vehicles",
+        "main.view_vehicle",
+        "main.profile",
+        "main.view_logs",
+        "main.view_feedbacks",
+        "main.compliance_dashboard",
+    ))
+    DB_READ_YOUR_WRITES_SECONDS = float(os.environ.get("DB_READ_YOUR_WRITES_SECONDS", 5))
     TIMEZONE = os.environ.get("TIMEZONE", "UTC")
 
-    MAIL_SERVER = "smtp.gmail.com"
-    MAIL_PORT = 587
-    MAIL_USE_TLS = True
+    # Off by default so gunicorn workers and CLI commands don't each start
+    # their own copy of the background jobs; see scheduler.py.
+    SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "false").lower() == "true"
+
+    # /metrics serves Prometheus text; set PROMETHEUS_MULTIPROC_DIR when
+    # running several gunicorn workers (see gunicorn.conf.py).
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+    READINESS_CACHE_SECONDS = float(os.environ.get("READINESS_CACHE_SECONDS", 5))
+
+    # Per-request SQL profiling; statements slower than SLOW_QUERY_MS are
+    # logged with their parameters redacted. The summary header is always
+    # sent in debug mode.
+    SQL_PROFILER_ENABLED = os.environ.get("SQL_PROFILER_ENABLED", "false").lower() == "true"
+    SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 200))
+    SQL_PROFILER_HEADER = os.environ.get("SQL_PROFILER_HEADER", "false").lower() == "true"
+
+    # Scanned document files (app/storage.py); relative paths are inside
+    # the instance folder. With a front-end proxy serving the store
+    # directly, set USE_X_SENDFILE (Apache/lighttpd) or
+    # DOCUMENT_ACCEL_REDIRECT_PREFIX (nginx internal location).
+    DOCUMENT_STORE_PATH = os.environ.get("DOCUMENT_STORE_PATH", "documents")
+    DOCUMENT_MAX_BYTES = int(os.environ.get("DOCUMENT_MAX_BYTES", 20 * 1024 * 1024))
+    # Room for the multipart envelope around the largest allowed file.
+    MAX_CONTENT_LENGTH = DOCUMENT_MAX_BYTES + 64 * 1024
+    DOCUMENT_ACCEL_REDIRECT_PREFIX = os.environ.get("DOCUMENT_ACCEL_REDIRECT_PREFIX")
+    USE_X_SENDFILE = os.environ.get("USE_X_SENDFILE", "false").lower() == "true"
+    # "auto" is zstd when the zstandard package is installed, else gzip;
+    # "none" stores files as uploaded. Only PDFs are compressed.
+    DOCUMENT_COMPRESSION = os.environ.get("DOCUMENT_COMPRESSION", "auto")
+    DOCUMENT_COMPRESSION_MIN_SAVING = float(os.environ.get("DOCUMENT_COMPRESSION_MIN_SAVING", 0.05))
+    DOCUMENT_COMPRESSION_BATCH_SIZE = int(os.environ.get("DOCUMENT_COMPRESSION_BATCH_SIZE", 200))
+    # Thumbnail/preview rendering (app/previews.py); sizes are the longest
+    # side in pixels.
+    THUMBNAIL_SIZE = int(os.environ.get("THUMBNAIL_SIZE", 160))
+    PREVIEW_SIZE = int(os.environ.get("PREVIEW_SIZE", 1024))
+    PREVIEW_POOL_SIZE = int(os.environ.get("PREVIEW_POOL_SIZE", 2))
+    PREVIEW_BATCH_SIZE = int(os.environ.get("PREVIEW_BATCH_SIZE", 50))
+    PREVIEW_TIMEOUT = float(os.environ.get("PREVIEW_TIMEOUT", 60))
+    PREVIEW_INTERVAL_SECONDS = int(os.environ.get("PREVIEW_INTERVAL_SECONDS", 60))
+
+    # Expiry reminders (app/reminders.py) go out this many days before a
+    # document's end date, at REMINDER_HOUR in TIMEZONE. After changing the
+    # thresholds run "flask schedule-reminders".
+    REMINDER_THRESHOLDS_DAYS = tuple(int(d) for d in _env_list("REMINDER_THRESHOLDS_DAYS", ("30", "10", "3", "0")))
+    REMINDER_HOUR = int(os.environ.get("REMINDER_HOUR", 9))
+    REMINDER_POLL_SECONDS = int(os.environ.get("REMINDER_POLL_SECONDS", 300))
+    REMINDER_BATCH_SIZE = int(os.environ.get("REMINDER_BATCH_SIZE", 100))
+
+    COMPLIANCE_ALERT_WINDOW_DAYS = int(os.environ.get("COMPLIANCE_ALERT_WINDOW_DAYS", 10))
+    COMPLIANCE_CACHE_TTL = int(os.environ.get("COMPLIANCE_CACHE_TTL", 300))
+    COMPLIANCE_DASHBOARD_VEHICLE_LIMIT = int(os.environ.get("COMPLIANCE_DASHBOARD_VEHICLE_LIMIT", 200))
+
+    # Point MAIL_SERVER/TWILIO_API_BASE_URL at the stand-ins in
+    # benchmarks/notifications.py to exercise sending locally.
+    MAIL_SERVER = os.environ.get("MAIL_SERVER", "smtp.gmail.com")
+    MAIL_PORT = int(os.environ.get("MAIL_PORT", 587))
+    MAIL_USE_TLS = os.environ.get("MAIL_USE_TLS", "true").lower() == "true"
     MAIL_USERNAME = os.environ.get("EMAIL_USER")
     MAIL_PASSWORD = os.environ.get("EMAIL_PASS")
     MAIL_DEFAULT_SENDER = os.environ.get("MAIL_DEFAULT_SENDER")
@@ -19,5 +117,104 @@ class Config:
     TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID')
     TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN')
     TWILIO_PHONE_NUMBER = os.environ.get('TWILIO_PHONE_NUMBER')
+    TWILIO_API_BASE_URL = os.environ.get("TWILIO_API_BASE_URL")
+    TWILIO_TIMEOUT = float(os.environ.get("TWILIO_TIMEOUT", 30))
+    # Counterpart of Flask-Mail's MAIL_SUPPRESS_SEND for benchmarks and local runs.
+    SMS_SUPPRESS_SEND = os.environ.get("SMS_SUPPRESS_SEND", "false").lower() == "true"
+    # Provider ceilings in sends per second (fractions allowed, e.g. 0.5),
+    # shared by every process through RATELIMIT_STORE_URL. Queued reminders
+    # may use BULK_SEND_SHARE of each, less one send kept for OTPs.
+    SEND_RATE_LIMITS = {
+        "smtp": float(os.environ.get("SMTP_SENDS_PER_SECOND", 10)),
+        "twilio": float(os.environ.get("TWILIO_SENDS_PER_SECOND", 1)),
+    }
+    BULK_SEND_SHARE = float(os.environ.get("BULK_SEND_SHARE", 0.8))
+    # Reminders are queued (app/outbox.py) for the user's local delivery
+    # window, spread over up to DELIVERY_SPREAD_MINUTES from its start, and
+    # sent by a dispatcher every OUTBOX_POLL_SECONDS. TIMEZONE applies to
+    # users who haven't chosen one.
+    DELIVERY_WINDOW_START_HOUR = int(os.environ.get("DELIVERY_WINDOW_START_HOUR", 9))
+    DELIVERY_WINDOW_END_HOUR = int(os.environ.get("DELIVERY_WINDOW_END_HOUR", 20))
+    DELIVERY_SPREAD_MINUTES = int(os.environ.get("DELIVERY_SPREAD_MINUTES", 120))
+    OUTBOX_POLL_SECONDS = int(os.environ.get("OUTBOX_POLL_SECONDS", 10))
+    OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", 200))
+    OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", 5))
+    OUTBOX_RETRY_DELAY = int(os.environ.get("OUTBOX_RETRY_DELAY", 300))
+    OUTBOX_CLAIM_TIMEOUT = int(os.environ.get("OUTBOX_CLAIM_TIMEOUT", 600))
+    # Provider delivery callbacks (app/delivery.py) are accepted at
+    # /notifications/status/<channel>?token=DELIVERY_CALLBACK_TOKEN; unset
+    # disables the endpoint. Twilio is told where to post when
+    # TWILIO_STATUS_CALLBACK_URL is set. Twilio errors in
+    # SMS_HARD_BOUNCE_CODES (invalid number, unsubscribed, landline...) and
+    # email bounces stop further reminders to that recipient.
+    DELIVERY_CALLBACK_TOKEN = os.environ.get("DELIVERY_CALLBACK_TOKEN")
+    # Callbacks are staged and applied every DELIVERY_FLUSH_SECONDS in
+    # batches of DELIVERY_CALLBACK_BATCH_SIZE.
+    DELIVERY_CALLBACK_BATCH_SIZE = int(os.environ.get("DELIVERY_CALLBACK_BATCH_SIZE", 500))
+    DELIVERY_FLUSH_SECONDS = int(os.environ.get("DELIVERY_FLUSH_SECONDS", 5))
+    TWILIO_STATUS_CALLBACK_URL = os.environ.get("TWILIO_STATUS_CALLBACK_URL")
+    SMS_HARD_BOUNCE_CODES = tuple(
+        int(c) for c in _env_list("SMS_HARD_BOUNCE_CODES", ("21211", "21610", "21614", "30005", "30006"))
+    )
+    # Account deletion (app/purge.py) hides the account at once; accounts
+    # with up to ACCOUNT_DELETE_SYNC_LIMIT documents are purged in the
+    # request, bigger ones by a job every ACCOUNT_PURGE_INTERVAL_SECONDS,
+    # ACCOUNT_PURGE_BATCH_SIZE rows per transaction.
+    ACCOUNT_DELETE_SYNC_LIMIT = int(os.environ.get("ACCOUNT_DELETE_SYNC_LIMIT", 2000))
+    ACCOUNT_PURGE_BATCH_SIZE = int(os.environ.get("ACCOUNT_PURGE_BATCH_SIZE", 1000))
+    ACCOUNT_PURGE_INTERVAL_SECONDS = int(os.environ.get("ACCOUNT_PURGE_INTERVAL_SECONDS", 300))
+    # Documents whose end_date is more than DOCUMENT_ARCHIVE_AFTER_DAYS in
+    # the past and that a later document of the same type on the same
+    # vehicle has replaced are moved to archived_document (app/archive.py)
+    # by a job every DOCUMENT_ARCHIVE_INTERVAL_SECONDS,
+    # DOCUMENT_ARCHIVE_BATCH_SIZE per transaction. Expired documents that
+    # were never replaced stay put. 0 disables archiving.
+    DOCUMENT_ARCHIVE_AFTER_DAYS = int(os.environ.get("DOCUMENT_ARCHIVE_AFTER_DAYS", 365))
+    DOCUMENT_ARCHIVE_BATCH_SIZE = int(os.environ.get("DOCUMENT_ARCHIVE_BATCH_SIZE", 1000))
+    DOCUMENT_ARCHIVE_INTERVAL_SECONDS = int(os.environ.get("DOCUMENT_ARCHIVE_INTERVAL_SECONDS", 3600))
+    # Per-user counts (app/counters.py). "Expired" means ended before the
+    # day of the last reconciliation, "expiring" ending within
+    # USER_STATS_EXPIRING_DAYS of it. Reconciliation runs every
+    # USER_STATS_RECONCILE_INTERVAL_SECONDS, USER_STATS_RECONCILE_BATCH_SIZE
+    # users per transaction.
+    USER_STATS_EXPIRING_DAYS = int(os.environ.get("USER_STATS_EXPIRING_DAYS", 30))
+    USER_STATS_RECONCILE_BATCH_SIZE = int(os.environ.get("USER_STATS_RECONCILE_BATCH_SIZE", 500))
+    USER_STATS_RECONCILE_INTERVAL_SECONDS = int(os.environ.get("USER_STATS_RECONCILE_INTERVAL_SECONDS", 3600))
+    # Transient failures (connection errors, SMTP 4xx) are retried with
+    # jittered exponential backoff starting at NOTIFICATION_RETRY_BACKOFF
+    # seconds. SMS are only retried after a 429 or a failed connect, since a
+    # 5xx may come after Twilio accepted the message.
+    NOTIFICATION_MAX_ATTEMPTS = int(os.environ.get("NOTIFICATION_MAX_ATTEMPTS", 3))
+    NOTIFICATION_RETRY_BACKOFF = float(os.environ.get("NOTIFICATION_RETRY_BACKOFF", 0.5))
+
+    BCRYPT_LOG_ROUNDS = int(os.environ.get("BCRYPT_LOG_ROUNDS", 12))
+    # bcrypt runs in a process pool so it doesn't hold the GIL of the
+    # request worker. PASSWORD_HASH_POOL_SIZE is the number of hashing
+    # processes for the host, split between the WEB_CONCURRENCY gunicorn
+    # workers (at least one each); 0 hashes inline. A hash that doesn't
+    # finish within PASSWORD_HASH_TIMEOUT seconds fails the request with a
+    # retryable 503.
+    PASSWORD_HASH_POOL_SIZE = int(os.environ.get("PASSWORD_HASH_POOL_SIZE", 2))
+    WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", 1))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get("PASSWORD_HASH_TIMEOUT", 10))
+
+    OTP_STORE_URL = os.environ.get("OTP_STORE_URL", "sqlite:///ttl_store.db")
+    OTP_TTL = int(os.environ.get("OTP_TTL", 600))
+    OTP_MAX_ATTEMPTS = int(os.environ.get("OTP_MAX_ATTEMPTS", 3))
+
+    RATELIMIT_ENABLED = os.environ.get("RATELIMIT_ENABLED", "true").lower() == "true"
+    RATELIMIT_STORE_URL = os.environ.get("RATELIMIT_STORE_URL", OTP_STORE_URL)
+    # Per-user versions of the cached compliance dashboards, so a write in
+    # one worker invalidates the copies cached by every other worker.
+    COMPLIANCE_CACHE_STORE_URL = os.environ.get("COMPLIANCE_CACHE_STORE_URL", OTP_STORE_URL)
+    RATELIMIT_PER_IP = os.environ.get("RATELIMIT_PER_IP", "20/minute")
+    # Login and password recovery count per email and client address.
+    RATELIMIT_PER_ACCOUNT = os.environ.get("RATELIMIT_PER_ACCOUNT", "5/15minutes")
+    # Shared by every client, so only a backstop against floods from many
+    # addresses; keep it well above normal peak traffic.
+    RATELIMIT_PER_ROUTE = os.environ.get("RATELIMIT_PER_ROUTE", "3000/minute")
+    # Number of proxies in front of the app whose X-Forwarded-For is trusted,
+    # so per-IP limits see the client address rather than the proxy's.
+    PROXY_FIX_X_FOR = int(os.environ.get("PROXY_FIX_X_FOR", 0))
 
     SECURITY_PASSWORD_SALT = os.environ.get("SECURITY_PASSWORD_SALT") or "this-is-my-salt"
\ No newline at end of file
@@ -0,0 +1,201 @@
+import logging
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, bindparam, case, event, exists, func, insert, inspect, literal, select, update
+from sqlalchemy.orm import Session
+
+from app import db
+from app.metrics import USER_STATS_DRIFT
+from app.models import Document, User, UserStats, Vehicle
+
+# Per-user counts: vehicles, documents, documents that ended before
+# expired_before and documents ending from then until expiring_before.
+# Every flush that adds or removes a vehicle or document, or moves a
+# document's end_date, adjusts the user's user_stats row on the same
+# connection, so the counts commit or roll back with the change. Bulk
+# DELETEs that bypass the ORM call remove_documents() or remove_vehicle()
+# first. The two dates only move forward when reconcile_user_stats()
+# recounts a batch of users, which also repairs any drift.
+
+stats = UserStats.__table__
+
+
+def count_dates(now=None):
+    # expired_before and expiring_before: midnight, so every reconciliation
+    # on the same day uses the same dates.
+    today = (now or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+    return today, today + timedelta(days=current_app.config["USER_STATS_EXPIRING_DAYS"])
+
+
+def _expired(name):
+    return case((bindparam(name, type_=db.DateTime) < stats.c.expired_before, 1), else_=0)
+
+
+def _expiring(name):
+    end_date = bindparam(name, type_=db.DateTime)
+    return case((and_(end_date >= stats.c.expired_before, end_date < stats.c.expiring_before), 1), else_=0)
+
+
+_adjust = (
+    update(stats)
+    .where(stats.c.user_id == bindparam("uid"))
+    .values(
+        vehicle_count=stats.c.vehicle_count + bindparam("vehicles"),
+        document_count=stats.c.document_count + bindparam("documents"),
+        expired_count=stats.c.expired_count + _expired("added_end") - _expired("removed_end"),
+        expiring_count=stats.c.expiring_count + _expiring("added_end") - _expiring("removed_end"),
+    )
+)
+
+
+def _change(user_id, vehicles=0, documents=0, added_end=None, removed_end=None):
+    return {
+        "uid": user_id,
+        "vehicles": vehicles,
+        "documents": documents,
+        "added_end": added_end,
+        "removed_end": removed_end,
+    }
+
+
+@event.listens_for(Session, "after_flush")
+def _count_changes(session, flush_context):
+    users = []
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, User):
+            expired_before, expiring_before = count_dates()
+            users.append({"user_id": obj.id, "expired_before": expired_before, "expiring_before": expiring_before})
+        elif isinstance(obj, Vehicle):
+            changes.append(_change(obj.user_id, vehicles=1))
+        elif isinstance(obj, Document):
+            changes.append(_change(obj.user_id, documents=1, added_end=obj.end_date))
+    for obj in session.dirty:
+        if isinstance(obj, Document):
+            end_date = inspect(obj).attrs.end_date.history
+            if end_date.added and end_date.deleted:
+                changes.append(_change(obj.user_id, added_end=end_date.added[0], removed_end=end_date.deleted[0]))
+    for obj in session.deleted:
+        if isinstance(obj, Vehicle):
+            changes.append(_change(obj.user_id, vehicles=-1))
+        elif isinstance(obj, Document):
+            changes.append(_change(obj.user_id, documents=-1, removed_end=obj.end_date))
+    if users:
+        session.connection().execute(insert(stats), users)
+    if changes:
+        session.connection().execute(_adjust, changes)
+
+
+def remove_documents(criterion):
+    # For bulk DELETEs of documents; run it before the delete.
+    gone = select(func.count()).select_from(Document).where(criterion, Document.user_id == stats.c.user_id)
+    return db.session.execute(
+        update(stats)
+        .where(stats.c.user_id.in_(select(Document.user_id).where(criterion)))
+        .values(
+            document_count=stats.c.document_count - gone.scalar_subquery(),
+            expired_count=stats.c.expired_count
+            - gone.where(Document.end_date < stats.c.expired_before).scalar_subquery(),
+            expiring_count=stats.c.expiring_count
+            - gone.where(
+                Document.end_date >= stats.c.expired_before, Document.end_date < stats.c.expiring_before
+            ).scalar_subquery(),
+        )
+    ).rowcount
+
+
+def remove_vehicle(vehicle_id):
+    # For the bulk vehicle delete in app/purge.py; run it before the delete.
+    remove_documents(Document.vehicle_id == vehicle_id)
+    db.session.execute(
+        update(stats)
+        .where(stats.c.user_id.in_(select(Vehicle.user_id).where(Vehicle.id == vehicle_id)))
+        .values(vehicle_count=stats.c.vehicle_count - 1)
+    )
+
+
+def get_user_stats(user_id):
+    return db.session.get(UserStats, user_id)
+
+
+def _counts(user_id, expired_before, expiring_before):
+    documents = select(func.count(Document.id)).where(Document.user_id == user_id)
+    return {
+        "vehicle_count": select(func.count(Vehicle.id)).where(Vehicle.user_id == user_id).scalar_subquery(),
+        "document_count": documents.scalar_subquery(),
+        "expired_count": documents.where(Document.end_date < expired_before).scalar_subquery(),
+        "expiring_count": documents.where(
+            Document.end_date >= expired_before, Document.end_date < expiring_before
+        ).scalar_subquery(),
+    }
+
+
+def reconcile_batch(user_ids, now=None):
+    # Recounts these users in one transaction; returns how many had drifted.
+    now = now or datetime.utcnow()
+    expired_before, expiring_before = count_dates(now)
+    counts = _counts(stats.c.user_id, expired_before, expiring_before)
+    drifted = db.session.scalar(
+        select(func.count())
+        .select_from(stats)
+        .where(
+            stats.c.user_id.in_(user_ids),
+            (stats.c.vehicle_count != counts["vehicle_count"])
+            | (stats.c.document_count != counts["document_count"])
+            | and_(
+                stats.c.expired_before == expired_before,
+                stats.c.expiring_before == expiring_before,
+                (stats.c.expired_count != counts["expired_count"])
+                | (stats.c.expiring_count != counts["expiring_count"]),
+            ),
+        )
+    )
+    dates = {"expired_before": expired_before, "expiring_before": expiring_before}
+    db.session.execute(
+        update(stats)
+        .where(stats.c.user_id.in_(user_ids))
+        .values(**counts, **dates, reconciled_at=now)
+    )
+    missing = _counts(User.id, expired_before, expiring_before)
+    drifted += db.session.execute(
+        insert(stats).from_select(
+            ["user_id", *missing, *dates, "reconciled_at"],
+            select(
+                User.id,
+                *missing.values(),
+                *(literal(value, db.DateTime) for value in dates.values()),
+                literal(now, db.DateTime),
+            ).where(User.id.in_(user_ids), ~exists().where(stats.c.user_id == User.id)),
+        )
+    ).rowcount
+    db.session.commit()
+    return drifted
+
+
+def reconcile_user_stats(now=None):
+    # Walks every live account by id, USER_STATS_RECONCILE_BATCH_SIZE at a
+    # time. A count written by a transaction that commits while its batch
+    # is recounted can be lost; the next run puts it right.
+    size = current_app.config["USER_STATS_RECONCILE_BATCH_SIZE"]
+    after = 0
+    drifted = 0
+    while True:
+        user_ids = db.session.scalars(
+            select(User.id).where(User.id > after, User.deleted_at.is_(None)).order_by(User.id).limit(size)
+        ).all()
+        if not user_ids:
+            break
+        drifted += reconcile_batch(user_ids, now)
+        after = user_ids[-1]
+    if drifted:
+        USER_STATS_DRIFT.inc(drifted)
+        logging.warning(f"Repaired counts for {drifted} users")
+    return drifted
+
+
+def init_app(app):
+    @app.cli.command("reconcile-user-stats")
+    def reconcile_user_stats_command():
+        """Recount every user's vehicles and documents."""
+        print(f"Repaired counts for {reconcile_user_stats()} users")
@@ -0,0 +1,59 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Defaults for server databases, overridable with the DB_POOL_* settings.
+# Pool sizes are per worker process: size * workers (+ overflow) must stay
+# below the server's connection limit. The pools are instrumented through
+# pool events in app/metrics.py.
+POOL_DEFAULTS = {
+    "pool_size": 5,
+    "max_overflow": 10,
+    "pool_timeout": 30,
+    "pool_recycle": 1800,
+    "pool_pre_ping": True,
+}
+
+
+def _transaction_pooling(config):
+    return config["DB_POOL_MODE"] == "transaction"
+
+
+def engine_options(config, url=None):
+    url = make_url(url or config["SQLALCHEMY_DATABASE_URI"])
+    backend = url.get_backend_name()
+    if backend == "sqlite":
+        # Flask-SQLAlchemy picks a suitable pool for SQLite on its own.
+        return {}
+
+    options = dict(POOL_DEFAULTS)
+    for option, key in (
+        ("pool_size", "DB_POOL_SIZE"),
+        ("max_overflow", "DB_MAX_OVERFLOW"),
+        ("pool_timeout", "DB_POOL_TIMEOUT"),
+        ("pool_recycle", "DB_POOL_RECYCLE"),
+        ("pool_pre_ping", "DB_POOL_PRE_PING"),
+    ):
+        if config[key] is not None:
+            options[option] = config[key]
+
+    timeout = config["DB_STATEMENT_TIMEOUT_MS"]
+    if backend == "postgresql" and timeout and not _transaction_pooling(config):
+        # PgBouncer rejects startup options, so transaction pooling sets the
+        # timeout per transaction instead (see configure_engines).
+        options["connect_args"] = {"options": f"-c statement_timeout={int(timeout)}"}
+    return options
+
+
+def configure_engines(app, engines):
+    timeout = app.config["DB_STATEMENT_TIMEOUT_MS"]
+    for engine in engines.values():
+        if (
+            engine.dialect.name == "postgresql"
+            and timeout
+            and _transaction_pooling(app.config)
+        ):
+            def set_local_timeout(conn, timeout=int(timeout)):
+                conn.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout}")
+
+            event.listen(engine, "begin", set_local_timeout)
+
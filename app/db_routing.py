@@ -0,0 +1,102 @@
+import random
+import sqlite3
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy.engine import make_url
+
+from app.db_pool import engine_options
+
+# Read-replica routing. SELECTs issued while serving a GET to one of
+# DB_REPLICA_ENDPOINTS go to a replica picked once per request; flushes,
+# DML and everything else go to the primary. Once a request has written,
+# the rest of it reads from the primary too, and the user's following
+# requests are pinned to the primary for DB_READ_YOUR_WRITES_SECONDS so
+# they never see a replica that is behind their own change.
+
+REPLICA_PREFIX = "replica_"
+_PRIMARY_UNTIL = "_db_primary_until"
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or (clause is not None and not getattr(clause, "is_select", False)):
+                self.info["wrote"] = True
+                if has_request_context():
+                    g.db_wrote = True
+            elif not self.info.get("wrote") and has_request_context():
+                replica = g.get("db_replica")
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_binds(config):
+    binds = {}
+    for i, url in enumerate(config["DATABASE_REPLICA_URLS"], start=1):
+        binds[f"{REPLICA_PREFIX}{i}"] = {"url": url, **engine_options(config, url)}
+    return binds
+
+
+def _choose_replica():
+    g.db_replica = None
+    replicas = current_app.extensions.get("db_replicas")
+    if not replicas or request.method not in ("GET", "HEAD"):
+        return
+    if request.endpoint not in current_app.config["DB_REPLICA_ENDPOINTS"]:
+        return
+    if session.get(_PRIMARY_UNTIL, 0) > time.time():
+        return
+    g.db_replica = random.choice(replicas)
+
+
+def _remember_write(response):
+    window = current_app.config["DB_READ_YOUR_WRITES_SECONDS"]
+    if g.get("db_wrote") and window > 0:
+        session[_PRIMARY_UNTIL] = time.time() + window
+    return response
+
+
+def sync_sqlite_replicas(app, engines):
+    # Local stand-in for replication: copy the primary SQLite file over each
+    # SQLite replica with the online backup API.
+    primary = make_url(app.config["SQLALCHEMY_DATABASE_URI"])
+    if primary.get_backend_name() != "sqlite":
+        raise ValueError("Replica sync is only available for SQLite databases.")
+    copied = []
+    source = sqlite3.connect(engines[None].url.database)
+    try:
+        for key, engine in engines.items():
+            if key and key.startswith(REPLICA_PREFIX) and engine.dialect.name == "sqlite":
+                engine.dispose()
+                target = sqlite3.connect(engine.url.database)
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                copied.append(key)
+    finally:
+        source.close()
+    return copied
+
+
+def init_app(app, engines):
+    replicas = [
+        engine for key, engine in engines.items()
+        if key and key.startswith(REPLICA_PREFIX)
+    ]
+    app.extensions["db_replicas"] = replicas
+    if not replicas:
+        return
+    app.before_request(_choose_replica)
+    app.after_request(_remember_write)
+
+    @app.cli.command("sync-replicas")
+    def sync_replicas_command():
+        """Copy the primary SQLite database over the SQLite replicas."""
+        from app import db
+
+        for key in sync_sqlite_replicas(current_app, db.engines):
+            print(f"Synced {key}")
@@ -0,0 +1,313 @@
+import hmac
+import logging
+import smtplib
+from datetime import datetime, timedelta
+
+import click
+from flask import abort, current_app, request
+from sqlalchemy import delete, func, insert, literal, select, update
+
+from app import db
+from app.metrics import DELIVERY_CALLBACK_BATCH, DELIVERY_CALLBACKS
+from app.models import DeliveryEvent, DeliveryStatus, OutboundMessage, SuppressedRecipient
+
+# Provider status callbacks for queued reminders. Twilio posts one form per
+# status change (MessageSid, MessageStatus, ErrorCode); email providers and
+# replays post a JSON list of {"id", "status", "error_code"}. A callback
+# only appends its events to delivery_event, an INSERT with no indexes to
+# update or conflicts to resolve, and gets its 204 once that commits. Every
+# DELIVERY_FLUSH_SECONDS the flush job folds whatever has piled up into
+# delivery_status with one upsert per batch and suppresses hard bounces, so
+# a reminder burst costs an upsert transaction per batch, not per callback,
+# whichever worker process received each callback.
+
+# Provider statuses folded into ours. A message only moves to a higher
+# rank, so late or reordered callbacks never undo a delivery or a bounce.
+STATUSES = {
+    "accepted": "sending",
+    "scheduled": "sending",
+    "queued": "sending",
+    "sending": "sending",
+    "processed": "sending",
+    "deferred": "sending",
+    "sent": "sent",
+    "delivered": "delivered",
+    "read": "delivered",
+    "open": "delivered",
+    "click": "delivered",
+    "undelivered": "failed",
+    "failed": "failed",
+    "dropped": "failed",
+    "canceled": "failed",
+    "bounce": "bounced",
+    "bounced": "bounced",
+}
+RANKS = {"sending": 1, "sent": 2, "delivered": 3, "failed": 3, "bounced": 4}
+CHANNELS = ("sms", "email")
+
+
+def is_hard_bounce(channel, error):
+    # Send-time errors that will never succeed for this recipient.
+    if channel == "sms":
+        return getattr(error, "code", None) in current_app.config["SMS_HARD_BOUNCE_CODES"]
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(500 <= code < 600 for code, _ in error.recipients.values())
+    return False
+
+
+def _event(channel, message_id, status, error_code=None):
+    status = STATUSES.get((status or "").lower())
+    if not message_id or status is None:
+        return None
+    error_code = str(error_code)[:20] if error_code else None
+    if (
+        channel == "sms"
+        and status == "failed"
+        and error_code
+        and error_code.isdigit()
+        and int(error_code) in current_app.config["SMS_HARD_BOUNCE_CODES"]
+    ):
+        status = "bounced"
+    return {"id": str(message_id).strip("<>")[:255], "channel": channel, "status": status, "error_code": error_code}
+
+
+def parse_callback(channel):
+    if request.is_json:
+        payload = request.get_json(silent=True)
+        items = payload if isinstance(payload, list) else [payload]
+        if not all(isinstance(item, dict) for item in items):
+            abort(400)
+        events = [_event(channel, i.get("id"), i.get("status"), i.get("error_code")) for i in items]
+    else:
+        events = [_event(
+            channel,
+            request.form.get("MessageSid"),
+            request.form.get("MessageStatus"),
+            request.form.get("ErrorCode"),
+        )]
+    return [e for e in events if e]
+
+
+def _upsert():
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def apply_events(events, now=None):
+    # Collapses the batch to one row per message (its highest-ranked
+    # status) and upserts them in chunks. Returns the ids of the bounced
+    # messages for suppress_bounced(). The caller commits.
+    now = now or datetime.utcnow()
+    latest = {}
+    for e in events:
+        current = latest.get(e["id"])
+        if current is None or RANKS[e["status"]] > RANKS[current["status"]]:
+            latest[e["id"]] = e
+
+    rows = [
+        {
+            "provider_message_id": e["id"],
+            "channel": e["channel"],
+            "status": e["status"],
+            "rank": RANKS[e["status"]],
+            "error_code": e["error_code"],
+            "updated_at": now,
+        }
+        for e in latest.values()
+    ]
+    # One cached statement run as executemany; SQLAlchemy folds the rows
+    # into multi-row INSERTs where the driver supports it.
+    stmt = _upsert()(DeliveryStatus)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DeliveryStatus.provider_message_id],
+        set_={
+            "status": stmt.excluded.status,
+            "rank": stmt.excluded.rank,
+            "error_code": stmt.excluded.error_code,
+            "updated_at": stmt.excluded.updated_at,
+        },
+        where=DeliveryStatus.rank < stmt.excluded.rank,
+    )
+    size = current_app.config["DELIVERY_CALLBACK_BATCH_SIZE"]
+    for start in range(0, len(rows), size):
+        db.session.connection().execute(stmt, rows[start:start + size])
+
+    for e in events:
+        DELIVERY_CALLBACKS.labels(e["channel"], e["status"]).inc()
+    DELIVERY_CALLBACK_BATCH.observe(len(events))
+    return [e["id"] for e in latest.values() if e["status"] == "bounced"]
+
+
+def suppress_bounced(provider_message_ids, now=None):
+    # Suppresses the recipients of those messages that have bounced. Run
+    # both when bounces are flushed and when a send records its
+    # provider_message_id, since a bounce can arrive before the send
+    # commits. The caller commits.
+    now = now or datetime.utcnow()
+    size = current_app.config["DELIVERY_CALLBACK_BATCH_SIZE"]
+    for start in range(0, len(provider_message_ids), size):
+        bounced_recipients = (
+            select(OutboundMessage.channel, OutboundMessage.recipient, literal("bounced"), literal(now))
+            .join(DeliveryStatus, DeliveryStatus.provider_message_id == OutboundMessage.provider_message_id)
+            .where(
+                OutboundMessage.provider_message_id.in_(provider_message_ids[start:start + size]),
+                DeliveryStatus.status == "bounced",
+            )
+            .distinct()
+        )
+        db.session.execute(
+            _upsert()(SuppressedRecipient)
+            .from_select(["channel", "recipient", "reason", "created_at"], bounced_recipients)
+            .on_conflict_do_nothing(index_elements=[SuppressedRecipient.channel, SuppressedRecipient.recipient])
+        )
+
+
+def record_events(events, now=None):
+    # Appends callbacks to the staging table; the caller commits.
+    now = now or datetime.utcnow()
+    db.session.execute(insert(DeliveryEvent), [
+        {
+            "provider_message_id": e["id"],
+            "channel": e["channel"],
+            "status": e["status"],
+            "error_code": e["error_code"],
+            "received_at": now,
+        }
+        for e in events
+    ])
+
+
+def flush_events(now=None):
+    # Folds staged callbacks into delivery_status, DELIVERY_CALLBACK_BATCH_SIZE
+    # at a time, then suppresses the recipients of the bounces. Returns how
+    # many callbacks were flushed.
+    now = now or datetime.utcnow()
+    size = current_app.config["DELIVERY_CALLBACK_BATCH_SIZE"]
+    total = 0
+    while True:
+        rows = db.session.execute(
+            select(DeliveryEvent.id, DeliveryEvent.provider_message_id, DeliveryEvent.channel,
+                   DeliveryEvent.status, DeliveryEvent.error_code)
+            .order_by(DeliveryEvent.id)
+            .limit(size)
+        ).all()
+        if not rows:
+            return total
+        events = [
+            {"id": row.provider_message_id, "channel": row.channel, "status": row.status, "error_code": row.error_code}
+            for row in rows
+        ]
+        bounced = apply_events(events, now)
+        db.session.execute(
+            delete(DeliveryEvent)
+            .where(DeliveryEvent.id.in_([row.id for row in rows]))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        # After the commit above, so a send that commits its
+        # provider_message_id meanwhile is matched either here or by its own
+        # suppress_bounced() call in app/outbox.py.
+        suppress_bounced(bounced, now)
+        db.session.commit()
+        total += len(rows)
+
+
+def status_callback(channel):
+    token = current_app.config["DELIVERY_CALLBACK_TOKEN"]
+    if not token or channel not in CHANNELS:
+        abort(404)
+    if not hmac.compare_digest(request.args.get("token", ""), token):
+        abort(403)
+    events = parse_callback(channel)
+    if events:
+        try:
+            record_events(events)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Failed to record {len(events)} delivery callbacks: {e}")
+            # The provider retries on 5xx.
+            abort(503)
+    return "", 204
+
+
+def suppress(channel, recipient, reason, now=None):
+    # Send-time hard bounce. The caller commits.
+    db.session.execute(
+        _upsert()(SuppressedRecipient)
+        .values(channel=channel, recipient=recipient, reason=str(reason)[:20], created_at=now or datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=[SuppressedRecipient.channel, SuppressedRecipient.recipient])
+    )
+
+
+def unsuppress(channel, recipient):
+    # For a recipient the user has just verified again. The caller commits.
+    return db.session.execute(
+        delete(SuppressedRecipient).where(
+            SuppressedRecipient.channel == channel, SuppressedRecipient.recipient == recipient
+        )
+    ).rowcount
+
+
+def drop_suppressed(now):
+    # Due queued reminders to suppressed recipients, in one statement.
+    suppressed = select(SuppressedRecipient.id).where(
+        SuppressedRecipient.channel == OutboundMessage.channel,
+        SuppressedRecipient.recipient == OutboundMessage.recipient,
+    ).exists()
+    return db.session.execute(
+        update(OutboundMessage)
+        .where(OutboundMessage.status == "queued", OutboundMessage.not_before <= now, suppressed)
+        .values(status="suppressed", last_error="recipient suppressed")
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def delivery_report_query(since):
+    # Sent reminders by channel and latest provider status; "sent" with no
+    # callback yet shows as "unconfirmed".
+    status = func.coalesce(DeliveryStatus.status, "unconfirmed")
+    return (
+        select(OutboundMessage.channel, status, func.count(OutboundMessage.id))
+        .outerjoin(DeliveryStatus, DeliveryStatus.provider_message_id == OutboundMessage.provider_message_id)
+        .where(OutboundMessage.status == "sent", OutboundMessage.sent_at >= since)
+        .group_by(OutboundMessage.channel, status)
+    )
+
+
+def delivery_report(since):
+    report = {}
+    for channel, status, count in db.session.execute(delivery_report_query(since)):
+        report.setdefault(channel, {})[status] = count
+    for counts in report.values():
+        total = sum(counts.values())
+        counts["total"] = total
+        counts["delivery_rate"] = round(counts.get("delivered", 0) / total, 4) if total else None
+    return report
+
+
+def init_app(app):
+    app.add_url_rule(
+        "/notifications/status/<channel>", "delivery_status_callback", status_callback, methods=["POST"]
+    )
+
+    @app.cli.command("flush-delivery-events")
+    def flush_delivery_events_command():
+        """Apply the delivery callbacks received since the last flush."""
+        print(f"Flushed {flush_events()} delivery callbacks")
+
+    @app.cli.command("delivery-report")
+    @click.option("--days", default=7, show_default=True, help="Look back this many days.")
+    def delivery_report_command(days):
+        """Print delivery rates of the reminders sent recently."""
+        report = delivery_report(datetime.utcnow() - timedelta(days=days))
+        if not report:
+            print(f"No reminders sent in the last {days} days")
+        for channel, counts in sorted(report.items()):
+            rate = counts.pop("delivery_rate")
+            print(f"{channel}: {rate:.1%} delivered" if rate is not None else f"{channel}: nothing sent")
+            for status, count in sorted(counts.items()):
+                print(f"  {status:<12} {count}")
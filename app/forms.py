@@ -16,6 +16,8 @@ from flask_wtf import FlaskForm
 from wtforms import StringField, DateField, SelectField, FloatField, SubmitField
 from wtforms.validators import DataRequired, Optional, Regexp
 from flask_login import current_user
+from flask_wtf.file import FileField, FileRequired
+from zoneinfo import available_timezones
 
 class RegistrationForm(FlaskForm):
     username = StringField("Username", validators=[DataRequired()])
@@ -262,6 +264,11 @@ class UpdatePasswordForm(FlaskForm):
 
 class ManageNotificationsForm(FlaskForm):
     notifications_enabled = BooleanField('Enable Notifications')
+    timezone = SelectField(
+        'Time Zone for Reminders',
+        choices=[("", "Default")] + [(zone, zone) for zone in sorted(available_timezones())],
+        validators=[Optional()],
+    )
     submit = SubmitField('Save Changes')
 
 class AdjustPrivacySettingsForm(FlaskForm):
@@ -272,4 +279,10 @@ class AdjustPrivacySettingsForm(FlaskForm):
 
 class FeedbackForm(FlaskForm):
     feedback = TextAreaField('Feedback', validators=[DataRequired()])
-    submit = SubmitField('Submit Feedback')
\ No newline at end of file
+    submit = SubmitField('Submit Feedback')
+
+
+class DocumentFileForm(FlaskForm):
+    document_id = SelectField('Document', coerce=int, validators=[DataRequired()])
+    file = FileField('Scanned File (PDF, JPEG or PNG)', validators=[FileRequired()])
+    submit = SubmitField('Upload')
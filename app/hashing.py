@@ -0,0 +1,102 @@
+import logging
+import os
+import threading
+from concurrent.futures import TimeoutError
+
+import bcrypt as _bcrypt
+from flask import current_app
+from werkzeug.exceptions import ServiceUnavailable
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+# bcrypt only ever looked at the first 72 bytes; older releases truncated
+# silently, newer ones raise, so truncate here to keep existing hashes valid.
+def _encode(password):
+    return password.encode("utf-8")[:72]
+
+
+def _hash(password, rounds):
+    return _bcrypt.hashpw(password, _bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+class HashingBusy(ServiceUnavailable):
+    # The pool didn't get to the hash within PASSWORD_HASH_TIMEOUT; a 503
+    # with Retry-After rather than a 500, so clients and proxies retry.
+    description = "Too many sign-ins are being processed. Please try again shortly."
+
+
+def _check(password, hashed):
+    try:
+        return _bcrypt.checkpw(password, hashed.encode("utf-8"))
+    except ValueError:
+        return False
+
+
+def _get_pool(size):
+    global _pool, _pool_pid
+    # The pool is created lazily and per process so that gunicorn workers
+    # forked from a preloaded master never share the master's children.
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            from concurrent.futures import ProcessPoolExecutor
+
+            _pool = ProcessPoolExecutor(max_workers=size)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def pool_size(config):
+    # PASSWORD_HASH_POOL_SIZE is for the whole host: each of the
+    # WEB_CONCURRENCY gunicorn workers gets an equal share, at least one.
+    total = config["PASSWORD_HASH_POOL_SIZE"]
+    if total <= 0:
+        return 0
+    return max(1, total // max(1, config["WEB_CONCURRENCY"]))
+
+
+def _run(func, *args):
+    config = current_app.config
+    size = pool_size(config)
+    if size <= 0:
+        return func(*args)
+    future = _get_pool(size).submit(func, *args)
+    try:
+        return future.result(timeout=config["PASSWORD_HASH_TIMEOUT"])
+    except TimeoutError:
+        # Drop it if it hasn't started; one already running finishes unread.
+        future.cancel()
+        logging.warning(f"Password hash timed out after {config['PASSWORD_HASH_TIMEOUT']}s")
+        raise HashingBusy(retry_after=max(1, int(config["PASSWORD_HASH_TIMEOUT"])))
+
+
+def hash_rounds(hashed):
+    try:
+        return int(hashed.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def hash_password(password):
+    return _run(_hash, _encode(password), current_app.config["BCRYPT_LOG_ROUNDS"])
+
+
+def check_password(hashed, password):
+    if not hashed:
+        return False
+    return _run(_check, _encode(password), hashed)
+
+
+def needs_rehash(hashed):
+    return hash_rounds(hashed) != current_app.config["BCRYPT_LOG_ROUNDS"]
+
+
+def verify_and_rehash(user, password):
+    if not check_password(user.password, password):
+        return False
+    # Cost changes roll out on the next successful login; the caller commits.
+    if needs_rehash(user.password):
+        user.password = hash_password(password)
+    return True
@@ -0,0 +1,125 @@
+from datetime import date, datetime, time
+
+from sqlalchemy import event, insert, inspect, literal, select
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import Document, DocumentVersion
+
+# Document history. Every flush that creates, changes or deletes a Document
+# appends a DocumentVersion row on the same connection, so the history
+# commits or rolls back with the change itself. Rows are never updated: a
+# version is current from its valid_from until the next one for the same
+# document. (vehicle_id, valid_from) makes a vehicle's history, or its
+# documents as of a date, one index range scan; (document_id, valid_from)
+# does the same for one document's renewal timeline.
+
+TRACKED = ("document_type", "serial_number", "start_date", "end_date")
+
+
+def _value(value):
+    # Forms assign dates to the DateTime columns.
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return datetime.combine(value, time())
+    return value
+
+
+def _changed(document):
+    state = inspect(document)
+    changed = {}
+    for name in TRACKED:
+        history = state.attrs[name].history
+        # Forms assign every field, so compare rather than trust the event.
+        if history.added and (not history.deleted or _value(history.added[0]) != _value(history.deleted[0])):
+            changed[name] = _value(history.deleted[0]) if history.deleted else None
+    return changed
+
+
+def _kind(changed, document):
+    previous_end = changed.get("end_date")
+    if changed.keys() <= {"start_date", "end_date"} and previous_end and _value(document.end_date) > previous_end:
+        return "renewed"
+    return "edited"
+
+
+def _row(document, change, at):
+    return {
+        "document_id": document.id,
+        "vehicle_id": document.vehicle_id,
+        "user_id": document.user_id,
+        "change": change,
+        "document_type": document.document_type,
+        "serial_number": document.serial_number,
+        "start_date": _value(document.start_date),
+        "end_date": _value(document.end_date),
+        "valid_from": at,
+    }
+
+
+@event.listens_for(Session, "after_flush")
+def _record_versions(session, flush_context):
+    now = datetime.utcnow()
+    rows = []
+    for obj in session.new:
+        if isinstance(obj, Document):
+            rows.append(_row(obj, "created", now))
+    for obj in session.dirty:
+        if isinstance(obj, Document) and session.is_modified(obj):
+            changed = _changed(obj)
+            if changed:
+                rows.append(_row(obj, _kind(changed, obj), now))
+    for obj in session.deleted:
+        if isinstance(obj, Document):
+            rows.append(_row(obj, "deleted", now))
+    if rows:
+        session.connection().execute(insert(DocumentVersion.__table__), rows)
+
+
+def record_deleted(criterion, at=None):
+    # For bulk DELETEs that bypass the ORM: one "deleted" version per
+    # matching document, in one INSERT ... SELECT. Run it before the delete.
+    at = at or datetime.utcnow()
+    deleted = select(
+        Document.id,
+        Document.vehicle_id,
+        Document.user_id,
+        literal("deleted"),
+        Document.document_type,
+        Document.serial_number,
+        Document.start_date,
+        Document.end_date,
+        literal(at, db.DateTime),
+    ).where(criterion)
+    return db.session.execute(
+        insert(DocumentVersion).from_select(
+            [
+                "document_id", "vehicle_id", "user_id", "change", "document_type",
+                "serial_number", "start_date", "end_date", "valid_from",
+            ],
+            deleted,
+        )
+    ).rowcount
+
+
+def vehicle_history_query(vehicle_id, until=None):
+    query = select(DocumentVersion).where(DocumentVersion.vehicle_id == vehicle_id)
+    if until is not None:
+        query = query.where(DocumentVersion.valid_from <= until)
+    return query.order_by(DocumentVersion.valid_from, DocumentVersion.id)
+
+
+def document_timeline_query(document_id):
+    return (
+        select(DocumentVersion)
+        .where(DocumentVersion.document_id == document_id)
+        .order_by(DocumentVersion.valid_from, DocumentVersion.id)
+    )
+
+
+def documents_as_of(vehicle_id, at):
+    # The version of each of the vehicle's documents current at `at`,
+    # leaving out documents that didn't exist yet or were already deleted.
+    latest = {}
+    for version in db.session.scalars(vehicle_history_query(vehicle_id, at)):
+        latest[version.document_id] = version
+    return [v for v in latest.values() if v.change != "deleted"]
@@ -0,0 +1,250 @@
+import logging
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import Response, current_app, g, got_request_exception, has_request_context, jsonify, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event, exc, text
+from sqlalchemy.pool import QueuePool
+
+from app import db
+
+# When PROMETHEUS_MULTIPROC_DIR is set (see gunicorn.conf.py) every worker
+# writes its samples to mmap'd files in that directory and /metrics
+# aggregates them, so a scrape sees the whole host rather than whichever
+# worker answered it.
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+REQUESTS = Counter(
+    "docuflex_http_requests_total",
+    "HTTP requests by endpoint, method and status.",
+    ["endpoint", "method", "status"],
+)
+REQUEST_LATENCY = Histogram(
+    "docuflex_http_request_duration_seconds",
+    "HTTP request latency by endpoint.",
+    ["endpoint"],
+)
+REQUEST_QUERIES = Histogram(
+    "docuflex_db_queries_per_request",
+    "SQL statements executed per request.",
+    ["endpoint"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, float("inf")),
+)
+REQUEST_SQL_TIME = Histogram(
+    "docuflex_db_time_per_request_seconds",
+    "Time spent executing SQL per request.",
+    ["endpoint"],
+)
+NOTIFICATION_LATENCY = Histogram(
+    "docuflex_notification_send_seconds",
+    "Notification send latency by channel.",
+    ["channel"],
+)
+NOTIFICATION_FAILURES = Counter(
+    "docuflex_notification_failures_total",
+    "Notification sends that raised, by channel.",
+    ["channel"],
+)
+NOTIFICATION_RETRIES = Counter(
+    "docuflex_notification_retries_total",
+    "Notification sends retried after a transient failure, by channel.",
+    ["channel"],
+)
+SEND_THROTTLE_WAIT = Histogram(
+    "docuflex_send_throttle_wait_seconds",
+    "Time a send waited for room under its provider's sends-per-second ceiling.",
+    ["provider"],
+    buckets=(0, 0.1, 0.5, 1, 2, 5, 10, 30, float("inf")),
+)
+OUTBOX_BURST = Histogram(
+    "docuflex_outbox_dispatch_messages",
+    "Messages sent per outbox dispatcher run (burst size).",
+    buckets=(0, 1, 5, 10, 25, 50, 100, 200, 500, float("inf")),
+)
+OUTBOX_DISPATCH_SECONDS = Histogram(
+    "docuflex_outbox_dispatch_seconds",
+    "Total send time per outbox dispatcher run.",
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, float("inf")),
+)
+OUTBOX_QUEUED = Gauge(
+    "docuflex_outbox_queued_messages",
+    "Messages waiting in the outbox, due or not.",
+    multiprocess_mode="livemostrecent",
+)
+DELIVERY_CALLBACKS = Counter(
+    "docuflex_delivery_callbacks_total",
+    "Provider delivery status callbacks received, by channel and status.",
+    ["channel", "status"],
+)
+DELIVERY_CALLBACK_BATCH = Histogram(
+    "docuflex_delivery_callback_batch_size",
+    "Callbacks applied per delivery status flush transaction.",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, float("inf")),
+)
+USER_STATS_DRIFT = Counter(
+    "docuflex_user_stats_drift_total",
+    "User counter rows the reconciliation job found wrong and repaired.",
+)
+JOB_DURATION = Histogram(
+    "docuflex_scheduler_job_duration_seconds",
+    "Scheduler job run time.",
+    ["job"],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, float("inf")),
+)
+POOL_OVERFLOW = Counter(
+    "docuflex_db_pool_overflow_checkouts_total",
+    "Checkouts that had to open an overflow connection.",
+    ["bind"],
+)
+POOL_TIMEOUTS = Counter(
+    "docuflex_db_pool_timeouts_total",
+    "Requests that failed waiting for a pooled database connection.",
+)
+POOL_CHECKED_OUT = Gauge(
+    "docuflex_db_pool_checked_out",
+    "Connections currently checked out.",
+    ["bind"],
+    multiprocess_mode="livesum",
+)
+
+
+def observe_send(channel):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            except Exception:
+                NOTIFICATION_FAILURES.labels(channel).inc()
+                raise
+            finally:
+                NOTIFICATION_LATENCY.labels(channel).observe(time.perf_counter() - started)
+
+        return decorated_function
+
+    return decorator
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    if has_request_context():
+        g.sql_queries = g.get("sql_queries", 0) + 1
+        g.sql_seconds = g.get("sql_seconds", 0.0) + time.perf_counter() - started
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute; drop its start
+    # time so the next statement on the connection isn't timed from it.
+    if context.connection is not None and context.connection.info.get("query_started"):
+        context.connection.info["query_started"].pop()
+
+
+def _track_pool(engine, bind):
+    # Pool events and QueuePool's public counters only. engine.pool is read
+    # on every event because dispose() replaces it. The checkin event fires
+    # before the connection is back in the pool, so it decrements instead.
+    checked_out = POOL_CHECKED_OUT.labels(bind)
+    if not isinstance(engine.pool, QueuePool):
+        event.listen(engine, "checkout", lambda *args: checked_out.inc())
+        event.listen(engine, "checkin", lambda *args: checked_out.dec())
+        return
+    overflow = POOL_OVERFLOW.labels(bind)
+
+    def on_connect(dbapi_connection, connection_record):
+        # The pool counts a connection before opening it.
+        if engine.pool.overflow() > 0:
+            overflow.inc()
+
+    event.listen(engine, "connect", on_connect)
+    event.listen(engine, "checkout", lambda *args: checked_out.set(engine.pool.checkedout()))
+    event.listen(engine, "checkin", lambda *args: checked_out.dec())
+
+
+def _on_request_exception(sender, exception, **extra):
+    # A checkout that times out raises out of the pool without any event.
+    if isinstance(exception, exc.TimeoutError):
+        POOL_TIMEOUTS.inc()
+        status = "; ".join(f"{key or 'default'}: {engine.pool.status()}" for key, engine in db.engines.items())
+        logging.error(f"Database pool exhausted: {status}")
+
+
+def _before_request():
+    g.request_started = time.perf_counter()
+
+
+def _after_request(response):
+    started = g.pop("request_started", None)
+    if started is None:
+        return response
+    endpoint = request.endpoint or "unmatched"
+    REQUESTS.labels(endpoint, request.method, response.status_code).inc()
+    REQUEST_LATENCY.labels(endpoint).observe(time.perf_counter() - started)
+    REQUEST_QUERIES.labels(endpoint).observe(g.get("sql_queries", 0))
+    REQUEST_SQL_TIME.labels(endpoint).observe(g.get("sql_seconds", 0.0))
+    return response
+
+
+def metrics_view():
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+_readiness = {"checked_at": 0.0, "ok": False, "error": None}
+_readiness_lock = threading.Lock()
+
+
+def ready_view():
+    # Cached so load balancer probes cost at most one pooled SELECT 1 per
+    # READINESS_CACHE_SECONDS per worker.
+    now = time.monotonic()
+    with _readiness_lock:
+        if now - _readiness["checked_at"] >= current_app.config["READINESS_CACHE_SECONDS"]:
+            try:
+                with db.engine.connect() as connection:
+                    connection.execute(text("SELECT 1"))
+                _readiness.update(ok=True, error=None)
+            except Exception as e:
+                logging.error(f"Readiness check failed: {e}")
+                _readiness.update(ok=False, error=str(e))
+            _readiness["checked_at"] = now
+        ok, error = _readiness["ok"], _readiness["error"]
+    if ok:
+        return jsonify({"ready": True})
+    return jsonify({"ready": False, "error": error}), 503
+
+
+def init_app(app):
+    if not app.config["METRICS_ENABLED"]:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
+    app.add_url_rule("/ready", "ready", ready_view)
+
+    for bind_key, engine in db.engines.items():
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+        _track_pool(engine, bind_key or "default")
+    got_request_exception.connect(_on_request_exception, app)
@@ -6,7 +6,8 @@ import pytz
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user = User.query.get(int(user_id))
+    return user if user and user.deleted_at is None else None
 
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
@@ -15,10 +16,21 @@ class User(db.Model, UserMixin):
     phone = db.Column(db.String(20), nullable=True)
     image_file = db.Column(db.String(20), nullable=False, default="default.jpg")
     password = db.Column(db.String(60), nullable=False)
-    vehicles = db.relationship("Vehicle", backref="owner", lazy=True)
-    compliance_alerts = db.relationship('ComplianceAlert', backref='user', lazy=True)
-    feedbacks = db.relationship('Feedback', backref='user', lazy=True)
-    logs = db.relationship('Log', backref='user', lazy=True)
+    # IANA zone for delivery windows; NULL means Config.TIMEZONE.
+    timezone = db.Column(db.String(50), nullable=True)
+    # Set on the Manage Notifications and Privacy Settings pages; users
+    # with notifications off get no expiry reminders.
+    notifications_enabled = db.Column(db.Boolean, nullable=False, default=True, server_default=db.true())
+    privacy_settings = db.Column(db.String(10), nullable=False, default="private", server_default="private")
+    # Set when the account is deleted but still being purged (app/purge.py);
+    # such users can't log in and get no reminders.
+    deleted_at = db.Column(db.DateTime, nullable=True, index=True)
+    # Rows below go with the user through ON DELETE rules and app/purge.py;
+    # passive_deletes keeps the ORM from loading them first.
+    vehicles = db.relationship("Vehicle", backref="owner", lazy=True, passive_deletes=True)
+    compliance_alerts = db.relationship('ComplianceAlert', backref='user', lazy=True, passive_deletes=True)
+    feedbacks = db.relationship('Feedback', backref='user', lazy=True, passive_deletes=True)
+    logs = db.relationship('Log', backref='user', lazy=True, passive_deletes=True)
     
     def __repr__(self):
         return f'<User {self.username}>'
@@ -27,28 +39,76 @@ class Vehicle(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     vehicle_number = db.Column(db.String(100), unique=True, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False, index=True)
     documents = db.relationship(
-        "Document", backref="vehicle", lazy=True, cascade="all, delete-orphan"
+        "Document", backref="vehicle", lazy=True, cascade="all, delete-orphan", passive_deletes=True
     )
     
     def __repr__(self):
         return f'<Vehicle {self.name}>'
 
+class BackfillProgress(db.Model):
+    # How far each batched backfill (app/backfill.py) has got, by name, so
+    # an interrupted migration resumes instead of starting over.
+    name = db.Column(db.String(100), primary_key=True)
+    last_id = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<BackfillProgress {self.name} {self.last_id}>'
+
+class UserStats(db.Model):
+    # Per-user counts kept up to date by app/counters.py, so pages read
+    # them by primary key instead of counting. expired_count covers
+    # documents that ended before expired_before, expiring_count those
+    # ending from then until expiring_before.
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
+    vehicle_count = db.Column(db.Integer, nullable=False, default=0)
+    document_count = db.Column(db.Integer, nullable=False, default=0)
+    expired_count = db.Column(db.Integer, nullable=False, default=0)
+    expired_before = db.Column(db.DateTime, nullable=False)
+    expiring_count = db.Column(db.Integer, nullable=False, default=0)
+    expiring_before = db.Column(db.DateTime, nullable=False)
+    reconciled_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<UserStats {self.user_id}>'
+
 class ComplianceAlert(db.Model):
+    # Open alerts are looked up per user and per document; resolved_at is
+    # NULL while an alert is open.
+    __table_args__ = (
+        db.Index("ix_compliance_alert_user_id_resolved_at", "user_id", "resolved_at", "created_at"),
+        db.Index("ix_compliance_alert_document_id_resolved_at", "document_id", "resolved_at"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     message = db.Column(db.String(250), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete="CASCADE"), nullable=False)
+    document_id = db.Column(
+        db.Integer, db.ForeignKey("document.id", ondelete="CASCADE"), nullable=True
+    )
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    resolved_at = db.Column(db.DateTime, nullable=True)
     
     def __repr__(self):
         return f'<ComplianceAlert {self.message}>'
 
 class Document(db.Model):
+    # (user_id, end_date) serves the per-user listings and expiry lookups;
+    # end_date alone serves the fleet-wide expiry scan. Ids are never
+    # reused, even on SQLite, so archived documents and history keep theirs.
+    __table_args__ = (
+        db.Index("ix_document_user_id_end_date", "user_id", "end_date"),
+        {"sqlite_autoincrement": True},
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     document_type = db.Column(db.String(50), nullable=False)
     serial_number = db.Column(db.String(100), nullable=False)
     start_date = db.Column(db.DateTime, nullable=False)
-    end_date = db.Column(db.DateTime, nullable=False)
+    end_date = db.Column(db.DateTime, nullable=False, index=True)
     date_posted = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     vehicle_id = db.Column(
         db.Integer,
@@ -57,27 +117,172 @@ class Document(db.Model):
         index=True,
     )
     additional_info = db.Column(db.Text, nullable=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete="CASCADE"), nullable=False)
     status = db.Column(db.String(20), nullable=True)
-    file_path = db.Column(db.String(300), nullable=True)
+    # SHA-256 of the scanned file in the content-addressed store
+    # (app/storage.py); shared by every document with the same bytes.
+    file_path = db.Column(db.String(300), nullable=True, index=True)
+    file_name = db.Column(db.String(255), nullable=True)
+    file_mimetype = db.Column(db.String(100), nullable=True)
+    file_size = db.Column(db.Integer, nullable=True)
+    # NULL until app/previews.py has rendered the file, then "ready" or "failed".
+    preview_status = db.Column(db.String(10), nullable=True)
+    # How the stored file is encoded on disk: "zstd", "gzip" or "identity";
+    # NULL until app/compression.py has looked at it.
+    file_encoding = db.Column(db.String(10), nullable=True)
+    # When the next expiry reminder is due; maintained by app/reminders.py.
+    next_reminder_at = db.Column(db.DateTime, nullable=True, index=True)
     
     def __repr__(self):
         return f'<Document {self.document_type}>'
 
+class ArchivedDocument(db.Model):
+    # Cold storage for documents long past their end_date and since
+    # replaced, moved here by app/archive.py so the document table stays
+    # proportional to documents that still matter. Rows keep their id and
+    # their file.
+    __table_args__ = (
+        db.Index("ix_archived_document_vehicle_id_end_date", "vehicle_id", "end_date"),
+        db.Index("ix_archived_document_user_id_end_date", "user_id", "end_date"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    document_type = db.Column(db.String(50), nullable=False)
+    serial_number = db.Column(db.String(100), nullable=False)
+    start_date = db.Column(db.DateTime, nullable=False)
+    end_date = db.Column(db.DateTime, nullable=False)
+    date_posted = db.Column(db.DateTime, nullable=False)
+    vehicle_id = db.Column(db.Integer, db.ForeignKey("vehicle.id", ondelete="CASCADE"), nullable=False)
+    additional_info = db.Column(db.Text, nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
+    status = db.Column(db.String(20), nullable=True)
+    file_path = db.Column(db.String(300), nullable=True, index=True)
+    file_name = db.Column(db.String(255), nullable=True)
+    file_mimetype = db.Column(db.String(100), nullable=True)
+    file_size = db.Column(db.Integer, nullable=True)
+    preview_status = db.Column(db.String(10), nullable=True)
+    file_encoding = db.Column(db.String(10), nullable=True)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<ArchivedDocument {self.document_type}>'
+
+class DocumentVersion(db.Model):
+    # Append-only history: one row per created, edited, renewed or deleted
+    # state of a document, written by app/history.py in the same
+    # transaction as the change. No foreign key to document or vehicle, so
+    # the history outlives them; it goes when the account is purged.
+    __table_args__ = (
+        db.Index("ix_document_version_vehicle_id_valid_from", "vehicle_id", "valid_from", "id"),
+        db.Index("ix_document_version_document_id_valid_from", "document_id", "valid_from", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, nullable=False)
+    vehicle_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False, index=True)
+    change = db.Column(db.String(10), nullable=False)
+    document_type = db.Column(db.String(50), nullable=False)
+    serial_number = db.Column(db.String(100), nullable=False)
+    start_date = db.Column(db.DateTime, nullable=False)
+    end_date = db.Column(db.DateTime, nullable=False)
+    valid_from = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<DocumentVersion {self.document_id} {self.change} {self.valid_from}>'
+
 class Log(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    # Kept when the user is deleted, as an audit trail without the user.
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete="SET NULL"), nullable=True, index=True)
     action = db.Column(db.String(255), nullable=False)
-    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
 
     def __repr__(self):
         return f'<Log {self.action}>'
     
 class Feedback(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete="CASCADE"), nullable=False, index=True)
     feedback_text = db.Column(db.Text, nullable=False)
-    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<Feedback {self.feedback_text}>'
+
+
+class OutboundMessage(db.Model):
+    # Reminder email/SMS waiting for its delivery window; see app/outbox.py.
+    # status goes queued -> sending -> sent, or back to queued for a retry,
+    # or failed after OUTBOX_MAX_ATTEMPTS, or suppressed if the recipient
+    # hard-bounced earlier.
+    __table_args__ = (
+        db.Index("ix_outbound_message_status_not_before", "status", "not_before"),
+        db.Index("ix_outbound_message_status_sent_at", "status", "sent_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(10), nullable=False)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=True)
+    body = db.Column(db.Text, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=True, index=True)
+    status = db.Column(db.String(10), nullable=False, default="queued")
+    not_before = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.String(255), nullable=True)
+    # Twilio SID or email Message-ID, joined to DeliveryStatus.
+    provider_message_id = db.Column(db.String(255), nullable=True, unique=True, index=True)
+
+    def __repr__(self):
+        return f'<OutboundMessage {self.channel} {self.status}>'
+
+
+class DeliveryEvent(db.Model):
+    # Provider status callbacks as received, appended by the callback
+    # endpoint and folded into DeliveryStatus in batches by the flush job
+    # (app/delivery.py), which deletes them.
+    id = db.Column(db.Integer, primary_key=True)
+    provider_message_id = db.Column(db.String(255), nullable=False)
+    channel = db.Column(db.String(10), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    error_code = db.Column(db.String(20), nullable=True)
+    received_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<DeliveryEvent {self.provider_message_id} {self.status}>'
+
+
+class DeliveryStatus(db.Model):
+    # Latest provider status per sent message, written in batches from the
+    # status callbacks (app/delivery.py). Kept apart from OutboundMessage
+    # so a callback that beats the send's own commit is not lost.
+    provider_message_id = db.Column(db.String(255), primary_key=True)
+    channel = db.Column(db.String(10), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    rank = db.Column(db.SmallInteger, nullable=False)
+    error_code = db.Column(db.String(20), nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<DeliveryStatus {self.provider_message_id} {self.status}>'
+
+
+class SuppressedRecipient(db.Model):
+    # Addresses and numbers that hard-bounced; queued reminders to them are
+    # dropped instead of sent.
+    __table_args__ = (
+        db.UniqueConstraint("channel", "recipient", name="uq_suppressed_recipient_channel_recipient"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(10), nullable=False)
+    recipient = db.Column(db.String(120), nullable=False)
+    reason = db.Column(db.String(20), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
     def __repr__(self):
-        return f'<Feedback {self.feedback_text}>'
\ No newline at end of file
+        return f'<SuppressedRecipient {self.channel} {self.recipient}>'
@@ -1,32 +1,126 @@
+import logging
+import random
+import smtplib
+import time
+from functools import wraps
+
 from flask_mail import Message
-from twilio.rest import Client
 from app import mail
 from flask import current_app
+from app.metrics import NOTIFICATION_RETRIES, SEND_THROTTLE_WAIT, observe_send
+from app.ratelimit import acquire_send_slot
+
+
+def throttle(provider, bulk=False):
+    SEND_THROTTLE_WAIT.labels(provider).observe(acquire_send_slot(provider, bulk))
+
+
+def is_transient(error):
+    # Connection problems, SMTP 4xx replies and HTTP 429/5xx are worth
+    # another attempt; rejected recipients and bad credentials are not.
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return False
+    status = getattr(error, "status", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return isinstance(error, OSError)
+
+
+def is_sms_transient(error):
+    # A Twilio 5xx or a dropped response may come after the message was
+    # accepted, and a retry would send it twice. Only retry when Twilio
+    # turned it away (429) or the connection was never made.
+    from requests.exceptions import ConnectionError, ConnectTimeout
+    from urllib3.exceptions import NewConnectionError
+
+    if getattr(error, "status", None) == 429 or isinstance(error, ConnectTimeout):
+        return True
+    if isinstance(error, ConnectionError):
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+    return False
+
 
+def retry_transient(channel, retry_if=is_transient):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            attempts = current_app.config["NOTIFICATION_MAX_ATTEMPTS"]
+            backoff = current_app.config["NOTIFICATION_RETRY_BACKOFF"]
+            for attempt in range(1, attempts + 1):
+                try:
+                    return f(*args, **kwargs)
+                except Exception as e:
+                    if attempt == attempts or not retry_if(e):
+                        raise
+                    delay = backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                    logging.warning(f"{channel} send failed ({e}); retry {attempt} in {delay:.2f}s")
+                    NOTIFICATION_RETRIES.labels(channel).inc()
+                    time.sleep(delay)
 
+        return decorated_function
+
+    return decorator
+
+
+@observe_send("email")
+@retry_transient("email")
 def send_notification(subject, recipients, body, sender=None):
     sender_email = sender or current_app.config.get('MAIL_DEFAULT_SENDER')
     if not sender_email:
         raise ValueError("No sender email is defined.")
     msg = Message(subject, recipients=recipients, body=body, sender=sender_email)
+    throttle("smtp")
     mail.send(msg)
 
 
-def send_sms(to, body):
-    account_sid = current_app.config["TWILIO_ACCOUNT_SID"]
-    auth_token = current_app.config["TWILIO_AUTH_TOKEN"]
-    client = Client(account_sid, auth_token)
-    message = client.messages.create(
-        body=body, from_=current_app.config["TWILIO_PHONE_NUMBER"], to=to
+def _twilio_client():
+    # One client per app, so its HTTP session (and connection pool) is reused.
+    client = current_app.extensions.get("twilio_client")
+    if client is None:
+        # twilio pulls in a large dependency tree; only pay for it when an
+        # SMS is actually sent.
+        from twilio.http.http_client import TwilioHttpClient
+        from twilio.rest import Client
+
+        client = Client(
+            current_app.config["TWILIO_ACCOUNT_SID"],
+            current_app.config["TWILIO_AUTH_TOKEN"],
+            http_client=TwilioHttpClient(timeout=current_app.config["TWILIO_TIMEOUT"]),
+        )
+        if current_app.config["TWILIO_API_BASE_URL"]:
+            client.api.base_url = current_app.config["TWILIO_API_BASE_URL"]
+        current_app.extensions["twilio_client"] = client
+    return client
+
+
+@observe_send("sms")
+@retry_transient("sms", retry_if=is_sms_transient)
+def send_sms(to, body, bulk=False):
+    if current_app.config["SMS_SUPPRESS_SEND"]:
+        logging.info(f"SMS to {to} suppressed")
+        return None
+
+    throttle("twilio", bulk)
+    options = {}
+    if current_app.config["TWILIO_STATUS_CALLBACK_URL"]:
+        options["status_callback"] = current_app.config["TWILIO_STATUS_CALLBACK_URL"]
+    message = _twilio_client().messages.create(
+        body=body, from_=current_app.config["TWILIO_PHONE_NUMBER"], to=to, **options
     )
+    logging.info(f"SMS sent successfully to {to}")
     return message.sid
 
 
-def send_email(subject, recipients, body):
-    print("send_email function called")
+@observe_send("email")
+@retry_transient("email")
+def send_email(subject, recipients, body, bulk=False):
+    logging.debug(f"Sending email {subject!r} to {len(recipients)} recipients")
     msg = Message(subject, recipients=recipients)
     msg.body = body
+    throttle("smtp", bulk)
     mail.send(msg)
-
-
-print("notification_utils loaded")
+    # Providers report bounces against the Message-ID.
+    return msg.msgId.strip("<>")
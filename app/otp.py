@@ -0,0 +1,81 @@
+import hashlib
+import hmac
+import json
+import secrets
+from collections import namedtuple
+
+from flask import current_app
+
+from app.ttl_store import get_store
+
+# One-time passwords live in the shared TTL store (OTP_STORE_URL), never in
+# the cookie session or the main database. Every code is bound to a purpose
+# (e.g. "delete_vehicle:12") and a subject (the user id), so a code issued
+# for one action cannot be replayed against another.
+
+OTPResult = namedtuple("OTPResult", ["ok", "reason", "payload"])
+
+
+def _key(purpose, subject):
+    return f"otp:{purpose}:{subject}"
+
+
+def _digest(code):
+    secret = current_app.config["SECRET_KEY"].encode("utf-8")
+    return hmac.new(secret, str(code).strip().encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def issue_otp(purpose, subject, payload=None):
+    store = get_store("OTP_STORE_URL")
+    code = secrets.randbelow(900000) + 100000
+    key = _key(purpose, subject)
+    store.set(
+        key,
+        json.dumps({"digest": _digest(code), "payload": payload}),
+        current_app.config["OTP_TTL"],
+    )
+    store.delete(key + ":attempts")
+    return code
+
+
+def check_otp(purpose, subject, code):
+    store = get_store("OTP_STORE_URL")
+    key = _key(purpose, subject)
+    ttl = current_app.config["OTP_TTL"]
+
+    attempts = store.incr(key + ":attempts", ttl)
+    if attempts > current_app.config["OTP_MAX_ATTEMPTS"]:
+        store.delete(key)
+        return OTPResult(False, "locked", None)
+
+    record = store.get(key)
+    if record is None:
+        return OTPResult(False, "expired", None)
+    record = json.loads(record)
+    if code is None or not hmac.compare_digest(record["digest"], _digest(code)):
+        if attempts == current_app.config["OTP_MAX_ATTEMPTS"]:
+            store.delete(key)
+            return OTPResult(False, "locked", None)
+        return OTPResult(False, "invalid", None)
+
+    # pop() makes sure two concurrent correct submissions only succeed once.
+    if store.pop(key) is None:
+        return OTPResult(False, "expired", None)
+    store.delete(key + ":attempts")
+    return OTPResult(True, "ok", record["payload"])
+
+
+def grant(purpose, subject):
+    # Short-lived marker that an OTP was verified, for flows where the
+    # protected action happens on a later request (e.g. a confirm page).
+    get_store("OTP_STORE_URL").set(
+        f"otp-grant:{purpose}:{subject}", "1", current_app.config["OTP_TTL"]
+    )
+
+
+def has_grant(purpose, subject):
+    return get_store("OTP_STORE_URL").get(f"otp-grant:{purpose}:{subject}") is not None
+
+
+def consume_grant(purpose, subject):
+    return get_store("OTP_STORE_URL").pop(f"otp-grant:{purpose}:{subject}") is not None
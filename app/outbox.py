@@ -0,0 +1,165 @@
+import logging
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from flask import current_app
+from sqlalchemy import func, select, update
+
+from app import db
+from app.delivery import drop_suppressed, is_hard_bounce, suppress, suppress_bounced
+from app.metrics import OUTBOX_BURST, OUTBOX_DISPATCH_SECONDS, OUTBOX_QUEUED
+from app.models import OutboundMessage
+
+# Reminder emails and SMS are not sent when they are generated but queued
+# with a not_before inside the recipient's local delivery window, spread
+# over its first DELIVERY_SPREAD_MINUTES so a day's reminders don't all
+# leave at once. The dispatcher sends due messages oldest first at the
+# bulk share of each provider's ceiling (acquire_send_slot in
+# app/ratelimit.py); OTPs and other interactive sends bypass the queue.
+# Sent messages keep the provider's message id for the delivery callbacks
+# in app/delivery.py; recipients that hard-bounced are skipped.
+
+
+def _zone(name):
+    try:
+        return ZoneInfo(name or current_app.config["TIMEZONE"])
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(current_app.config["TIMEZONE"])
+
+
+def delivery_time(user_timezone=None, now=None):
+    # Naive UTC time inside the next delivery window in the user's zone.
+    config = current_app.config
+    now = now or datetime.utcnow()
+    local = now.replace(tzinfo=timezone.utc).astimezone(_zone(user_timezone))
+    start = local.replace(hour=config["DELIVERY_WINDOW_START_HOUR"], minute=0, second=0, microsecond=0)
+    end = local.replace(hour=config["DELIVERY_WINDOW_END_HOUR"], minute=0, second=0, microsecond=0)
+    if local >= end:
+        start += timedelta(days=1)
+        end += timedelta(days=1)
+    earliest = max(local, start)
+    spread = min(timedelta(minutes=config["DELIVERY_SPREAD_MINUTES"]), end - earliest)
+    at = earliest + spread * random.random()
+    return at.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def enqueue(channel, recipient, body, subject=None, user=None, now=None):
+    # The caller commits.
+    message = OutboundMessage(
+        channel=channel,
+        recipient=recipient,
+        subject=subject,
+        body=body,
+        user_id=user.id if user else None,
+        not_before=delivery_time(user.timezone if user else None, now),
+    )
+    db.session.add(message)
+    return message
+
+
+def _send(message):
+    from app.notification_utils import send_email, send_sms
+
+    if message.channel == "sms":
+        return send_sms(message.recipient, message.body, bulk=True)
+    return send_email(message.subject, [message.recipient], message.body, bulk=True)
+
+
+def deliver(message_id, now=None):
+    # Claims one queued message, sends it and records the outcome. Returns
+    # True if it was sent by this call.
+    config = current_app.config
+    now = now or datetime.utcnow()
+    claimed = db.session.execute(
+        update(OutboundMessage)
+        .where(OutboundMessage.id == message_id, OutboundMessage.status == "queued")
+        .values(status="sending", claimed_at=now, attempts=OutboundMessage.attempts + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        return False
+
+    message = db.session.get(OutboundMessage, message_id)
+    try:
+        provider_message_id = _send(message)
+    except Exception as e:
+        # send_* already retried transient errors a few times; come back
+        # to it later, with backoff, until OUTBOX_MAX_ATTEMPTS. A hard
+        # bounce (invalid number, rejected address) is not retried at all.
+        logging.error(f"Outbox message {message_id} ({message.channel}) failed: {e}")
+        message.last_error = str(e)[:255]
+        if is_hard_bounce(message.channel, e):
+            message.status = "failed"
+            suppress(message.channel, message.recipient, getattr(e, "code", None) or "rejected", now)
+        elif message.attempts >= config["OUTBOX_MAX_ATTEMPTS"]:
+            message.status = "failed"
+        else:
+            message.status = "queued"
+            message.not_before = now + timedelta(
+                seconds=config["OUTBOX_RETRY_DELAY"] * 2 ** (message.attempts - 1)
+            )
+        db.session.commit()
+        return False
+    message.status = "sent"
+    message.provider_message_id = provider_message_id
+    message.sent_at = datetime.utcnow()
+    db.session.commit()
+    if provider_message_id:
+        # A bounce flushed before the commit above found no message to
+        # suppress the recipient of.
+        suppress_bounced([provider_message_id], now)
+        db.session.commit()
+    return True
+
+
+def due_messages_query(now, limit):
+    return (
+        select(OutboundMessage.id)
+        .where(OutboundMessage.status == "queued", OutboundMessage.not_before <= now)
+        .order_by(OutboundMessage.not_before)
+        .limit(limit)
+    )
+
+
+def dispatch(now=None, limit=None):
+    # One dispatcher run; returns the number of messages sent.
+    config = current_app.config
+    now = now or datetime.utcnow()
+    # Messages left "sending" by a dispatcher that died go back in the queue.
+    db.session.execute(
+        update(OutboundMessage)
+        .where(
+            OutboundMessage.status == "sending",
+            OutboundMessage.claimed_at < now - timedelta(seconds=config["OUTBOX_CLAIM_TIMEOUT"]),
+        )
+        .values(status="queued")
+        .execution_options(synchronize_session=False)
+    )
+    drop_suppressed(now)
+    db.session.commit()
+
+    due = db.session.scalars(due_messages_query(now, limit or config["OUTBOX_BATCH_SIZE"])).all()
+    started = time.perf_counter()
+    sent = sum(deliver(message_id, now) for message_id in due)
+    OUTBOX_BURST.observe(sent)
+    OUTBOX_DISPATCH_SECONDS.observe(time.perf_counter() - started)
+    OUTBOX_QUEUED.set(db.session.scalar(
+        select(func.count(OutboundMessage.id)).where(OutboundMessage.status == "queued")
+    ))
+    return sent
+
+
+def init_app(app):
+    @app.cli.command("dispatch-outbox")
+    def dispatch_outbox_command():
+        """Send the queued reminders whose delivery time has come."""
+        total = 0
+        while True:
+            sent = dispatch()
+            if not sent:
+                break
+            total += sent
+        print(f"Sent {total} queued messages")
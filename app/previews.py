@@ -0,0 +1,151 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+from flask import current_app
+from sqlalchemy import select, update
+
+from app import db
+from app.models import Document
+from app.storage import CHUNK_SIZE, get_store, open_stored
+
+# Thumbnails and first-page previews for uploaded scans, rendered in a
+# process pool by a background job and cached next to the originals
+# (app/storage.py). Pages never render anything: they only read
+# Document.preview_status, which is NULL until the job has run, then
+# "ready" or "failed".
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _save_jpeg(image, dest):
+    tmp = f"{dest}.{os.getpid()}.tmp"
+    image.save(tmp, "JPEG", quality=80, optimize=True, progressive=True)
+    os.replace(tmp, dest)
+
+
+def _first_page(src, mimetype, width):
+    from PIL import Image, ImageOps
+
+    if mimetype == "application/pdf":
+        import pypdfium2 as pdfium
+
+        pdf = pdfium.PdfDocument(src)
+        try:
+            page = pdf[0]
+            image = page.render(scale=width / page.get_width()).to_pil()
+        finally:
+            pdf.close()
+    else:
+        image = ImageOps.exif_transpose(Image.open(src))
+        image.draft("RGB", (width, width))
+    return image.convert("RGB")
+
+
+def render_renditions(src, mimetype, renditions, encoding="identity"):
+    # Runs in a pool worker. renditions maps destination path -> max size;
+    # returns "ready", "failed" or "unsupported" (imaging libraries missing).
+    unpacked = None
+    try:
+        if encoding != "identity":
+            # pdfium and Pillow need a seekable file, so unpack to a temp file.
+            fd, unpacked = tempfile.mkstemp()
+            with os.fdopen(fd, "wb") as out, open_stored(src, encoding) as original:
+                shutil.copyfileobj(original, out, CHUNK_SIZE)
+            src = unpacked
+        image = _first_page(src, mimetype, max(size for size in renditions.values()))
+        for dest, size in renditions.items():
+            if not os.path.exists(dest):
+                rendition = image.copy()
+                rendition.thumbnail((size, size))
+                _save_jpeg(rendition, dest)
+        return "ready"
+    except ImportError:
+        return "unsupported"
+    except Exception as e:
+        logging.warning(f"Could not render preview for {src}: {e}")
+        return "failed"
+    finally:
+        if unpacked:
+            os.remove(unpacked)
+
+
+def _get_pool(size):
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            from concurrent.futures import ProcessPoolExecutor
+
+            _pool = ProcessPoolExecutor(max_workers=size)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _sizes():
+    config = current_app.config
+    return {"thumb": config["THUMBNAIL_SIZE"], "preview": config["PREVIEW_SIZE"]}
+
+
+def generate_previews(limit=None):
+    # One render per distinct file; the result is written to every document
+    # sharing it. Returns the number of files processed.
+    limit = limit or current_app.config["PREVIEW_BATCH_SIZE"]
+    pending = db.session.execute(
+        select(Document.file_path, Document.file_mimetype)
+        .where(Document.file_path.isnot(None), Document.preview_status.is_(None))
+        .distinct()
+        .limit(limit)
+    ).all()
+    if not pending:
+        return 0
+
+    store = get_store()
+    sizes = _sizes()
+    pool = _get_pool(current_app.config["PREVIEW_POOL_SIZE"])
+    futures = {}
+    for digest, mimetype in pending:
+        path, encoding = store.locate(digest)
+        # A missing file fails in the worker like any unreadable one.
+        futures[digest] = pool.submit(
+            render_renditions,
+            path or store.path(digest),
+            mimetype,
+            {store.path(digest, name): size for name, size in sizes.items()},
+            encoding or "identity",
+        )
+
+    done = 0
+    for digest, future in futures.items():
+        try:
+            status = future.result(timeout=current_app.config["PREVIEW_TIMEOUT"])
+        except Exception as e:
+            logging.warning(f"Preview rendering for {digest} did not finish: {e}")
+            status = "failed"
+        if status == "unsupported":
+            logging.error("Pillow and pypdfium2 are required to render document previews.")
+            continue
+        db.session.execute(
+            update(Document)
+            .where(Document.file_path == digest, Document.preview_status.is_(None))
+            .values(preview_status=status)
+        )
+        done += 1
+    db.session.commit()
+    return done
+
+
+def init_app(app):
+    @app.cli.command("generate-previews")
+    def generate_previews_command():
+        """Render pending document thumbnails and previews."""
+        total = 0
+        while True:
+            done = generate_previews()
+            if not done:
+                break
+            total += done
+        print(f"Rendered previews for {total} files")
@@ -0,0 +1,174 @@
+import logging
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import delete, func, select, update
+
+from app import db
+from app.compliance import mark_compliance_stale
+from app.counters import remove_vehicle
+from app.history import record_deleted
+from app.models import (
+    ArchivedDocument, ComplianceAlert, Document, DocumentVersion, Feedback, Log, OutboundMessage, User, UserStats, Vehicle,
+)
+from app.storage import release_all
+
+# Vehicles and accounts are deleted with bulk statements, children first,
+# instead of session.delete(), which loads every dependent row and deletes
+# them one by one. The ON DELETE rules on the foreign keys are a backstop
+# for PostgreSQL; SQLite doesn't enforce them, so the order here matters.
+# Big accounts are hidden at once and purged by a job in batches of
+# ACCOUNT_PURGE_BATCH_SIZE, one transaction each, so no lock is held long.
+
+
+def _delete_documents(criterion):
+    mark_compliance_stale(db.session, db.session.scalars(select(Document.user_id).where(criterion).distinct()))
+    document_ids = select(Document.id).where(criterion)
+    db.session.execute(
+        delete(ComplianceAlert)
+        .where(ComplianceAlert.document_id.in_(document_ids))
+        .execution_options(synchronize_session=False)
+    )
+    return db.session.execute(
+        delete(Document).where(criterion).execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def delete_vehicle(vehicle_id):
+    # Returns the file digests to release_all() once the caller has committed.
+    files = db.session.scalars(
+        select(Document.file_path)
+        .where(Document.vehicle_id == vehicle_id, Document.file_path.isnot(None))
+        .union(
+            select(ArchivedDocument.file_path)
+            .where(ArchivedDocument.vehicle_id == vehicle_id, ArchivedDocument.file_path.isnot(None))
+        )
+    ).all()
+    record_deleted(Document.vehicle_id == vehicle_id)
+    remove_vehicle(vehicle_id)
+    _delete_documents(Document.vehicle_id == vehicle_id)
+    db.session.execute(
+        delete(ArchivedDocument)
+        .where(ArchivedDocument.vehicle_id == vehicle_id)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        delete(Vehicle).where(Vehicle.id == vehicle_id).execution_options(synchronize_session=False)
+    )
+    return files
+
+
+def hide_account(user, now=None):
+    # Frees the username and email straight away and drops queued
+    # reminders; the rows themselves go in purge_account. The caller commits.
+    user.deleted_at = now or datetime.utcnow()
+    user.username = f"deleted-{user.id}"
+    user.email = f"deleted-{user.id}@invalid"
+    user.phone = None
+    db.session.execute(
+        delete(OutboundMessage)
+        .where(OutboundMessage.user_id == user.id, OutboundMessage.status == "queued")
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _batch(model, criterion, size):
+    ids = select(model.id).where(criterion).limit(size)
+    return db.session.execute(
+        delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def purge_account(user_id, size=None):
+    # Deletes the account in batches, committing after each; returns the
+    # number of rows removed. Safe to rerun after an interruption.
+    size = size or current_app.config["ACCOUNT_PURGE_BATCH_SIZE"]
+    total = 0
+    while True:
+        rows = db.session.execute(
+            select(Document.id, Document.file_path).where(Document.user_id == user_id).limit(size)
+        ).all()
+        if not rows:
+            break
+        total += _delete_documents(Document.id.in_([row.id for row in rows]))
+        db.session.commit()
+        release_all(row.file_path for row in rows)
+
+    while True:
+        rows = db.session.execute(
+            select(ArchivedDocument.id, ArchivedDocument.file_path)
+            .where(ArchivedDocument.user_id == user_id)
+            .limit(size)
+        ).all()
+        if not rows:
+            break
+        total += db.session.execute(
+            delete(ArchivedDocument)
+            .where(ArchivedDocument.id.in_([row.id for row in rows]))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        release_all(row.file_path for row in rows)
+
+    for model, criterion in (
+        (ComplianceAlert, ComplianceAlert.user_id == user_id),
+        (DocumentVersion, DocumentVersion.user_id == user_id),
+        (Feedback, Feedback.user_id == user_id),
+        (OutboundMessage, OutboundMessage.user_id == user_id),
+        (Vehicle, Vehicle.user_id == user_id),
+    ):
+        while True:
+            deleted = _batch(model, criterion, size)
+            db.session.commit()
+            total += deleted
+            if deleted < size:
+                break
+
+    while True:
+        ids = select(Log.id).where(Log.user_id == user_id).limit(size)
+        detached = db.session.execute(
+            update(Log).where(Log.id.in_(ids)).values(user_id=None).execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if detached < size:
+            break
+
+    db.session.execute(
+        delete(UserStats).where(UserStats.user_id == user_id).execution_options(synchronize_session=False)
+    )
+    total += db.session.execute(
+        delete(User).where(User.id == user_id).execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return total
+
+
+def delete_account(user, now=None):
+    # Hides the account, then purges it here if it is small enough.
+    # Returns True if it is gone already, False if the job will finish it.
+    hide_account(user, now)
+    db.session.commit()
+    documents = db.session.scalar(select(func.count(Document.id)).where(Document.user_id == user.id))
+    documents += db.session.scalar(
+        select(func.count(ArchivedDocument.id)).where(ArchivedDocument.user_id == user.id)
+    )
+    if documents > current_app.config["ACCOUNT_DELETE_SYNC_LIMIT"]:
+        return False
+    purge_account(user.id)
+    return True
+
+
+def purge_deleted_accounts():
+    purged = 0
+    for user_id in db.session.scalars(select(User.id).where(User.deleted_at.isnot(None))).all():
+        rows = purge_account(user_id)
+        logging.info(f"Purged deleted account {user_id} ({rows} rows)")
+        purged += 1
+    return purged
+
+
+def init_app(app):
+    @app.cli.command("purge-accounts")
+    def purge_accounts_command():
+        """Finish purging deleted accounts."""
+        print(f"Purged {purge_deleted_accounts()} deleted accounts")
@@ -0,0 +1,130 @@
+import logging
+import math
+import re
+import time
+from functools import wraps
+
+from flask import current_app, request, session
+from werkzeug.exceptions import TooManyRequests
+
+from app.ttl_store import get_store
+
+# Sliding-window counters kept in the shared TTL store (RATELIMIT_STORE_URL),
+# so every worker on the host sees the same counts. The check runs before
+# the view, login_required and any logging decorator, i.e. before any
+# database or network work, and costs two store round-trips per key.
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+_LIMIT_RE = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*(second|minute|hour|day)s?\s*$")
+
+
+def parse_limit(spec):
+    match = _LIMIT_RE.match(spec or "")
+    if not match:
+        raise ValueError(f"Invalid rate limit: {spec!r} (expected e.g. '5/minute' or '20/15minutes')")
+    count, multiplier, period = match.groups()
+    return int(count), int(multiplier or 1) * _PERIODS[period]
+
+
+def _hit(store, key, limit, window):
+    # Weighted sum of the current and previous fixed windows: close to a
+    # true sliding window without storing individual timestamps.
+    now = time.time()
+    bucket = int(now // window)
+    current = store.incr(f"rl:{key}:{bucket}", window * 2)
+    previous = int(store.get(f"rl:{key}:{bucket - 1}") or 0)
+    weight = 1 - (now % window) / window
+    if previous * weight + current <= limit:
+        return None
+    return int(window - now % window) + 1
+
+
+def login_email():
+    # The submitted email together with the client address: failures from
+    # one address can't lock the account's owner out from another.
+    email = (request.form.get("email") or "").strip().lower()
+    return f"{email}:{request.remote_addr}" if email else None
+
+
+def session_user():
+    # Flask-Login keeps the id in the session; reading it avoids the user
+    # lookup that current_user would trigger.
+    return session.get("_user_id")
+
+
+def rate_limit(name, account=None, methods=None):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            config = current_app.config
+            if not config["RATELIMIT_ENABLED"] or (methods and request.method not in methods):
+                return f(*args, **kwargs)
+
+            checks = [(f"{name}:ip:{request.remote_addr}", config["RATELIMIT_PER_IP"])]
+            identity = account() if account else None
+            if identity:
+                checks.append((f"{name}:account:{identity}", config["RATELIMIT_PER_ACCOUNT"]))
+            # Last, so requests already refused for their address or account
+            # don't use up the limit every client shares.
+            checks.append((f"{name}:route", config["RATELIMIT_PER_ROUTE"]))
+
+            try:
+                store = get_store("RATELIMIT_STORE_URL")
+                for key, spec in checks:
+                    retry_after = _hit(store, key, *parse_limit(spec))
+                    if retry_after is not None:
+                        logging.warning(f"Rate limit exceeded for {key}")
+                        raise TooManyRequests(retry_after=retry_after)
+            except TooManyRequests:
+                raise
+            except Exception as e:
+                # Fail open: a broken limiter store must not take logins down.
+                logging.error(f"Rate limiter unavailable: {e}")
+            return f(*args, **kwargs)
+
+        return decorated_function
+
+    return decorator
+
+
+def send_window(rate):
+    # Whole-second window long enough for at least one send at rate (sends
+    # per second), and the sends it allows, rounded down.
+    window = 1 if rate >= 1 else math.ceil(1 / rate)
+    return window, max(1, int(rate * window))
+
+
+def acquire_send_slot(provider, bulk=False):
+    # Blocks until provider (smtp, twilio) has room under its sends-per-second
+    # ceiling, counted per window in the shared store so all processes on the
+    # host share it. Bulk sends stop at BULK_SEND_SHARE of each window and
+    # always leave at least one send to OTPs and other interactive sends;
+    # where a window only allows one, bulk sends take it only when the
+    # previous window was unused, so an interactive send never waits for
+    # more than one window. Returns the seconds spent waiting.
+    config = current_app.config
+    rate = config["SEND_RATE_LIMITS"].get(provider)
+    if not rate:
+        return 0.0
+    window, limit = send_window(rate)
+    if bulk:
+        limit = min(int(limit * config["BULK_SEND_SHARE"]), limit - 1)
+    waited = 0.0
+    try:
+        store = get_store("RATELIMIT_STORE_URL")
+        while True:
+            now = time.time()
+            bucket = int(now // window)
+            key = f"send:{provider}:{bucket}"
+            if limit >= 1:
+                free = int(store.get(key) or 0) < limit
+            else:
+                free = not int(store.get(key) or 0) and not int(store.get(f"send:{provider}:{bucket - 1}") or 0)
+            if free and store.incr(key, window * 2 + 1) <= max(limit, 1):
+                return waited
+            pause = (bucket + 1) * window - now
+            time.sleep(pause)
+            waited += pause
+    except Exception as e:
+        logging.error(f"Send rate limiter unavailable: {e}")
+        return waited
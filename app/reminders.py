@@ -0,0 +1,139 @@
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, select, update
+
+from app import db
+from app.models import Document
+
+# Expiry reminders as a timer queue. Every document carries
+# next_reminder_at: the next of REMINDER_THRESHOLDS_DAYS before its end_date,
+# at REMINDER_HOUR local time. It is recomputed whenever end_date is set
+# (create, edit, renew), and the worker only ever touches rows whose time
+# has come, so a tick costs one index range scan plus the due reminders.
+
+
+def reminder_times(end_date, thresholds, hour, tz):
+    # Naive UTC, like the other DateTime columns; earliest first.
+    day = end_date.date() if isinstance(end_date, datetime) else end_date
+    zone = ZoneInfo(tz)
+    times = []
+    for days in sorted(set(thresholds), reverse=True):
+        local = datetime.combine(day - timedelta(days=days), time(hour), zone)
+        times.append(local.astimezone(timezone.utc).replace(tzinfo=None))
+    return times
+
+
+def next_reminder_at(end_date, after=None):
+    if end_date is None:
+        return None
+    config = current_app.config
+    after = after or datetime.utcnow()
+    for at in reminder_times(
+        end_date, config["REMINDER_THRESHOLDS_DAYS"], config["REMINDER_HOUR"], config["TIMEZONE"]
+    ):
+        if at > after:
+            return at
+    return None
+
+
+@event.listens_for(Document.end_date, "set")
+def _reschedule_on_end_date(target, value, oldvalue, initiator):
+    # Outside an app (plain scripts) the column stays as it is; run
+    # "flask schedule-reminders" afterwards.
+    if has_app_context() and isinstance(value, (date, datetime)):
+        target.next_reminder_at = next_reminder_at(value)
+
+
+def due_reminders_query(now, limit, skip=()):
+    query = (
+        select(Document.id, Document.next_reminder_at)
+        .where(Document.next_reminder_at <= now)
+        .order_by(Document.next_reminder_at)
+        .limit(limit)
+    )
+    if skip:
+        query = query.where(Document.id.not_in(skip))
+    return query
+
+
+def next_due():
+    return db.session.scalar(select(func.min(Document.next_reminder_at)))
+
+
+def send_due_reminders(now=None):
+    # Pops due reminders oldest first and returns how many were queued for
+    # delivery (app/outbox.py). Each row is claimed by moving
+    # next_reminder_at on from the value that was read, in the transaction
+    # that queues its messages, so concurrent workers never queue the same
+    # reminder twice and one that fails to queue stays due for the next run.
+    # Thresholds missed while no worker ran produce a single reminder.
+    from app.routes import notify_user
+
+    now = now or datetime.utcnow()
+    batch_size = current_app.config["REMINDER_BATCH_SIZE"]
+    sent = 0
+    failed = set()
+    while True:
+        due = db.session.execute(due_reminders_query(now, batch_size, failed)).all()
+        if not due:
+            return sent
+        for document_id, due_at in due:
+            document = db.session.get(Document, document_id)
+            if document is None:
+                continue
+            claimed = db.session.execute(
+                update(Document)
+                .where(Document.id == document_id, Document.next_reminder_at == due_at)
+                .values(next_reminder_at=next_reminder_at(document.end_date, now))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not claimed:
+                db.session.commit()
+                continue
+            try:
+                notify_user(document)
+                db.session.commit()
+                sent += 1
+            except Exception as e:
+                db.session.rollback()
+                failed.add(document_id)
+                logging.error(f"Failed to queue expiry reminder for document {document_id}: {e}")
+
+
+def reschedule_all(batch_size=1000):
+    # Recomputes next_reminder_at for every document, e.g. after the
+    # thresholds change or for rows written with Core inserts.
+    now = datetime.utcnow()
+    last_id = 0
+    total = 0
+    while True:
+        rows = db.session.execute(
+            select(Document.id, Document.end_date)
+            .where(Document.id > last_id)
+            .order_by(Document.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return total
+        db.session.execute(update(Document), [
+            {"id": document_id, "next_reminder_at": next_reminder_at(end_date, now)}
+            for document_id, end_date in rows
+        ])
+        db.session.commit()
+        last_id = rows[-1].id
+        total += len(rows)
+
+
+def init_app(app):
+    @app.cli.command("schedule-reminders")
+    def schedule_reminders_command():
+        """Recompute the next expiry reminder time of every document."""
+        print(f"Scheduled reminders for {reschedule_all()} documents")
+
+    @app.cli.command("send-reminders")
+    def send_reminders_command():
+        """Queue the expiry reminders that are due now."""
+        print(f"Queued {send_due_reminders()} reminders")
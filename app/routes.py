@@ -12,8 +12,8 @@ from flask import (
 import json
 from app.forms import OTPDeletionForm
 from flask_login import login_user, current_user, logout_user, login_required
-from app import db, bcrypt
-from app.models import User, Vehicle, Document, Log, Feedback
+from app import db
+from app.models import User, Vehicle, Document, ArchivedDocument, Log, Feedback
 from app.forms import (
     RegistrationForm,
     LoginForm,
@@ -29,18 +29,27 @@ from app.forms import (
     DocumentForm, 
     FeedbackForm,
     ProfileForm,
+    DocumentFileForm,
 )
 from app.notification_utils import send_notification
 from sqlalchemy.exc import IntegrityError
 import logging
-from twilio.rest import Client
-from app.notification_utils import send_email, send_sms
-import os
-import random
+from app.notification_utils import send_sms
+from app.outbox import enqueue
+from app.delivery import unsuppress
+from app.archive import archived_documents_query
+from app.history import document_timeline_query, documents_as_of, vehicle_history_query
+from app.purge import delete_account as delete_account_rows, delete_vehicle as delete_vehicle_rows
 from itsdangerous import URLSafeTimedSerializer
 from flask import current_app
 import re
 from app.utils import log_action, log_action_decorator, send_otp
+from app.hashing import check_password, hash_password, verify_and_rehash
+from app.ratelimit import rate_limit, login_email, session_user
+from app.otp import issue_otp, check_otp, grant, has_grant, consume_grant
+from app.counters import get_user_stats
+from app.compliance import get_compliance_summary, open_compliance_alerts, resolve_compliance_alerts
+from app.storage import UploadRejected, attach_file, release, release_all, send_document, send_rendition
 from flask import jsonify, Blueprint
 from sqlalchemy import text, String
 
@@ -67,7 +76,21 @@ def index():
 @login_required
 def home():
     vehicles = Vehicle.query.filter_by(owner=current_user).all()
-    return render_template("home.html", vehicles=vehicles)
+    return render_template("home.html", vehicles=vehicles, stats=get_user_stats(current_user.id))
+
+
+@main.route("/compliance")
+@login_required
+def compliance_dashboard():
+    summary = get_compliance_summary(current_user.id)
+    limit = current_app.config["COMPLIANCE_DASHBOARD_VEHICLE_LIMIT"]
+    return render_template(
+        "compliance_dashboard.html",
+        summary=summary,
+        alerts=open_compliance_alerts(current_user.id),
+        vehicles=summary["vehicles"][:limit],
+        hidden_vehicles=max(len(summary["vehicles"]) - limit, 0),
+    )
 
 
 def generate_recovery_token(user_email):
@@ -86,24 +109,16 @@ def verify_recovery_token(token, expiration=3600):
     return email
 
 
-def send_sms(to, body):
-    account_sid = os.environ.get("TWILIO_ACCOUNT_SID")
-    auth_token = os.environ.get("TWILIO_AUTH_TOKEN")
-    twilio_phone_number = os.environ.get("TWILIO_PHONE_NUMBER")
-
-    client = Client(account_sid, auth_token)
-    client.messages.create(body=body, from_=twilio_phone_number, to=to)
-    logging.info(f"SMS sent successfully to {to}")
-
-
+# Queues the reminder for the user's delivery window (app/outbox.py).
 def notify_user(document):
     user = document.vehicle.owner
-    expiration_alert_period = timedelta(days=10) 
-    current_time = datetime.utcnow()
+    if user.deleted_at or not user.notifications_enabled:
+        return
+    reminder_window = max(current_app.config["REMINDER_THRESHOLDS_DAYS"])
+    days_left = (document.end_date.date() - datetime.utcnow().date()).days
 
-    if 0 <= (document.end_date - current_time).days <= expiration_alert_period.days:
+    if 0 <= days_left <= reminder_window:
         subject = f"Document Expiry Notification for {document.document_type}"
-        recipients = [user.email]
         renewal_link = url_for(
             "main.renew_document", document_id=document.id, _external=True
         )
@@ -118,17 +133,19 @@ def notify_user(document):
             f"Best regards,\n"
             f"Fleet Management Team"
         )
-        send_email(subject, recipients, body)
+        enqueue("email", user.email, body, subject=subject, user=user)
 
         if user.phone:
             sms_body = (
                 f"Reminder: Your {document.document_type} for vehicle {document.vehicle.name} ({document.vehicle.vehicle_number}) "
                 f"expires on {document.end_date.strftime('%Y-%m-%d')}. Renew: {renewal_link}"
             )
-            send_sms(user.phone, sms_body)
+            enqueue("sms", user.phone, sms_body, user=user)
+        db.session.commit()
 
 
 @main.route("/login", methods=["GET", "POST"])
+@rate_limit("login", account=login_email, methods=("POST",))
 @log_action_decorator("User attempted to log in")
 def login():
     if current_user.is_authenticated:
@@ -139,24 +156,24 @@ def login():
         user = User.query.filter_by(email=form.email.data).first()
         
         if form.submit.data:  
-            if user and bcrypt.check_password_hash(user.password, form.password.data):
+            if user and verify_and_rehash(user, form.password.data):
                 logging.info(f"User found: {user}")
+                db.session.commit()
                 login_user(user, remember=True)
-                log_action(user, f"User {user.username} logged in with password") 
+                log_action(f"User {user.username} logged in with password", user)
                 return redirect(url_for("main.home"))
             else:
                 flash("Login unsuccessful. Please check email and password.", "danger")
                 logging.warning("Login unsuccessful. User not found or wrong password.")
         elif form.request_otp.data:
             if user:
-                otp = random.randint(100000, 999999)
-                session["otp"] = otp
-                session["user_id"] = user.id
+                otp = issue_otp("login", user.id)
+                session["otp_user_id"] = user.id
                 send_notification(
                     "Your OTP Code", [user.email], f"Your OTP code is {otp}"
                 )
                 flash("An OTP has been sent to your email.", "info")
-                log_action(user, f"User {user.username} requested OTP for login") 
+                log_action(f"User {user.username} requested OTP for login", user)
                 return redirect(url_for("main.verify_otp"))
             else:
                 flash("No account found with that email.", "danger")
@@ -174,19 +191,25 @@ def learn_more():
 def verify_otp():
     form = OTPForm()
     if form.validate_on_submit():
-        if "otp" in session and form.otp.data == session["otp"]:
-            user = User.query.get(session["user_id"])
+        user_id = session.get("otp_user_id")
+        result = check_otp("login", user_id, form.otp.data) if user_id else None
+        if result and result.ok:
+            user = User.query.get(user_id)
             login_user(user, remember=True)
-            session.pop("otp")
-            session.pop("user_id")
+            session.pop("otp_user_id", None)
             log_action(f"User {user.username} logged in with OTP")
             return redirect(url_for("main.home"))
+        elif result and result.reason == "locked":
+            session.pop("otp_user_id", None)
+            flash("Maximum attempts reached. Please request a new OTP.", "danger")
+            return redirect(url_for("main.login"))
         else:
             flash("Invalid OTP. Please try again.", "danger")
     return render_template("verify_otp.html", form=form)
 
 
 @main.route("/password_recovery", methods=["GET", "POST"])
+@rate_limit("password_recovery", account=login_email, methods=("POST",))
 def password_recovery():
     form = PasswordRecoveryForm()
     if form.validate_on_submit():
@@ -220,10 +243,7 @@ def reset_password(token):
 
     form = ResetPasswordForm()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode(
-            "utf-8"
-        )
-        user.password = hashed_password
+        user.password = hash_password(form.password.data)
         db.session.commit()
         flash("Your password has been updated!", "success")
         log_action(f"User {user.username} reset their password")
@@ -239,9 +259,7 @@ def register():
 
     form = RegistrationForm()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode(
-            "utf-8"
-        )
+        hashed_password = hash_password(form.password.data)
         user = User(
             username=form.username.data,
             email=form.email.data,
@@ -277,7 +295,39 @@ def view_vehicle(vehicle_id):
         .order_by(Document.id.desc())
         .all()
     ) 
-    return render_template("vehicle.html", vehicle=vehicle, documents=documents)
+    archived = None
+    if request.args.get("archived"):
+        archived = db.session.scalars(
+            archived_documents_query(ArchivedDocument.vehicle_id == vehicle.id)
+        ).all()
+    return render_template("vehicle.html", vehicle=vehicle, documents=documents, archived=archived)
+
+
+@main.route("/vehicle/<int:vehicle_id>/history")
+@login_required
+def vehicle_history(vehicle_id):
+    vehicle = Vehicle.query.get_or_404(vehicle_id)
+    if vehicle.owner != current_user:
+        abort(403)
+    as_of = request.args.get("as_of", type=lambda value: datetime.strptime(value, "%Y-%m-%d"))
+    if as_of:
+        # The whole day counts: changes made on as_of are included.
+        versions = documents_as_of(vehicle.id, as_of + timedelta(days=1))
+    else:
+        versions = db.session.scalars(vehicle_history_query(vehicle.id)).all()
+    return render_template("vehicle_history.html", vehicle=vehicle, versions=versions, as_of=as_of)
+
+
+@main.route("/document/<int:document_id>/history")
+@login_required
+def document_history(document_id):
+    # Also works for deleted documents, whose history is kept.
+    versions = db.session.scalars(document_timeline_query(document_id)).all()
+    if not versions:
+        abort(404)
+    if versions[0].user_id != current_user.id:
+        abort(403)
+    return render_template("document_history.html", versions=versions)
 
 
 @main.route("/vehicle/<int:vehicle_id>/document/new", methods=["GET", "POST"])
@@ -390,7 +440,19 @@ def profile():
             }
         vehicle_documents[vehicle.id]["documents"].append(document)
     
-    return render_template("profile.html", vehicle_documents=vehicle_documents)
+    archived = None
+    if request.args.get("archived"):
+        archived = db.session.scalars(
+            archived_documents_query(ArchivedDocument.user_id == current_user.id)
+        ).all()
+
+    return render_template(
+        "profile.html",
+        vehicle_documents=vehicle_documents,
+        archived=archived,
+        stats=get_user_stats(current_user.id),
+        alerts=open_compliance_alerts(current_user.id),
+    )
 
 
 @main.route("/vehicle/<int:vehicle_id>/edit", methods=["GET", "POST"])
@@ -440,25 +502,17 @@ def new_vehicle():
 @login_required
 @log_action_decorator("User deleting a vehicle")
 def delete_vehicle(vehicle_id):
-    if (
-        "otp_verified" in session
-        and session["otp_verified"]
-        and "delete_vehicle_id" in session
-        and session["delete_vehicle_id"] == vehicle_id
-    ):
+    if consume_grant(f"delete_vehicle:{vehicle_id}", current_user.id):
         vehicle = Vehicle.query.get_or_404(vehicle_id)
         if vehicle.owner != current_user:
             abort(403)
 
-        session.pop("delete_otp", None)
-        session.pop("delete_vehicle_id", None)
-        session.pop("otp_verified", None)
-        session.pop("otp_attempts", None) 
-
-        db.session.delete(vehicle)
+        name = vehicle.name
+        files = delete_vehicle_rows(vehicle.id)
         db.session.commit()
+        release_all(files)
         flash("Your vehicle has been deleted!", "success")
-        log_action(f"User {current_user.username} deleted vehicle {vehicle.name}")
+        log_action(f"User {current_user.username} deleted vehicle {name}")
         return redirect(url_for("main.list_vehicles"))
     else:
         flash("Unauthorized operation or OTP verification failed.", "danger")
@@ -581,6 +635,7 @@ def delete_document(vehicle_id, document_id):
         abort(403)
     db.session.delete(document)
     db.session.commit()
+    release(document.file_path)
     flash("Your document has been deleted!", "success")
     return redirect(url_for("main.view_vehicle", vehicle_id=vehicle.id))
 
@@ -596,6 +651,7 @@ def renew_document(document_id):
     if form.validate_on_submit():
         document.start_date = form.start_date.data
         document.end_date = form.end_date.data
+        resolve_compliance_alerts(document.id)
         db.session.commit()
         flash("Your document has been renewed!", "success")
         return redirect(url_for("main.view_vehicle", vehicle_id=document.vehicle_id))
@@ -615,22 +671,17 @@ def view_logs():
 
 
 @main.route("/send_delete_otp/<int:vehicle_id>", methods=["POST"])
+@rate_limit("send_delete_otp", account=session_user)
 @login_required
 def send_delete_otp(vehicle_id):
     vehicle = Vehicle.query.get_or_404(vehicle_id)
     if vehicle.owner != current_user:
         abort(403)
 
-    otp = random.randint(100000, 999999)
-    session["delete_otp"] = otp
-    session["delete_vehicle_id"] = vehicle_id
-    session['otp_attempts'] = 0 
+    otp = issue_otp(f"delete_vehicle:{vehicle_id}", current_user.id)
 
     send_notification("Your OTP Code for Deletion", [current_user.email], f"Your OTP code is {otp}")
 
-    print(f"[DEBUG] OTP generated: {otp}")
-    print(f"[DEBUG] Session: {session}")
-
     flash("An OTP for deletion has been sent to your email.", "info")
     return redirect(url_for("main.verify_delete_otp", vehicle_id=vehicle_id))
 
@@ -640,34 +691,20 @@ def send_delete_otp(vehicle_id):
 def verify_delete_otp(vehicle_id):
     vehicle = Vehicle.query.get_or_404(vehicle_id)
     form = OTPDeletionForm()
-    attempt_limit = 3
-
-    if 'otp_attempts' not in session:
-        session['otp_attempts'] = 0
+    purpose = f"delete_vehicle:{vehicle_id}"
 
     if form.validate_on_submit():
-        entered_otp = form.otp.data
-        session_otp = session.get('delete_otp')
-        delete_vehicle_id = session.get('delete_vehicle_id')
-
-        print(f"[DEBUG - OTP Verification] Entered OTP: {entered_otp}")
-        print(f"[DEBUG - OTP Verification] Session OTP: {session_otp}")
-        print(f"[DEBUG - OTP Verification] Session Vehicle ID: {delete_vehicle_id}, Provided Vehicle ID: {vehicle_id}")
-
-        if entered_otp == session_otp and delete_vehicle_id == vehicle_id:
-            print("[DEBUG - OTP Verification] OTP Verified Successfully")
-            session["otp_verified"] = True
-            print(f"[DEBUG - OTP Verification] Session State: {session}")
+        result = check_otp(purpose, current_user.id, form.otp.data)
+
+        if result.ok:
+            grant(purpose, current_user.id)
             return redirect(url_for("main.confirm_delete_vehicle", vehicle_id=vehicle_id))
         else:
-            session['otp_attempts'] += 1
-            print(f"[DEBUG - OTP Verification] OTP Attempts: {session['otp_attempts']}")
+            current_app.logger.warning(f"Vehicle deletion OTP rejected for user {current_user.id}: {result.reason}")
             flash("Invalid OTP. Please try again.", "danger")
 
-            if session['otp_attempts'] >= attempt_limit:
-                otp = random.randint(100000, 999999)
-                session["delete_otp"] = otp
-                session['otp_attempts'] = 0
+            if result.reason == "locked":
+                otp = issue_otp(purpose, current_user.id)
                 send_notification("Your New OTP Code for Deletion", [current_user.email], f"Your OTP code is {otp}")
                 flash("Maximum attempts reached. A new OTP has been sent to your email.", "info")
                 return redirect(url_for("main.verify_delete_otp", vehicle_id=vehicle_id))
@@ -678,6 +715,9 @@ def verify_delete_otp(vehicle_id):
 @login_required
 def confirm_delete_vehicle(vehicle_id):
     vehicle = Vehicle.query.get_or_404(vehicle_id) 
+    if not has_grant(f"delete_vehicle:{vehicle_id}", current_user.id):
+        flash("Unauthorized operation or OTP verification failed.", "danger")
+        return redirect(url_for("main.home"))
     if request.method == "POST":
         print("[DEBUG] Confirm deletion POST request")
         return redirect(url_for("main.delete_vehicle_post_otp", vehicle_id=vehicle_id))
@@ -688,26 +728,16 @@ def confirm_delete_vehicle(vehicle_id):
 @login_required
 @log_action_decorator("User deleting a vehicle")
 def delete_vehicle_post_otp(vehicle_id):
-    session_vehicle_id = session.get("delete_vehicle_id")
-    otp_verified = session.get("otp_verified")
-
-    print(f"[DEBUG - Deletion] Session Vehicle ID: {session_vehicle_id}")
-    print(f"[DEBUG - Deletion] Session OTP Verified: {otp_verified}")
-    print(f"[DEBUG - Deletion] Provided Vehicle ID: {vehicle_id}")
-
-    if otp_verified and session_vehicle_id == vehicle_id:
+    if consume_grant(f"delete_vehicle:{vehicle_id}", current_user.id):
         vehicle = Vehicle.query.get_or_404(vehicle_id)
         if vehicle.owner != current_user:
             abort(403)
 
-        session.pop("delete_otp", None)
-        session.pop("delete_vehicle_id", None)
-        session.pop("otp_verified", None)
-        session.pop('otp_attempts', None)
-
-        db.session.delete(vehicle)
+        name = vehicle.name
+        files = delete_vehicle_rows(vehicle.id)
         db.session.commit()
-        log_action(f"User {current_user.username} deleted vehicle {vehicle.name}", current_user)
+        release_all(files)
+        log_action(f"User {current_user.username} deleted vehicle {name}", current_user)
 
         print(f"[DEBUG - Deletion Success] Vehicle {vehicle_id} deleted successfully.")
         return redirect(url_for("main.list_vehicles"))
@@ -719,6 +749,7 @@ def delete_vehicle_post_otp(vehicle_id):
 @main.route(
     "/send_delete_document_otp/<int:vehicle_id>/<int:document_id>", methods=["POST"]
 ) 
+@rate_limit("send_delete_document_otp", account=session_user)
 @login_required
 def send_delete_document_otp(vehicle_id, document_id):
     vehicle = Vehicle.query.get_or_404(vehicle_id)
@@ -726,10 +757,7 @@ def send_delete_document_otp(vehicle_id, document_id):
     if vehicle.owner != current_user or document.vehicle_id != vehicle.id:
         abort(403)
 
-    otp = random.randint(100000, 999999)
-    session["delete_document_otp"] = otp
-    session["delete_document_id"] = document_id
-    session["delete_vehicle_id"] = vehicle_id
+    otp = issue_otp(f"delete_document:{document_id}", current_user.id)
     send_notification(
         "Your OTP Code for Deletion",
         [current_user.email],
@@ -753,26 +781,12 @@ def send_delete_document_otp(vehicle_id, document_id):
 @login_required
 def verify_delete_document_otp(vehicle_id, document_id):
     form = OTPDeletionForm()
-    attempt_limit = 3 
-
-    if "otp_attempts_doc" not in session:
-        session["otp_attempts_doc"] = 0
+    purpose = f"delete_document:{document_id}"
 
     if form.validate_on_submit():
-        print(f"Provided OTP: {form.otp.data}")
-        print(f"Session OTP: {session.get('delete_document_otp')}")
-        if (
-            "delete_document_otp" in session
-            and form.otp.data == session["delete_document_otp"]
-            and "delete_document_id" in session
-            and session["delete_document_id"] == document_id
-        ):
+        result = check_otp(purpose, current_user.id, form.otp.data)
+        if result.ok:
             print("OTP verification successful.")
-            session.pop("delete_document_otp", None)
-            session.pop("delete_document_id", None)
-            session.pop("delete_vehicle_id", None)
-            session.pop("otp_attempts_doc", None) 
-
             document = Document.query.get_or_404(document_id)
             if (
                 document.vehicle.owner != current_user
@@ -782,19 +796,17 @@ def verify_delete_document_otp(vehicle_id, document_id):
 
             db.session.delete(document)
             db.session.commit()
+            release(document.file_path)
             flash("Your document has been deleted!", "success")
             log_action(
                 f"User {current_user.username} deleted document {document.document_type} for vehicle {document.vehicle.name}"
             )
             return redirect(url_for("main.view_vehicle", vehicle_id=vehicle_id))
         else:
-            session["otp_attempts_doc"] += 1
-            print(f"OTP attempts: {session['otp_attempts_doc']}")
+            current_app.logger.warning(f"Document deletion OTP rejected for user {current_user.id}: {result.reason}")
             flash("Invalid OTP. Please try again.", "danger")
-            if session["otp_attempts_doc"] >= attempt_limit:
-                otp = random.randint(100000, 999999)
-                session["delete_document_otp"] = otp
-                session["otp_attempts_doc"] = 0 
+            if result.reason == "locked":
+                otp = issue_otp(purpose, current_user.id)
                 send_notification(
                     "Your New OTP Code for Deletion",
                     [current_user.email],
@@ -828,9 +840,7 @@ def edit_profile():
 
         if new_phone != current_user.phone:
             print(f"Phone number changed from {current_user.phone} to {new_phone}")
-            session['new_phone'] = new_phone
-            otp = random.randint(100000, 999999)
-            session["otp"] = otp
+            otp = issue_otp("change_phone", current_user.id, payload=new_phone)
             send_sms(new_phone, f"Your OTP code is {otp}")
             flash("An OTP has been sent to your new phone number. Please verify to complete the change.", "info")
             return redirect(url_for('main.verify_phone_change_otp'))
@@ -860,15 +870,15 @@ def verify_phone_change_otp():
     form = OTPForm()
 
     if form.validate_on_submit():
-        provided_otp = form.otp.data
-        if "otp" in session and session["otp"] == provided_otp:
-            new_phone = session.get('new_phone')
+        result = check_otp("change_phone", current_user.id, form.otp.data)
+        if result.ok:
+            new_phone = result.payload
             if new_phone:
                 current_user.phone = new_phone
+                # The OTP just reached this number, so it no longer bounces.
+                unsuppress("sms", new_phone)
                 try:
                     db.session.commit()
-                    session.pop("otp", None)
-                    session.pop("new_phone", None)
                     flash("Your phone number has been updated successfully!", "success")
                     return redirect(url_for('main.profile'))
                 except Exception as e:
@@ -877,6 +887,9 @@ def verify_phone_change_otp():
                     print(f"Error updating phone number: {e}")
             else:
                 flash("No phone number change request found.", "danger")
+        elif result.reason == "locked":
+            flash("Maximum attempts reached. Please request the phone change again.", "danger")
+            return redirect(url_for('main.edit_profile'))
         else:
             flash("Invalid OTP. Please try again.", "danger")
 
@@ -887,9 +900,8 @@ def verify_phone_change_otp():
 def update_password():
     form = UpdatePasswordForm()
     if form.validate_on_submit():
-        if bcrypt.check_password_hash(current_user.password, form.current_password.data):
-            hashed_password = bcrypt.generate_password_hash(form.new_password.data).decode("utf-8")
-            current_user.password = hashed_password
+        if check_password(current_user.password, form.current_password.data):
+            current_user.password = hash_password(form.new_password.data)
             db.session.commit()
             flash("Your password has been updated!", "success")
             return redirect(url_for('main.profile'))
@@ -903,9 +915,13 @@ def manage_notifications():
     form = ManageNotificationsForm()
     if form.validate_on_submit():
         current_user.notifications_enabled = form.notifications_enabled.data
+        current_user.timezone = form.timezone.data or None
         db.session.commit()
         flash("Notification preferences updated.", "success")
         return redirect(url_for('main.profile'))
+    elif request.method == "GET":
+        form.notifications_enabled.data = current_user.notifications_enabled
+        form.timezone.data = current_user.timezone or ""
     return render_template('manage_notifications.html', form=form)
 
 @main.route("/profile/adjust_privacy_settings", methods=["GET", "POST"])
@@ -917,32 +933,82 @@ def adjust_privacy_settings():
         db.session.commit()
         flash("Privacy settings updated.", "success")
         return redirect(url_for('main.profile'))
+    elif request.method == "GET":
+        form.privacy_settings.data = current_user.privacy_settings
     return render_template('adjust_privacy_settings.html', form=form)
 
 @main.route("/profile/upload_document", methods=["GET", "POST"])
 @login_required
 def upload_document():
-    form = DocumentForm()
+    form = DocumentFileForm()
+    documents = (
+        Document.query.join(Vehicle)
+        .filter(Document.user_id == current_user.id)
+        .with_entities(Document.id, Document.document_type, Vehicle.name)
+        .order_by(Vehicle.name, Document.document_type)
+        .all()
+    )
+    form.document_id.choices = [(id, f"{vehicle} - {document_type}") for id, document_type, vehicle in documents]
+    if request.method == "GET" and request.args.get("document_id", type=int):
+        form.document_id.data = request.args.get("document_id", type=int)
+
     if form.validate_on_submit():
-        document = Document(
-            document_type=form.document_type.data,
-            start_date=form.start_date.data,
-            end_date=form.end_date.data,
-            user_id=current_user.id
-        )
-        db.session.add(document)
-        db.session.commit()
-        flash("Your document has been uploaded!", "success")
-        return redirect(url_for("main.profile"))
+        document = Document.query.get_or_404(form.document_id.data)
+        if document.user_id != current_user.id:
+            abort(403)
+        try:
+            previous = attach_file(document, form.file.data.stream, form.file.data.filename)
+        except UploadRejected as e:
+            flash(str(e), "danger")
+        else:
+            db.session.commit()
+            release(previous)
+            flash("Your document has been uploaded!", "success")
+            return redirect(url_for("main.profile"))
     return render_template("upload_document.html", form=form)
 
-# @main.route("/profile/download_document/<int:document_id>")
-# @login_required
-# def download_document(document_id):
-#     document = Document.query.get_or_404(document_id)
-#     if document.user_id != current_user.id:
-#         abort(403)
-#     return send_file(document.file_path, as_attachment=True)
+@main.route("/profile/documents/<int:document_id>/file", methods=["PUT"])
+@login_required
+def put_document_file(document_id):
+    # Raw request body, read straight from the socket in chunks; for
+    # clients that can stream large scans without a multipart envelope.
+    document = Document.query.get_or_404(document_id)
+    if document.user_id != current_user.id:
+        abort(403)
+    filename = request.args.get("filename") or request.headers.get("X-File-Name")
+    try:
+        previous = attach_file(document, request.stream, filename)
+    except UploadRejected as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    db.session.commit()
+    release(previous)
+    return jsonify({
+        "success": True,
+        "sha256": document.file_path,
+        "size": document.file_size,
+        "mimetype": document.file_mimetype,
+    })
+
+@main.route("/profile/download_document/<int:document_id>")
+@login_required
+def download_document(document_id):
+    # Archived documents keep their id, so the same link still works.
+    document = db.session.get(Document, document_id) or db.get_or_404(ArchivedDocument, document_id)
+    if document.user_id != current_user.id:
+        abort(403)
+    if not document.file_path:
+        abort(404)
+    return send_document(document)
+
+@main.route("/profile/documents/<int:document_id>/<any(thumb, preview):rendition>")
+@login_required
+def document_rendition(document_id, rendition):
+    document = db.session.get(Document, document_id) or db.get_or_404(ArchivedDocument, document_id)
+    if document.user_id != current_user.id:
+        abort(403)
+    if document.preview_status != "ready":
+        abort(404)
+    return send_rendition(document, rendition)
 
 @main.route("/profile/delete_document/<int:document_id>", methods=["POST"])
 @login_required
@@ -952,6 +1018,7 @@ def delete_profile_document(document_id):
         abort(403)
     db.session.delete(document)
     db.session.commit()
+    release(document.file_path)
     flash("Your document has been deleted!", "success")
     return redirect(url_for("main.profile"))
 
@@ -996,10 +1063,10 @@ def feedback_form():
     return render_template('feedback_form.html', form=form)
 
 @main.route("/account/delete_request")
+@rate_limit("delete_account_request", account=session_user)
 @login_required
 def delete_account_request():
-    otp = send_otp(current_user.email)
-    session['delete_otp'] = otp
+    send_otp(current_user.email, "delete_account", current_user.id)
     flash("An OTP has been sent to your email. Please enter the OTP to confirm account deletion.", "info")
     return redirect(url_for("main.confirm_delete_account"))
 
@@ -1007,9 +1074,14 @@ def delete_account_request():
 @login_required
 def confirm_delete_account():
     if request.method == "POST":
-        otp = request.form.get('otp')
-        if verify_otp(session.get('delete_otp'), otp):
-            return redirect(url_for("main.delete_account"))
+        result = check_otp("delete_account", current_user.id, request.form.get('otp'))
+        if result.ok:
+            grant("delete_account", current_user.id)
+            # 307 keeps the POST so it reaches the POST-only delete route.
+            return redirect(url_for("main.delete_account"), code=307)
+        elif result.reason == "locked":
+            flash("Maximum attempts reached. A new OTP has been sent to your email.", "info")
+            return redirect(url_for("main.delete_account_request"))
         else:
             flash("Invalid OTP. Please try again.", "danger")
             return redirect(url_for("main.confirm_delete_account"))
@@ -1018,11 +1090,13 @@ def confirm_delete_account():
 @main.route("/account/delete", methods=["POST"])
 @login_required
 def delete_account():
+    if not consume_grant("delete_account", current_user.id):
+        flash("Unauthorized operation or OTP verification failed.", "danger")
+        return redirect(url_for("main.home"))
     user = User.query.get_or_404(current_user.id)
-    db.session.delete(user)
-    db.session.commit()
-    log_action(f"User {current_user.username} deleted their account", user)
+    log_action(f"User {user.username} deleted their account", user)
     logout_user()
+    delete_account_rows(user)
     flash("Your account has been deleted.", "success")
     return redirect(url_for("main.index"))
 
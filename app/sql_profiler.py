@@ -0,0 +1,154 @@
+import logging
+import os
+import sys
+import time
+from collections import Counter
+
+from flask import current_app, g, has_request_context
+from sqlalchemy import event
+
+from app import db
+
+# Opt-in (SQL_PROFILER_ENABLED): the cursor listeners are only registered
+# when the profiler is on, and each of them starts with one check of
+# _active, so switching it off at runtime costs a single branch per
+# statement.
+
+logger = logging.getLogger("app.sql")
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_SKIP_FILES = {os.path.abspath(__file__), os.path.join(_APP_DIR, "metrics.py")}
+
+_active = False
+_slow_seconds = None
+
+
+class Statement:
+    __slots__ = ("sql", "params", "seconds", "call_site")
+
+    def __init__(self, sql, params, seconds, call_site):
+        self.sql = sql
+        self.params = params
+        self.seconds = seconds
+        self.call_site = call_site
+
+
+def redact(parameters):
+    # Keep the shape (names, types, batch size) but never the values:
+    # parameters carry emails, phone numbers and password hashes.
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f"[{len(parameters)} rows of {redact(parameters[0])}]"
+        return tuple(type(value).__name__ for value in parameters)
+    return type(parameters).__name__
+
+
+def call_site():
+    # First frame inside the app package that isn't this module, i.e. the
+    # view, model or helper that triggered the statement.
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_APP_DIR) and filename not in _SKIP_FILES:
+            return f"{os.path.relpath(filename, os.path.dirname(_APP_DIR))}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "<outside app>"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not _active:
+        return
+    conn.info.setdefault("profiler_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not _active:
+        return
+    seconds = time.perf_counter() - conn.info["profiler_started"].pop()
+    slow = _slow_seconds is not None and seconds >= _slow_seconds
+    in_request = has_request_context()
+    if not slow and not in_request:
+        return
+
+    site = call_site()
+    if slow:
+        logger.warning(
+            f"Slow query ({seconds * 1000:.1f} ms) at {site}: "
+            f"{' '.join(statement.split())} params={redact(parameters)}"
+        )
+    if in_request:
+        profile = g.get("sql_profile")
+        if profile is None:
+            profile = g.sql_profile = []
+        profile.append(Statement(statement, redact(parameters), seconds, site))
+
+
+def _handle_error(context):
+    # See app/metrics.py: failed statements skip after_cursor_execute.
+    if context.connection is not None and context.connection.info.get("profiler_started"):
+        context.connection.info["profiler_started"].pop()
+
+
+def _before_request():
+    if _active:
+        g.profile_started = time.perf_counter()
+
+
+def summary(profile, total_seconds):
+    sql_seconds = sum(s.seconds for s in profile)
+    parts = [
+        f"queries={len(profile)}",
+        f"sql_ms={sql_seconds * 1000:.1f}",
+        f"total_ms={total_seconds * 1000:.1f}",
+    ]
+    if profile:
+        slowest = max(profile, key=lambda s: s.seconds)
+        parts.append(f"slowest_ms={slowest.seconds * 1000:.1f}")
+        parts.append(f"slowest_at={slowest.call_site}")
+        # The same statement issued many times in one request is usually an
+        # N+1 pattern.
+        _, repeats = Counter(s.sql for s in profile).most_common(1)[0]
+        if repeats > 1:
+            parts.append(f"repeated={repeats}")
+    return "; ".join(parts)
+
+
+def _after_request(response):
+    started = g.pop("profile_started", None)
+    if started is None:
+        return response
+    profile = g.get("sql_profile", [])
+    total_seconds = time.perf_counter() - started
+    text = summary(profile, total_seconds)
+    logger.debug(text)
+    if current_app.debug or current_app.config["SQL_PROFILER_HEADER"]:
+        sql_ms = sum(s.seconds for s in profile) * 1000
+        response.headers["X-SQL-Profile"] = text
+        response.headers["Server-Timing"] = (
+            f"sql;dur={sql_ms:.1f};desc=\"{len(profile)} queries\", "
+            f"app;dur={total_seconds * 1000 - sql_ms:.1f}"
+        )
+    return response
+
+
+def set_active(active):
+    global _active
+    _active = bool(active)
+
+
+def init_app(app):
+    global _slow_seconds
+    if not app.config["SQL_PROFILER_ENABLED"]:
+        return
+    slow_ms = app.config["SLOW_QUERY_MS"]
+    _slow_seconds = slow_ms / 1000 if slow_ms else None
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    for engine in db.engines.values():
+        if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+            event.listen(engine, "handle_error", _handle_error)
+    set_active(True)
@@ -0,0 +1,390 @@
+import gzip
+import hashlib
+import os
+import shutil
+import struct
+import tempfile
+import time
+
+from flask import abort, current_app, request, send_file
+from werkzeug.utils import secure_filename
+from werkzeug.wsgi import FileWrapper
+
+# Content-addressed file store for scanned documents. Files are named by
+# the SHA-256 of their bytes (<root>/ab/cd/abcd...), so the same PDF
+# uploaded for many vehicles or by many users is stored once. Documents
+# keep the digest in Document.file_path; a file is removed only when no
+# document, hot or archived, references it any more.
+
+CHUNK_SIZE = 64 * 1024
+
+# release() leaves files touched this recently alone, so a concurrent
+# upload of the same content can't lose its file between storing it and
+# committing the document that references it.
+RELEASE_GRACE_SECONDS = 300
+
+# Derived images cached next to each original as <digest>.<name>.jpg; see
+# app/previews.py.
+RENDITIONS = ("thumb", "preview")
+
+# Originals of these types are stored compressed (<digest>.zst, or
+# <digest>.gz without the zstandard package) when that saves at least
+# DOCUMENT_COMPRESSION_MIN_SAVING. JPEG and PNG are already compressed and
+# are stored as they are. The digest is always that of the original bytes.
+COMPRESSIBLE_TYPES = {"application/pdf"}
+SUFFIXES = {"identity": "", "zstd": ".zst", "gzip": ".gz"}
+ZSTD_LEVEL = 9
+GZIP_LEVEL = 6
+
+# Leading bytes of the formats we accept; the client's Content-Type is
+# not trusted.
+SIGNATURES = {
+    b"%PDF-": "application/pdf",
+    b"\xff\xd8\xff": "image/jpeg",
+    b"\x89PNG\r\n\x1a\n": "image/png",
+}
+
+
+class UploadRejected(ValueError):
+    pass
+
+
+def sniff_mimetype(head):
+    for signature, mimetype in SIGNATURES.items():
+        if head.startswith(signature):
+            return mimetype
+    return None
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def readable_encodings():
+    return tuple(SUFFIXES) if _zstandard() else ("identity", "gzip")
+
+
+def resolve_codec(name):
+    if name == "auto":
+        return "zstd" if _zstandard() else "gzip"
+    return None if name in (None, "", "none", "identity") else name
+
+
+def open_stored(path, encoding):
+    # File-like over the original bytes, decompressing as it is read.
+    if encoding == "zstd":
+        return _zstandard().ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    if encoding == "gzip":
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def original_size(path, encoding):
+    # From the zstd frame header or the gzip trailer; no decompression.
+    with open(path, "rb") as f:
+        if encoding == "zstd":
+            size = _zstandard().frame_content_size(f.read(18))
+            if size >= 0:
+                return size
+        elif encoding == "gzip":
+            f.seek(-4, os.SEEK_END)
+            return struct.unpack("<I", f.read(4))[0]
+    if encoding == "identity":
+        return os.path.getsize(path)
+    with open_stored(path, encoding) as f:
+        return sum(len(chunk) for chunk in iter(lambda: f.read(CHUNK_SIZE), b""))
+
+
+def _compress(src, dest, codec, size):
+    with open(src, "rb") as fin, open(dest, "wb") as fout:
+        if codec == "zstd":
+            compressor = _zstandard().ZstdCompressor(level=ZSTD_LEVEL)
+            compressor.copy_stream(fin, fout, size=size, read_size=CHUNK_SIZE, write_size=CHUNK_SIZE)
+        else:
+            with gzip.GzipFile(fileobj=fout, mode="wb", compresslevel=GZIP_LEVEL, mtime=0) as out:
+                shutil.copyfileobj(fin, out, CHUNK_SIZE)
+
+
+class ContentStore:
+    def __init__(self, root, codec=None, min_saving=0.05):
+        self.root = root
+        self.codec = codec
+        self.min_saving = min_saving
+        self._tmp = os.path.join(root, "tmp")
+        os.makedirs(self._tmp, exist_ok=True)
+
+    def relative_path(self, digest, rendition=None):
+        suffix = f".{rendition}.jpg" if rendition else ""
+        return f"{digest[:2]}/{digest[2:4]}/{digest}{suffix}"
+
+    def path(self, digest, rendition=None):
+        return os.path.join(self.root, *self.relative_path(digest, rendition).split("/"))
+
+    def locate(self, digest):
+        # (path, encoding) of the stored original, or (None, None).
+        base = self.path(digest)
+        for encoding, suffix in SUFFIXES.items():
+            if os.path.exists(base + suffix):
+                return base + suffix, encoding
+        return None, None
+
+    def exists(self, digest):
+        return self.locate(digest)[0] is not None
+
+    def open(self, digest):
+        path, encoding = self.locate(digest)
+        if path is None:
+            raise FileNotFoundError(self.relative_path(digest))
+        return open_stored(path, encoding)
+
+    def codec_for(self, mimetype):
+        return self.codec if mimetype in COMPRESSIBLE_TYPES else None
+
+    def _place(self, tmp_path, digest, size, codec):
+        # Moves a temp file holding the original bytes into place, compressed
+        # with codec if that is worth it; returns the encoding stored.
+        base = self.path(digest)
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        if codec:
+            fd, packed = tempfile.mkstemp(dir=self._tmp)
+            os.close(fd)
+            try:
+                _compress(tmp_path, packed, codec, size)
+                if os.path.getsize(packed) <= size * (1 - self.min_saving):
+                    os.replace(packed, base + SUFFIXES[codec])
+                    os.remove(tmp_path)
+                    return codec
+            finally:
+                if os.path.exists(packed):
+                    os.remove(packed)
+        os.replace(tmp_path, base)
+        return "identity"
+
+    def put_stream(self, stream, max_bytes=None, allowed_types=None):
+        # Hash while copying to a temp file in the same filesystem, then
+        # rename (or compress) into place; memory use is one chunk regardless
+        # of size. Returns (digest, size, mimetype, encoding).
+        digest = hashlib.sha256()
+        size = 0
+        mimetype = None
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if size == 0:
+                        mimetype = sniff_mimetype(chunk)
+                        if allowed_types is not None and mimetype not in allowed_types:
+                            raise UploadRejected("Unsupported file type; upload a PDF, JPEG or PNG.")
+                    size += len(chunk)
+                    if max_bytes is not None and size > max_bytes:
+                        raise UploadRejected(f"File is larger than {max_bytes // (1024 * 1024)} MB.")
+                    digest.update(chunk)
+                    out.write(chunk)
+            if size == 0:
+                raise UploadRejected("The uploaded file is empty.")
+
+            key = digest.hexdigest()
+            existing, encoding = self.locate(key)
+            if existing:
+                os.remove(tmp_path)
+                os.utime(existing)
+            else:
+                encoding = self._place(tmp_path, key, size, self.codec_for(mimetype))
+            return key, size, mimetype, encoding
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def recompress(self, digest, mimetype):
+        # Re-stores an original with the store's current codec. Returns
+        # (encoding, bytes on disk before, bytes on disk after).
+        path, encoding = self.locate(digest)
+        if path is None:
+            return None, 0, 0
+        before = os.path.getsize(path)
+        codec = self.codec_for(mimetype)
+        if encoding == (codec or "identity") or encoding not in readable_encodings():
+            return encoding, before, before
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp)
+        try:
+            with os.fdopen(fd, "wb") as out, open_stored(path, encoding) as original:
+                shutil.copyfileobj(original, out, CHUNK_SIZE)
+            stored = self._place(tmp_path, digest, os.path.getsize(tmp_path), codec)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        if stored != encoding:
+            # Readers that located the old file keep their open descriptor.
+            os.remove(path)
+        return stored, before, os.path.getsize(self.path(digest) + SUFFIXES[stored])
+
+    def delete(self, digest, min_age=0):
+        path, _ = self.locate(digest)
+        try:
+            if path is None or (min_age and time.time() - os.path.getmtime(path) < min_age):
+                return False
+        except FileNotFoundError:
+            return False
+        paths = [self.path(digest) + suffix for suffix in SUFFIXES.values()]
+        paths += [self.path(digest, rendition) for rendition in RENDITIONS]
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return True
+
+
+def get_store():
+    store = current_app.extensions.get("document_store")
+    if store is None:
+        root = current_app.config["DOCUMENT_STORE_PATH"]
+        if not os.path.isabs(root):
+            root = os.path.join(current_app.instance_path, root)
+        store = current_app.extensions["document_store"] = ContentStore(
+            root,
+            codec=resolve_codec(current_app.config["DOCUMENT_COMPRESSION"]),
+            min_saving=current_app.config["DOCUMENT_COMPRESSION_MIN_SAVING"],
+        )
+    return store
+
+
+def store_upload(stream):
+    return get_store().put_stream(
+        stream,
+        max_bytes=current_app.config["DOCUMENT_MAX_BYTES"],
+        allowed_types=set(SIGNATURES.values()),
+    )
+
+
+def _referenced(digests):
+    from app import db
+    from app.models import ArchivedDocument, Document
+
+    return set(db.session.scalars(
+        db.select(Document.file_path).where(Document.file_path.in_(digests))
+        .union(db.select(ArchivedDocument.file_path).where(ArchivedDocument.file_path.in_(digests)))
+    ))
+
+
+def release(digest):
+    # Call after the commit that dropped a reference to digest.
+    if digest and not _referenced([digest]):
+        get_store().delete(digest, min_age=RELEASE_GRACE_SECONDS)
+
+
+def release_all(digests):
+    # Like release() for many digests, one query per 500 of them.
+    digests = sorted({digest for digest in digests if digest})
+    for start in range(0, len(digests), 500):
+        chunk = digests[start:start + 500]
+        referenced = _referenced(chunk)
+        for digest in chunk:
+            if digest not in referenced:
+                get_store().delete(digest, min_age=RELEASE_GRACE_SECONDS)
+
+
+def attach_file(document, stream, filename):
+    # Stores the file and points the document at it; returns the digest the
+    # document used before, to release() once the caller has committed.
+    digest, size, mimetype, encoding = store_upload(stream)
+    previous = document.file_path
+    document.file_path = digest
+    document.file_size = size
+    document.file_mimetype = mimetype
+    document.file_encoding = encoding
+    document.file_name = secure_filename(filename or "") or f"document-{document.id}"
+    # Previews are per digest, so a re-uploaded file may already have them.
+    store = get_store()
+    ready = all(os.path.exists(store.path(digest, r)) for r in RENDITIONS)
+    document.preview_status = "ready" if ready else None
+    return previous if previous != digest else None
+
+
+def _send_stored(relative, path, mimetype, **kwargs):
+    prefix = current_app.config["DOCUMENT_ACCEL_REDIRECT_PREFIX"]
+    if prefix:
+        # nginx serves the file (with sendfile and ranges) from an internal
+        # location mapped onto the store root.
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers["X-Accel-Redirect"] = f"{prefix.rstrip('/')}/{relative}"
+        if kwargs.get("as_attachment"):
+            response.headers.set("Content-Disposition", "attachment", filename=kwargs["download_name"])
+        return response
+    if not os.path.exists(path):
+        current_app.logger.error(f"Stored file {relative} is missing")
+        abort(404)
+    # conditional=True handles Range and If-None-Match; the file body is a
+    # wsgi.file_wrapper, which gunicorn sends with sendfile(2), or an
+    # X-Sendfile header when USE_X_SENDFILE is set.
+    return send_file(path, mimetype=mimetype, conditional=True, **kwargs)
+
+
+def _send_decompressed(path, encoding, size, mimetype, download_name, etag):
+    # Compressed originals are decompressed chunk by chunk as they are sent.
+    # make_conditional handles If-None-Match and Range: a range is served by
+    # decompressing from the start and discarding bytes up to its offset.
+    # Neither sendfile nor the proxy can serve these, so no X-Accel-Redirect.
+    try:
+        stream = open_stored(path, encoding)
+    except FileNotFoundError:
+        current_app.logger.error(f"Stored file {path} is missing")
+        abort(404)
+    response = current_app.response_class(
+        FileWrapper(stream, CHUNK_SIZE), mimetype=mimetype, direct_passthrough=True
+    )
+    response.content_length = size
+    response.headers.set("Content-Disposition", "attachment", filename=download_name)
+    response.last_modified = int(os.path.getmtime(path))
+    response.set_etag(etag)
+    return response.make_conditional(request, accept_ranges=True, complete_length=size)
+
+
+def send_document(document):
+    store = get_store()
+    digest = document.file_path
+    download_name = document.file_name or f"document-{document.id}"
+    path, encoding = store.locate(digest)
+    if encoding in (None, "identity"):
+        response = _send_stored(
+            store.relative_path(digest),
+            store.path(digest),
+            document.file_mimetype,
+            as_attachment=True,
+            download_name=download_name,
+            etag=digest,
+        )
+    else:
+        size = document.file_size or original_size(path, encoding)
+        response = _send_decompressed(path, encoding, size, document.file_mimetype, download_name, digest)
+    response.cache_control.private = True
+    response.headers["X-Content-Type-Options"] = "nosniff"
+    return response
+
+
+def send_rendition(document, rendition):
+    # Renditions are immutable (the URL carries the digest), so browsers may
+    # keep them for a year without revalidating.
+    store = get_store()
+    digest = document.file_path
+    response = _send_stored(
+        store.relative_path(digest, rendition),
+        store.path(digest, rendition),
+        "image/jpeg",
+        etag=f"{digest}.{rendition}",
+    )
+    response.cache_control.no_cache = None
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.max_age = 365 * 24 * 3600
+    response.cache_control.immutable = True
+    response.headers["X-Content-Type-Options"] = "nosniff"
+    return response
@@ -0,0 +1,207 @@
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+from flask import current_app
+
+# Small key/value stores with per-key expiry, shared by the OTP service and
+# anything else that needs short-lived state visible to every worker. All
+# operations are single-key and O(1).
+
+
+class MemoryStore:
+    # Per-process only: fine for tests and single-worker runs, but gunicorn
+    # workers will not see each other's keys.
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _live(self, key, now):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[1] <= now:
+            del self._data[key]
+            return None
+        return item
+
+    def _sweep(self, now):
+        self._writes += 1
+        if self._writes % 1024 == 0:
+            for key in [k for k, (_, expires) in self._data.items() if expires <= now]:
+                del self._data[key]
+
+    def get(self, key):
+        with self._lock:
+            item = self._live(key, time.time())
+            return item[0] if item else None
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            self._data[key] = (value, now + ttl)
+
+    def pop(self, key):
+        with self._lock:
+            item = self._live(key, time.time())
+            self._data.pop(key, None)
+            return item[0] if item else None
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key, ttl):
+        now = time.time()
+        with self._lock:
+            item = self._live(key, now)
+            if item is None:
+                self._sweep(now)
+                item = (0, now + ttl)
+            value = int(item[0]) + 1
+            self._data[key] = (value, item[1])
+            return value
+
+
+class SQLiteStore:
+    # A WAL-mode SQLite file outside the application database; shared by all
+    # worker processes on one host.
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ttl_store ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT value FROM ttl_store WHERE key = ? AND expires_at > ?",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def _sweep(self):
+        self._writes += 1
+        if self._writes % 1024 == 0:
+            self.purge_expired()
+
+    def set(self, key, value, ttl):
+        self._sweep()
+        self._connect().execute(
+            "INSERT INTO ttl_store (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, str(value), time.time() + ttl),
+        )
+
+    def pop(self, key):
+        row = self._connect().execute(
+            "DELETE FROM ttl_store WHERE key = ? RETURNING value, expires_at", (key,)
+        ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return row[0]
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM ttl_store WHERE key = ?", (key,))
+
+    def incr(self, key, ttl):
+        self._sweep()
+        now = time.time()
+        row = self._connect().execute(
+            "INSERT INTO ttl_store (key, value, expires_at) VALUES (?, '1', ?) "
+            "ON CONFLICT(key) DO UPDATE SET "
+            "value = CASE WHEN expires_at <= ? THEN '1' ELSE CAST(value AS INTEGER) + 1 END, "
+            "expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END "
+            "RETURNING value",
+            (key, now + ttl, now, now),
+        ).fetchone()
+        return int(row[0])
+
+    def purge_expired(self):
+        return self._connect().execute(
+            "DELETE FROM ttl_store WHERE expires_at <= ?", (time.time(),)
+        ).rowcount
+
+
+class RedisStore:
+    # Any Redis-compatible server; needs the optional ``redis`` package.
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("The redis package is required for redis:// store URLs.") from e
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key):
+        return self._redis.get(key)
+
+    def set(self, key, value, ttl):
+        self._redis.set(key, value, ex=max(int(ttl), 1))
+
+    def pop(self, key):
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.get(key)
+        pipe.delete(key)
+        return pipe.execute()[0]
+
+    def delete(self, key):
+        self._redis.delete(key)
+
+    def incr(self, key, ttl):
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.set(key, 0, ex=max(int(ttl), 1), nx=True)
+        pipe.incr(key)
+        return pipe.execute()[1]
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def make_store(url, instance_path="."):
+    parsed = urlparse(url)
+    if parsed.scheme == "memory":
+        return MemoryStore()
+    if parsed.scheme == "sqlite":
+        # sqlite:///name.db is relative to the instance folder,
+        # sqlite:////abs/path.db is absolute.
+        path = url[len("sqlite:///"):]
+        if not os.path.isabs(path):
+            os.makedirs(instance_path, exist_ok=True)
+            path = os.path.join(instance_path, path)
+        return SQLiteStore(path)
+    if parsed.scheme in ("redis", "rediss", "unix"):
+        return RedisStore(url)
+    raise ValueError(f"Unsupported store URL: {url}")
+
+
+def get_store(config_key):
+    url = current_app.config[config_key]
+    key = (os.getpid(), url)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                store = _stores[key] = make_store(url, current_app.instance_path)
+    return store
@@ -1,11 +1,11 @@
-from flask import current_app, session
+from flask import current_app
 from sqlalchemy.exc import SQLAlchemyError
 from app import db
 from app.models import Log
+from app.otp import issue_otp
+from app.metrics import observe_send
+from app.notification_utils import retry_transient, throttle
 from flask_login import current_user
-import random
-import smtplib
-from email.mime.text import MIMEText
 from functools import wraps
 
 def log_action(action, user=None):
@@ -40,26 +40,29 @@ def log_action_decorator(action_description):
 
     return decorator
 
-# Function to send OTP
-def send_otp(email):
-    otp = random.randint(100000, 999999)
+@retry_transient("otp_email")
+def _deliver_otp(email, otp):
+    import smtplib
+    from email.mime.text import MIMEText
+
+    config = current_app.config
     message = MIMEText(f"Your OTP code is {otp}")
     message["Subject"] = "Your OTP Code"
-    message["From"] = current_app.config["MAIL_DEFAULT_SENDER"]
+    message["From"] = config["MAIL_DEFAULT_SENDER"]
     message["To"] = email
 
-    with smtplib.SMTP("smtp.gmail.com", 587) as server:
-        server.starttls()
-        server.login(current_app.config["MAIL_USERNAME"], current_app.config["MAIL_PASSWORD"])
+    throttle("smtp")
+    with smtplib.SMTP(config["MAIL_SERVER"], config["MAIL_PORT"]) as server:
+        if config["MAIL_USE_TLS"]:
+            server.starttls()
+        if config["MAIL_USERNAME"] and config["MAIL_PASSWORD"]:
+            server.login(config["MAIL_USERNAME"], config["MAIL_PASSWORD"])
         server.sendmail(message["From"], [email], message.as_string())
 
-    # Store OTP in session for verification
-    session['otp'] = otp
-    return otp
 
-# Function to verify OTP
-def verify_otp(session_otp, user_otp):
-    try:
-        return session_otp == int(user_otp)
-    except (TypeError, ValueError):
-        return False
\ No newline at end of file
+# Function to send OTP
+@observe_send("otp_email")
+def send_otp(email, purpose, subject):
+    otp = issue_otp(purpose, subject)
+    _deliver_otp(email, otp)
+    return otp
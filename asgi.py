@@ -0,0 +1,45 @@
+"""ASGI entry point.
+
+    uvicorn asgi:app --workers 2
+
+The Flask app stays synchronous: each request runs on a thread of its own,
+at most ASGI_THREADS at once, so a process can wait on that many slow SMTP,
+Twilio or database calls at once. For hundreds of concurrent slow requests per
+process use the gevent worker instead (see gunicorn.conf.py).
+"""
+import asyncio
+import os
+
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+
+from app import create_app
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    # asgiref runs WSGI apps thread-sensitively, which outside a context of
+    # their own means one request at a time on a single shared thread. A
+    # ThreadSensitiveContext per request gives each its own thread; the
+    # semaphore caps them at ASGI_THREADS.
+
+    def __init__(self, wsgi_application, threads=None):
+        super().__init__(wsgi_application)
+        self.slots = asyncio.Semaphore(threads or int(os.environ.get("ASGI_THREADS", 64)))
+
+    async def __call__(self, scope, receive, send):
+        async with self.slots:
+            # Shielded: leaving the context shuts its thread down and waits
+            # for it, which would block the event loop if a cancelled request
+            # were still running there.
+            await asyncio.shield(self.run_in_own_thread(scope, receive, send))
+
+    async def run_in_own_thread(self, scope, receive, send):
+        async with ThreadSensitiveContext():
+            await super().__call__(scope, receive, send)
+
+
+def make_asgi_app(wsgi_app=None):
+    return PooledWsgiToAsgi(wsgi_app or create_app())
+
+
+app = make_asgi_app()
@@ -0,0 +1,198 @@
+"""Concurrent request capacity: sync vs gevent vs ASGI serving.
+
+Starts a local upstream that answers after --upstream-delay-ms (standing in
+for SMTP or the Twilio API), then serves a view that calls it and reads
+the database under each serving mode in turn and fires bursts of
+concurrent requests at it. Reports throughput, p50/p99 and errors per
+concurrency level; --output also writes them as JSON.
+
+    python -m benchmarks.concurrency [--modes sync gevent asgi] [--concurrency 10 100 300]
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.e2e import summarise
+
+MODES = {
+    "sync": lambda bind, workers: [
+        sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-k", "sync",
+        "-w", str(workers), "-b", bind, "benchmarks.concurrency:make_app()",
+    ],
+    "gevent": lambda bind, workers: [
+        sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-k", "gevent",
+        "-w", str(workers), "-b", bind, "benchmarks.concurrency:make_app()",
+    ],
+    "asgi": lambda bind, workers: [
+        sys.executable, "-m", "uvicorn", "--factory", "--workers", str(workers),
+        "--host", bind.split(":")[0], "--port", bind.split(":")[1], "--log-level", "warning",
+        "benchmarks.concurrency:make_asgi_app",
+    ],
+}
+
+
+def make_app():
+    # Gunicorn/uvicorn factory: the real app plus one route that does what a
+    # notification-sending view does, a DB read and a slow network call.
+    from flask import jsonify
+
+    from app import create_app, db
+    from app.models import User
+
+    app = create_app()
+
+    @app.route("/_bench/upstream")
+    def bench_upstream():
+        users = db.session.query(User.id).limit(1).count()
+        with urllib.request.urlopen(os.environ["BENCH_UPSTREAM_URL"], timeout=30) as response:
+            response.read()
+        return jsonify({"users": users})
+
+    return app
+
+
+def make_asgi_app():
+    from asgi import make_asgi_app as wrap
+
+    return wrap(make_app())
+
+
+class _SlowHandler(BaseHTTPRequestHandler):
+    delay = 0.2
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+def start_upstream(delay):
+    _SlowHandler.delay = delay
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SlowHandler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not come up")
+
+
+def _timed_get(url):
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response:
+            response.read()
+            ok = response.status == 200
+    except OSError:
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+def burst(url, concurrency, rounds):
+    samples, errors = [], 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for elapsed, ok in pool.map(_timed_get, [url] * concurrency * rounds):
+            samples.append(elapsed)
+            errors += not ok
+    wall = time.perf_counter() - started
+    result = summarise(samples, errors)
+    # Requests completed per second of wall time, not per second of latency.
+    result["throughput_rps"] = len(samples) / wall
+    return result
+
+
+def run_mode(mode, env, workers, levels, rounds):
+    bind = f"127.0.0.1:{_free_port()}"
+    process = subprocess.Popen(
+        MODES[mode](bind, workers), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        url = f"http://{bind}/_bench/upstream"
+        _wait_ready(url)
+        return {concurrency: burst(url, concurrency, rounds) for concurrency in levels}
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", nargs="+", choices=sorted(MODES), default=["sync", "gevent", "asgi"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[10, 100, 300])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--rounds", type=int, default=2, help="requests per client at each level")
+    parser.add_argument("--upstream-delay-ms", type=float, default=200)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    upstream = start_upstream(args.upstream_delay_ms / 1000)
+    database_url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "concurrency.db")
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        BENCH_UPSTREAM_URL=f"http://127.0.0.1:{upstream.server_port}/",
+        SCHEDULER_ENABLED="false",
+        RATELIMIT_ENABLED="false",
+    )
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    subprocess.run(
+        [sys.executable, "-c", "from app import create_app, db\n"
+         "with create_app().app_context(): db.create_all()"],
+        env=env, check=True,
+    )
+
+    results = {}
+    print(f"{'mode':<8} {'clients':>7} {'rps':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for mode in args.modes:
+        results[mode] = run_mode(mode, env, args.workers, args.concurrency, args.rounds)
+        for concurrency, r in results[mode].items():
+            print(
+                f"{mode:<8} {concurrency:>7} {r['throughput_rps']:>8.1f} "
+                f"{r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['errors']:>6}"
+            )
+    upstream.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "workers": args.workers,
+                "upstream_delay_ms": args.upstream_delay_ms,
+                "results": results,
+            }, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Delivery status callback ingestion under a reminder burst.
+
+Posts provider status callbacks to /notifications/status/<channel> from
+many clients at once through the Flask test client: Twilio-style, one form
+post per status change ("sent" then "delivered" for each message, a share
+of them "undelivered" with a hard-bounce code), or JSON lists of
+--batch events per post as email providers send them. Reports callbacks
+per second, p50/p99 per post, then flushes the staged callbacks as the
+scheduler job would and reports how long that took and how many callbacks
+each upsert transaction carried. --output also writes the results as JSON.
+
+    python -m benchmarks.delivery_callbacks [--messages 5000] [--concurrency 1 16 64]
+                                            [--batch 1] [--database-url URL]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from prometheus_client import REGISTRY
+
+from app import create_app, db
+from app.config import Config
+from app.delivery import flush_events
+from benchmarks.e2e import summarise
+
+TOKEN = "bench"
+
+
+def _transactions():
+    return (
+        REGISTRY.get_sample_value("docuflex_delivery_callback_batch_size_count") or 0,
+        REGISTRY.get_sample_value("docuflex_delivery_callback_batch_size_sum") or 0,
+    )
+
+
+def _posts(run, messages, batch, bounce_rate, rng):
+    # Every message gets "sent" before its final status, as providers do;
+    # posts from different clients still interleave.
+    sids = [f"SM{run}x{i:07d}" for i in range(messages)]
+    final = [
+        ("undelivered", "30006") if rng.random() < bounce_rate else ("delivered", None) for _ in sids
+    ]
+    events = [(sid, "sent", None) for sid in sids] + [(sid, s, c) for sid, (s, c) in zip(sids, final)]
+    if batch == 1:
+        return [
+            {"data": {"MessageSid": sid, "MessageStatus": status, **({"ErrorCode": code} if code else {})}}
+            for sid, status, code in events
+        ]
+    return [
+        {"json": [{"id": sid, "status": status, "error_code": code} for sid, status, code in events[i:i + batch]]}
+        for i in range(0, len(events), batch)
+    ]
+
+
+def run_level(app, run, concurrency, messages, batch, bounce_rate, rng):
+    posts = _posts(run, messages, batch, bounce_rate, rng)
+    clients = {}
+
+    def post(kwargs):
+        import threading
+
+        client = clients.setdefault(threading.get_ident(), app.test_client())
+        started = time.perf_counter()
+        status = client.post(f"/notifications/status/sms?token={TOKEN}", **kwargs).status_code
+        return time.perf_counter() - started, status == 204
+
+    before = _transactions()
+    samples, errors = [], 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for elapsed, ok in pool.map(post, posts):
+            samples.append(elapsed)
+            errors += not ok
+    wall = time.perf_counter() - started
+    with app.app_context():
+        started = time.perf_counter()
+        flush_events()
+        flush = time.perf_counter() - started
+    after = _transactions()
+
+    result = summarise(samples, errors)
+    callbacks = messages * 2
+    transactions = after[0] - before[0]
+    result["callbacks_per_second"] = callbacks / wall
+    result["flush_seconds"] = flush
+    result["transactions"] = int(transactions)
+    result["callbacks_per_transaction"] = (after[1] - before[1]) / transactions if transactions else None
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=5000, help="messages per level (two callbacks each)")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 16, 64])
+    parser.add_argument("--batch", type=int, default=1, help="events per post; 1 posts Twilio-style forms")
+    parser.add_argument("--bounce-rate", type=float, default=0.02)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp()
+    config = type("CallbackBenchConfig", (Config,), {
+        "SQLALCHEMY_DATABASE_URI": args.database_url or "sqlite:///" + os.path.join(workdir, "callbacks.db"),
+        "OTP_STORE_URL": "sqlite:///" + os.path.join(workdir, "ttl_store.db"),
+        "DELIVERY_CALLBACK_TOKEN": TOKEN,
+    })
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+
+    rng = random.Random(args.seed)
+    results = {}
+    print(f"{'clients':>7} {'cb/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6} {'flush s':>7} {'cb/txn':>7}")
+    for run, concurrency in enumerate(args.concurrency):
+        r = run_level(app, run, concurrency, args.messages, args.batch, args.bounce_rate, rng)
+        results[concurrency] = r
+        print(
+            f"{concurrency:>7} {r['callbacks_per_second']:>8.0f} {r['p50_ms']:>8.1f} "
+            f"{r['p99_ms']:>8.1f} {r['errors']:>6} {r['flush_seconds']:>7.2f} {r['callbacks_per_transaction'] or 0:>7.1f}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"messages": args.messages, "batch": args.batch, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""End-to-end request benchmark.
+
+Seeds a synthetic fleet (see benchmarks.fleet), then drives the hot pages
+through the Flask test client as randomly chosen fleet users and times the
+daily expiry scan. Mail and SMS sending are suppressed. Reports throughput
+and p50/p90/p99 latency per endpoint and writes them, with the commit and
+fleet size, to a JSON file; --compare prints the change against an
+earlier result file.
+
+    python -m benchmarks.e2e [--database-url URL] [--requests N] [--output FILE]
+                             [--compare OLD.json] [fleet size options]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+
+from app import check_document_expirations, create_app, db
+from app.config import Config
+from app.models import User, Vehicle
+from benchmarks import fleet
+
+ENDPOINTS = {
+    "home": lambda user_id, vehicle_id: "/home",
+    "profile": lambda user_id, vehicle_id: "/profile",
+    "view_vehicle": lambda user_id, vehicle_id: f"/vehicle/{vehicle_id}",
+    "search_documents": lambda user_id, vehicle_id: "/profile/search_documents?query=Ins",
+    "view_logs": lambda user_id, vehicle_id: "/logs",
+}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarise(samples, errors=0):
+    ordered = sorted(samples)
+    total = sum(ordered)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput_rps": len(ordered) / total if total else None,
+        "mean_ms": total / len(ordered) * 1000 if ordered else None,
+        "p50_ms": percentile(ordered, 50) * 1000 if ordered else None,
+        "p90_ms": percentile(ordered, 90) * 1000 if ordered else None,
+        "p99_ms": percentile(ordered, 99) * 1000 if ordered else None,
+        "max_ms": ordered[-1] * 1000 if ordered else None,
+    }
+
+
+def _owners(rng, sample_size):
+    # A sample of (user, one of their vehicles) pairs to spread requests over.
+    rows = db.session.execute(
+        select(User.id, func.min(Vehicle.id))
+        .join(Vehicle, Vehicle.user_id == User.id)
+        .where(User.username.like("fleet%"))
+        .group_by(User.id)
+    ).all()
+    return rng.sample(rows, min(sample_size, len(rows)))
+
+
+def bench_endpoint(client, build_url, owners, requests, warmup, rng):
+    samples, errors = [], 0
+    for i in range(warmup + requests):
+        user_id, vehicle_id = rng.choice(owners)
+        with client.session_transaction() as session:
+            session["_user_id"] = str(user_id)
+            session["_fresh"] = True
+        url = build_url(user_id, vehicle_id)
+        started = time.perf_counter()
+        response = client.get(url)
+        elapsed = time.perf_counter() - started
+        if i < warmup:
+            continue
+        if response.status_code != 200:
+            errors += 1
+        samples.append(elapsed)
+    return summarise(samples, errors)
+
+
+def bench_expiry_scan(app, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        check_document_expirations(app)
+        samples.append(time.perf_counter() - started)
+    return summarise(samples)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old, new):
+    print(f"\nChange vs {old.get('commit') or 'previous run'} (p50 / p99):")
+    for name, result in new["results"].items():
+        before = old.get("results", {}).get(name)
+        if not before or not before.get("p50_ms") or not result.get("p50_ms"):
+            continue
+        deltas = [
+            f"{(result[key] - before[key]) / before[key] * 100:+.0f}%"
+            for key in ("p50_ms", "p99_ms")
+        ]
+        print(f"  {name:<18} {deltas[0]:>6} / {deltas[1]:>6}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=os.environ.get("E2E_DATABASE_URL"))
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--scan-runs", type=int, default=5)
+    parser.add_argument("--sample-users", type=int, default=50)
+    parser.add_argument("--output", default="e2e-results.json")
+    parser.add_argument("--compare", default=None, help="earlier result file to diff against")
+    fleet.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "e2e.db")
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        SERVER_NAME = "localhost"
+        MAIL_SUPPRESS_SEND = True
+        MAIL_DEFAULT_SENDER = "bench@example.com"
+        SMS_SUPPRESS_SEND = True
+        RATELIMIT_ENABLED = False
+
+    app = create_app(BenchmarkConfig)
+    rng = random.Random(args.seed)
+    with app.app_context():
+        db.create_all()
+        if not fleet.fleet_exists():
+            started = time.perf_counter()
+            counts = fleet.generate_from_args(args)
+            print(f"Seeded {counts} in {time.perf_counter() - started:.1f}s")
+        owners = _owners(rng, args.sample_users)
+        fleet_size = {
+            "users": db.session.scalar(select(func.count(User.id))),
+            "vehicles": db.session.scalar(select(func.count(Vehicle.id))),
+        }
+        db.session.remove()
+
+    results = {}
+    client = app.test_client()
+    for name, build_url in ENDPOINTS.items():
+        results[name] = bench_endpoint(client, build_url, owners, args.requests, args.warmup, rng)
+    results["expiry_scan"] = bench_expiry_scan(app, args.scan_runs)
+
+    print(f"{'endpoint':<18} {'rps':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for name, r in results.items():
+        print(
+            f"{name:<18} {r['throughput_rps']:>8.1f} {r['p50_ms']:>8.2f} "
+            f"{r['p90_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['errors']:>6}"
+        )
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "python": platform.python_version(),
+        "database": make_url(database_url).get_backend_name(),
+        "fleet": fleet_size,
+        "requests_per_endpoint": args.requests,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    return 1 if any(r["errors"] for r in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
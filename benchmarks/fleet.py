@@ -0,0 +1,160 @@
+"""Synthetic fleet generator.
+
+Bulk-inserts users, vehicles, documents, logs and feedback into the
+configured database so benchmarks run against realistic table sizes.
+Document expiry dates are spread from two months in the past to a year
+ahead, so the expiry scan and compliance queries see a steady fraction of
+due documents. Generation is deterministic for a given --seed.
+
+    python -m benchmarks.fleet [--database-url URL] [--users N] [--vehicles N]
+                               [--documents N] [--logs N] [--feedback N]
+
+Every generated user's password is FLEET_PASSWORD.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import bcrypt
+from sqlalchemy import insert, select
+
+from app import create_app, db
+from app.config import Config
+from app.models import User, Vehicle, Document, Log, Feedback
+from app.reminders import next_reminder_at
+
+FLEET_PASSWORD = "fleet-password"
+DOCUMENT_TYPES = ("Insurance", "Registration", "Pollution", "Permit", "Fitness", "Tax")
+BATCH_SIZE = 5000
+
+
+def _insert(model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(insert(model), rows[start:start + BATCH_SIZE])
+
+
+def fleet_exists():
+    return db.session.scalar(select(User.id).where(User.username == "fleet0")) is not None
+
+
+def generate(users=100, vehicles_per_user=10, documents_per_vehicle=5, logs_per_user=20,
+             feedback_per_user=1, seed=0):
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    # Low cost: the hash only has to verify, and the password is public.
+    password = bcrypt.hashpw(FLEET_PASSWORD.encode(), bcrypt.gensalt(4)).decode()
+
+    _insert(User, [
+        {
+            "username": f"fleet{u}",
+            "email": f"fleet{u}@example.com",
+            "phone": f"+1555{u:07d}",
+            "password": password,
+        }
+        for u in range(users)
+    ])
+    user_ids = db.session.scalars(
+        select(User.id).where(User.username.like("fleet%")).order_by(User.id)
+    ).all()
+
+    _insert(Vehicle, [
+        {"name": f"Truck {v}", "vehicle_number": f"FLEET-{user_id}-{v}", "user_id": user_id}
+        for user_id in user_ids
+        for v in range(vehicles_per_user)
+    ])
+    vehicles = db.session.execute(
+        select(Vehicle.id, Vehicle.user_id).where(Vehicle.vehicle_number.like("FLEET-%"))
+    ).all()
+
+    documents = []
+    for vehicle_id, user_id in vehicles:
+        for d in range(documents_per_vehicle):
+            end_date = now + timedelta(days=rng.randint(-60, 365), hours=rng.randint(0, 23))
+            documents.append({
+                "document_type": DOCUMENT_TYPES[d % len(DOCUMENT_TYPES)],
+                "serial_number": f"{vehicle_id}-{d}-{rng.randrange(10**6):06d}",
+                "start_date": end_date - timedelta(days=365),
+                "end_date": end_date,
+                "next_reminder_at": next_reminder_at(end_date, now),
+                "date_posted": end_date - timedelta(days=365),
+                "vehicle_id": vehicle_id,
+                "user_id": user_id,
+            })
+    _insert(Document, documents)
+
+    _insert(Log, [
+        {
+            "user_id": user_id,
+            "action": rng.choice(("Viewed vehicle", "Uploaded document", "Logged in", "Edited profile")),
+            "timestamp": now - timedelta(minutes=rng.randint(0, 60 * 24 * 90)),
+        }
+        for user_id in user_ids
+        for _ in range(logs_per_user)
+    ])
+    _insert(Feedback, [
+        {
+            "user_id": user_id,
+            "feedback_text": "Synthetic feedback",
+            "timestamp": now - timedelta(days=rng.randint(0, 90)),
+        }
+        for user_id in user_ids
+        for _ in range(feedback_per_user)
+    ])
+    db.session.commit()
+    return {
+        "users": len(user_ids),
+        "vehicles": len(vehicles),
+        "documents": len(documents),
+        "logs": len(user_ids) * logs_per_user,
+        "feedback": len(user_ids) * feedback_per_user,
+    }
+
+
+def add_arguments(parser):
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--vehicles", type=int, default=10, help="vehicles per user")
+    parser.add_argument("--documents", type=int, default=5, help="documents per vehicle")
+    parser.add_argument("--logs", type=int, default=20, help="log entries per user")
+    parser.add_argument("--feedback", type=int, default=1, help="feedback entries per user")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def generate_from_args(args):
+    return generate(
+        users=args.users,
+        vehicles_per_user=args.vehicles,
+        documents_per_vehicle=args.documents,
+        logs_per_user=args.logs,
+        feedback_per_user=args.feedback,
+        seed=args.seed,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL"))
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    if not args.database_url:
+        parser.error("--database-url (or DATABASE_URL) is required")
+
+    class FleetConfig(Config):
+        SQLALCHEMY_DATABASE_URI = args.database_url
+
+    app = create_app(FleetConfig)
+    with app.app_context():
+        db.create_all()
+        if fleet_exists():
+            print("A synthetic fleet is already present; nothing to do.")
+            return 0
+        started = time.perf_counter()
+        counts = generate_from_args(args)
+    print(", ".join(f"{n} {name}" for name, n in counts.items()), f"in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
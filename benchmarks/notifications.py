@@ -0,0 +1,194 @@
+"""Notification pipeline load test against local stand-ins.
+
+Starts the SMTP sink and fake Twilio endpoint from benchmarks/standins.py
+with the given latency and error rate, points the app at them and drives
+two flows at each concurrency level:
+
+  expiry  notify_user queues reminders for due documents (one email, plus
+          one SMS for users with a phone number), then each queued message
+          is delivered the way the outbox dispatcher does it, at the bulk
+          share of the provider ceilings
+  otp     send_otp, one email each, at the full ceiling
+
+Reports messages delivered per second, p50/p99 per operation (retries and
+throttling included), operations that still failed, and how many sends
+were retried. Raise --smtp-rate/--twilio-rate to measure the stand-ins
+rather than the ceilings.
+--output also writes the results as JSON.
+
+    python -m benchmarks.notifications [--flows expiry otp] [--concurrency 1 8 32]
+                                       [--operations 200] [--error-rate 0.05]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from prometheus_client import REGISTRY
+from sqlalchemy import select, update
+
+from app import create_app, db
+from app.config import Config
+from app.models import Document, OutboundMessage
+from benchmarks import fleet
+from benchmarks.e2e import summarise
+from benchmarks.standins import StandIns
+
+CHANNELS = ("email", "sms", "otp_email")
+
+
+def _retries():
+    return {
+        channel: REGISTRY.get_sample_value("docuflex_notification_retries_total", {"channel": channel}) or 0
+        for channel in CHANNELS
+    }
+
+
+def _expiry_operations(app, count):
+    from app.outbox import deliver
+    from app.routes import notify_user
+
+    with app.app_context():
+        documents = db.session.scalars(select(Document).order_by(Document.id).limit(count)).all()
+        for document in documents:
+            notify_user(document)
+        message_ids = db.session.scalars(
+            select(OutboundMessage.id).where(OutboundMessage.status == "queued")
+        ).all()
+        # Due now, whatever the local time.
+        db.session.execute(update(OutboundMessage).values(not_before=datetime.utcnow()))
+        db.session.commit()
+
+    def send(message_id):
+        with app.app_context():
+            if not deliver(message_id):
+                raise RuntimeError(f"message {message_id} not sent")
+
+    return send, message_ids
+
+
+def _otp_operations(app, count):
+    def otp(i):
+        from app.utils import send_otp
+
+        with app.app_context():
+            send_otp(f"fleet{i}@example.com", "notification_bench", i)
+
+    return otp, list(range(count))
+
+
+FLOWS = {"expiry": _expiry_operations, "otp": _otp_operations}
+
+
+def _timed(operation, item):
+    started = time.perf_counter()
+    try:
+        operation(item)
+        ok = True
+    except Exception:
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+def run_flow(app, standins, flow, concurrency, count):
+    operation, items = FLOWS[flow](app, count)
+    before_stats, before_retries = standins.stats(), _retries()
+    samples, errors = [], 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for elapsed, ok in pool.map(lambda item: _timed(operation, item), items):
+            samples.append(elapsed)
+            errors += not ok
+    wall = time.perf_counter() - started
+
+    result = summarise(samples, errors)
+    after_stats, after_retries = standins.stats(), _retries()
+    delta = {
+        server: {key: after_stats[server][key] - before_stats[server][key] for key in after_stats[server]}
+        for server in after_stats
+    }
+    result["messages_per_second"] = sum(d["delivered"] for d in delta.values()) / wall
+    result["retries"] = {c: int(after_retries[c] - before_retries[c]) for c in CHANNELS}
+    result["standins"] = delta
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--flows", nargs="+", choices=sorted(FLOWS), default=["expiry", "otp"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--operations", type=int, default=200, help="operations per flow and level")
+    parser.add_argument("--smtp-latency-ms", type=float, default=50)
+    parser.add_argument("--twilio-latency-ms", type=float, default=80)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--max-attempts", type=int, default=Config.NOTIFICATION_MAX_ATTEMPTS)
+    parser.add_argument("--retry-backoff", type=float, default=0.05)
+    parser.add_argument("--smtp-rate", type=float, default=Config.SEND_RATE_LIMITS["smtp"], help="sends per second")
+    parser.add_argument("--twilio-rate", type=float, default=Config.SEND_RATE_LIMITS["twilio"], help="sends per second")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    standins = StandIns(
+        args.smtp_latency_ms / 1000, args.twilio_latency_ms / 1000, args.error_rate, seed=args.seed
+    ).start()
+    workdir = tempfile.mkdtemp()
+
+    config = type("NotificationBenchConfig", (Config,), {
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(workdir, "notifications.db"),
+        "OTP_STORE_URL": "sqlite:///" + os.path.join(workdir, "ttl_store.db"),
+        "SERVER_NAME": "localhost",
+        "RATELIMIT_ENABLED": False,
+        "MAIL_USERNAME": None,
+        "MAIL_PASSWORD": None,
+        "NOTIFICATION_MAX_ATTEMPTS": args.max_attempts,
+        "NOTIFICATION_RETRY_BACKOFF": args.retry_backoff,
+        "SEND_RATE_LIMITS": {"smtp": args.smtp_rate, "twilio": args.twilio_rate},
+        "RATELIMIT_STORE_URL": "memory://",
+        "OUTBOX_MAX_ATTEMPTS": 1,
+        **standins.app_config(),
+    })
+
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+        fleet.generate(
+            users=args.operations, vehicles_per_user=1, documents_per_vehicle=1,
+            logs_per_user=0, feedback_per_user=0, seed=args.seed,
+        )
+        # Every document inside the reminder window.
+        db.session.execute(update(Document).values(end_date=datetime.utcnow() + timedelta(days=3)))
+        db.session.commit()
+        db.session.remove()
+
+    results = {}
+    print(f"{'flow':<7} {'clients':>7} {'msg/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6} {'retries':>7}")
+    for flow in args.flows:
+        results[flow] = {}
+        for concurrency in args.concurrency:
+            r = run_flow(app, standins, flow, concurrency, args.operations)
+            results[flow][concurrency] = r
+            print(
+                f"{flow:<7} {concurrency:>7} {r['messages_per_second']:>8.1f} {r['p50_ms']:>8.1f} "
+                f"{r['p99_ms']:>8.1f} {r['errors']:>6} {sum(r['retries'].values()):>7}"
+            )
+    standins.stop()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "smtp_latency_ms": args.smtp_latency_ms,
+                "twilio_latency_ms": args.twilio_latency_ms,
+                "error_rate": args.error_rate,
+                "max_attempts": args.max_attempts,
+                "results": results,
+            }, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
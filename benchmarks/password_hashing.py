@@ -0,0 +1,60 @@
+"""Password hashing microbenchmark.
+
+Reports bcrypt hashes/sec on a single core and through a process pool of
+--workers processes (normalised per core) for each cost factor, so
+BCRYPT_LOG_ROUNDS and PASSWORD_HASH_POOL_SIZE can be picked per host.
+
+    python -m benchmarks.password_hashing [--rounds 10 12] [--workers N] [--seconds S]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.hashing import _encode, _hash
+
+
+def single_core(rounds, seconds):
+    password = _encode("correct horse battery staple")
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        _hash(password, rounds)
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def pooled(rounds, workers, seconds):
+    password = _encode("correct horse battery staple")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Warm the workers up so process start-up isn't measured.
+        list(pool.map(_hash, [password] * workers, [4] * workers))
+        count = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            batch = [pool.submit(_hash, password, rounds) for _ in range(workers)]
+            for future in batch:
+                future.result()
+            count += workers
+        return count / (time.perf_counter() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args(argv)
+
+    print(f"{'rounds':>6} {'ms/hash':>8} {'1 core/s':>9} {'pool/s':>8} {'pool/s/core':>11}")
+    for rounds in args.rounds:
+        single = single_core(rounds, args.seconds)
+        pool = pooled(rounds, args.workers, args.seconds)
+        print(
+            f"{rounds:>6} {1000 / single:>8.1f} {single:>9.2f} {pool:>8.2f} "
+            f"{pool / args.workers:>11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Query-plan regression check for the hot read paths.
+
+Runs EXPLAIN on every query in HOT_QUERIES against a seeded database and
+exits non-zero if any of them falls back to a full table scan or sorts a
+listing without an index. Defaults to a throwaway SQLite file; pass --database-url
+to check a Postgres instance (tables are created and seeded only if empty).
+
+    python -m benchmarks.query_plans [--database-url URL]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import String, func, select, text
+
+from app import create_app, db
+from app.archive import archivable_query, archived_documents_query
+from app.compliance import compliance_summary_query
+from app.config import Config
+from app.delivery import delivery_report_query
+from app.history import document_timeline_query, vehicle_history_query
+from app.outbox import due_messages_query
+from app.reminders import due_reminders_query
+from app.models import User, UserStats, Vehicle, Document, ArchivedDocument, DocumentVersion, Log, Feedback, ComplianceAlert
+
+
+HOT_QUERIES = {
+    "user stats": lambda now: select(UserStats).where(UserStats.user_id == 1),
+    "home / list_vehicles": lambda now: select(Vehicle).where(Vehicle.user_id == 1),
+    "view_vehicle": lambda now: select(Document)
+    .where(Document.vehicle_id == 1)
+    .order_by(Document.id.desc()),
+    "profile": lambda now: select(Document, Vehicle)
+    .join(Vehicle)
+    .where(Document.user_id == 1),
+    "search_documents": lambda now: select(Document).where(
+        Document.user_id == 1,
+        Document.document_type.like("%ins%")
+        | Document.start_date.cast(String).like("%ins%")
+        | Document.end_date.cast(String).like("%ins%"),
+    ),
+    "due reminders": lambda now: due_reminders_query(now, 100),
+    "next reminder": lambda now: select(func.min(Document.next_reminder_at)),
+    "due outbox messages": lambda now: due_messages_query(now, 200),
+    "delivery report": lambda now: delivery_report_query(now - timedelta(days=7)),
+    "archive batch": lambda now: archivable_query(now - timedelta(days=365), 1000, (now - timedelta(days=400), 1)),
+    "view_vehicle archived": lambda now: archived_documents_query(ArchivedDocument.vehicle_id == 1),
+    "profile archived": lambda now: archived_documents_query(ArchivedDocument.user_id == 1),
+    "user stats reconcile walk": lambda now: select(User.id)
+    .where(User.id > 0, User.deleted_at.is_(None))
+    .order_by(User.id)
+    .limit(500),
+    "user stats recount: vehicles": lambda now: select(func.count(Vehicle.id)).where(Vehicle.user_id == 1),
+    "user stats recount: expiring": lambda now: select(func.count(Document.id))
+    .where(Document.user_id == 1, Document.end_date < now),
+    "accounts to purge": lambda now: select(User.id).where(User.deleted_at.isnot(None)),
+    "account purge: feedback": lambda now: select(Feedback.id).where(Feedback.user_id == 1).limit(1000),
+    "account purge: archived documents": lambda now: select(ArchivedDocument.id, ArchivedDocument.file_path)
+    .where(ArchivedDocument.user_id == 1)
+    .limit(1000),
+    "account purge: document versions": lambda now: select(DocumentVersion.id)
+    .where(DocumentVersion.user_id == 1)
+    .limit(1000),
+    "account purge: logs": lambda now: select(Log.id).where(Log.user_id == 1).limit(1000),
+    "vehicle history": lambda now: vehicle_history_query(1),
+    "vehicle documents as of": lambda now: vehicle_history_query(1, now - timedelta(days=30)),
+    "document timeline": lambda now: document_timeline_query(1),
+    "compliance dashboard": lambda now: compliance_summary_query(1, now),
+    "open compliance alerts": lambda now: select(ComplianceAlert)
+    .where(ComplianceAlert.user_id == 1, ComplianceAlert.resolved_at.is_(None))
+    .order_by(ComplianceAlert.created_at.desc()),
+    "view_logs": lambda now: select(Log).order_by(Log.timestamp.desc()),
+    "view_feedbacks": lambda now: select(Feedback).order_by(Feedback.timestamp.desc()),
+}
+
+
+def seed(users=3, vehicles_per_user=5, documents_per_vehicle=4):
+    if db.session.query(User.id).first() is not None:
+        return
+    now = datetime.utcnow()
+    for u in range(users):
+        user = User(
+            username=f"plan{u}",
+            email=f"plan{u}@example.com",
+            password="x" * 60,
+        )
+        db.session.add(user)
+        db.session.flush()
+        for v in range(vehicles_per_user):
+            vehicle = Vehicle(name=f"Truck {v}", vehicle_number=f"PLAN-{u}-{v}", owner=user)
+            db.session.add(vehicle)
+            for d in range(documents_per_vehicle):
+                db.session.add(
+                    Document(
+                        document_type="Insurance",
+                        serial_number=f"{u}{v}{d}",
+                        start_date=now - timedelta(days=365),
+                        end_date=now + timedelta(days=30 * d - 30),
+                        vehicle=vehicle,
+                        user_id=user.id,
+                    )
+                )
+        db.session.add(Log(user=user, action="seed"))
+        db.session.add(Feedback(user=user, feedback_text="seed"))
+    db.session.commit()
+
+
+def _compile(stmt, dialect):
+    return str(stmt.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+
+
+def sqlite_plan(connection, sql):
+    rows = connection.execute(text("EXPLAIN QUERY PLAN " + sql)).fetchall()
+    details = [row[-1] for row in rows]
+    problems = [
+        d
+        for d in details
+        if (d.startswith("SCAN ") and " INDEX " not in d) or "TEMP B-TREE FOR ORDER BY" in d
+    ]
+    return details, problems
+
+
+def _walk(node, parent=None):
+    yield node, parent
+    for child in node.get("Plans", []):
+        yield from _walk(child, node)
+
+
+def postgres_plan(connection, sql):
+    # With seqscans disabled the planner only picks one if no index applies,
+    # so small seeded tables still tell us whether an index path exists.
+    connection.execute(text("SET LOCAL enable_seqscan = off"))
+    plan = connection.execute(text("EXPLAIN (FORMAT JSON) " + sql)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    details, problems = [], []
+    for node, parent in _walk(plan[0]["Plan"]):
+        detail = f"{node['Node Type']} {node.get('Relation Name', '')}".strip()
+        details.append(detail)
+        # Sorting an index range to feed a GROUP BY is fine; sorting a
+        # listing means its ORDER BY has no index behind it.
+        feeds_aggregate = parent is not None and parent["Node Type"] == "Aggregate"
+        if node["Node Type"] == "Seq Scan" or (node["Node Type"] == "Sort" and not feeds_aggregate):
+            problems.append(detail)
+    return details, problems
+
+
+def check(verbose=False):
+    dialect = db.engine.dialect
+    explain = postgres_plan if dialect.name == "postgresql" else sqlite_plan
+    now = datetime.utcnow().replace(microsecond=0)
+    failures = {}
+    with db.engine.connect() as connection:
+        for name, build in HOT_QUERIES.items():
+            with connection.begin():
+                details, problems = explain(connection, _compile(build(now), dialect))
+            if problems:
+                failures[name] = problems
+            if verbose or problems:
+                status = "FAIL" if problems else "ok"
+                print(f"[{status}] {name}")
+                for detail in details:
+                    print(f"    {detail}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=os.environ.get("QUERY_PLAN_DATABASE_URL"))
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "query_plans.db")
+
+    class QueryPlanConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+
+    app = create_app(QueryPlanConfig)
+    with app.app_context():
+        db.create_all()
+        seed()
+        failures = check(verbose=args.verbose)
+
+    if failures:
+        print(f"{len(failures)} hot quer{'y' if len(failures) == 1 else 'ies'} regressed to a full scan.")
+        return 1
+    print(f"All {len(HOT_QUERIES)} hot queries use an index.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
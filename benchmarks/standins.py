@@ -0,0 +1,183 @@
+"""Local stand-ins for the SMTP server and the Twilio REST API.
+
+An SMTP sink that accepts and discards mail, and a fake Twilio Messages
+endpoint. Both answer after a configurable latency and fail a configurable
+fraction of sends with a transient error (SMTP 451, HTTP 429), so the
+notification code's timeouts and retries can be exercised without Gmail or
+Twilio. Used by benchmarks/notifications.py; on its own it serves until
+interrupted and prints the settings to point the app at it:
+
+    python -m benchmarks.standins [--smtp-port 1025] [--twilio-port 8025]
+                                  [--latency-ms 50] [--error-rate 0.05]
+"""
+import argparse
+import json
+import random
+import socketserver
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Behaviour:
+    def __init__(self, latency=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.failed = 0
+        self.delivered = 0
+
+    def respond(self):
+        # Waits out the latency and returns True if this send should fail.
+        time.sleep(self.latency)
+        with self._lock:
+            self.attempts += 1
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.failed += 1
+            else:
+                self.delivered += 1
+        return fail
+
+    def stats(self):
+        with self._lock:
+            return {"attempts": self.attempts, "failed": self.failed, "delivered": self.delivered}
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    # Just enough SMTP for smtplib: no TLS, any AUTH is accepted.
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 localhost SMTP sink")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip().split(" ", 1)[0].upper()
+            if command == "EHLO":
+                self.reply("250-localhost")
+                self.reply("250-AUTH PLAIN LOGIN")
+                self.reply("250 SIZE 52428800")
+            elif command == "AUTH":
+                self.reply("235 Authentication successful")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                if self.server.behaviour.respond():
+                    self.reply("451 Temporary failure, try again later")
+                else:
+                    self.reply(f"250 Queued as {uuid.uuid4().hex[:12]}")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            elif command in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+    def __init__(self, address, behaviour):
+        self.behaviour = behaviour
+        super().__init__(address, _SmtpHandler)
+
+
+class _TwilioHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if not self.path.endswith("/Messages.json"):
+            self.send_json(404, {"code": 20404, "message": "Not found", "status": 404})
+        elif self.server.behaviour.respond():
+            self.send_json(429, {"code": 20429, "message": "Too Many Requests", "status": 429})
+        else:
+            self.send_json(201, {"sid": "SM" + uuid.uuid4().hex, "status": "queued"})
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeTwilio(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, behaviour):
+        self.behaviour = behaviour
+        super().__init__(address, _TwilioHandler)
+
+
+class StandIns:
+    def __init__(self, smtp_latency=0.0, twilio_latency=0.0, error_rate=0.0,
+                 smtp_port=0, twilio_port=0, seed=None):
+        self.smtp = SmtpSink(("127.0.0.1", smtp_port), Behaviour(smtp_latency, error_rate, seed))
+        self.twilio = FakeTwilio(("127.0.0.1", twilio_port), Behaviour(twilio_latency, error_rate, seed))
+
+    def start(self):
+        for server in (self.smtp, self.twilio):
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        for server in (self.smtp, self.twilio):
+            server.shutdown()
+            server.server_close()
+
+    def app_config(self):
+        return {
+            "MAIL_SERVER": "127.0.0.1",
+            "MAIL_PORT": self.smtp.server_address[1],
+            "MAIL_USE_TLS": False,
+            "MAIL_DEFAULT_SENDER": "standin@example.com",
+            "TWILIO_API_BASE_URL": f"http://127.0.0.1:{self.twilio.server_address[1]}",
+            "TWILIO_ACCOUNT_SID": "AC" + "0" * 32,
+            "TWILIO_AUTH_TOKEN": "standin",
+            "TWILIO_PHONE_NUMBER": "+15550000000",
+        }
+
+    def stats(self):
+        return {"smtp": self.smtp.behaviour.stats(), "twilio": self.twilio.behaviour.stats()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--smtp-port", type=int, default=1025)
+    parser.add_argument("--twilio-port", type=int, default=8025)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    latency = args.latency_ms / 1000
+    standins = StandIns(latency, latency, args.error_rate, args.smtp_port, args.twilio_port).start()
+    for key, value in standins.app_config().items():
+        print(f"{key}={value}")
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps(standins.stats()))
+    except KeyboardInterrupt:
+        standins.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""Cold-start benchmark for the app package.
+
+Spawns fresh interpreters and times ``import app.routes`` and
+``create_app()`` separately, reports the median and worst run, lists the
+slowest imports, and checks that heavy optional dependencies stay
+unimported. Exits non-zero if a budget is exceeded.
+
+    python -m benchmarks.startup [--runs N] [--max-import-ms MS] [--max-create-ms MS]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported lazily on first use; pulling any of these in at startup is a
+# regression.
+LAZY_MODULES = ("twilio", "apscheduler", "concurrent.futures.process")
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.routes
+imported = time.perf_counter()
+from app import create_app
+create_app()
+created = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "create_ms": (created - imported) * 1000,
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+""" % (LAZY_MODULES,)
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite://")
+    env["SCHEDULER_ENABLED"] = "false"
+    env["PYTHONDONTWRITEBYTECODE"] = "0"
+    return env
+
+
+def run_probe():
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=ROOT, env=_env(), capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def slowest_imports(limit):
+    err = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.routes"],
+        cwd=ROOT, env=_env(), capture_output=True, text=True, check=True,
+    ).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if "." not in name.strip():
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--max-create-ms", type=float, default=None)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    run_probe()  # warm the bytecode cache
+    results = [run_probe() for _ in range(args.runs)]
+    import_ms = [r["import_ms"] for r in results]
+    create_ms = [r["create_ms"] for r in results]
+    print(f"import app.routes: median {statistics.median(import_ms):7.1f} ms, max {max(import_ms):7.1f} ms")
+    print(f"create_app():      median {statistics.median(create_ms):7.1f} ms, max {max(create_ms):7.1f} ms")
+
+    print(f"\nSlowest top-level imports (cumulative):")
+    for micros, name in slowest_imports(args.top):
+        print(f"  {micros / 1000:7.1f} ms  {name}")
+
+    failures = []
+    loaded = sorted(set(m for r in results for m in r["loaded"]))
+    if loaded:
+        failures.append(f"lazily-imported modules loaded at startup: {', '.join(loaded)}")
+    if args.max_import_ms is not None and statistics.median(import_ms) > args.max_import_ms:
+        failures.append(f"import median exceeds {args.max_import_ms} ms")
+    if args.max_create_ms is not None and statistics.median(create_ms) > args.max_create_ms:
+        failures.append(f"create_app median exceeds {args.max_create_ms} ms")
+
+    for failure in failures:
+        print(f"\nFAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
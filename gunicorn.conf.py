@@ -0,0 +1,43 @@
+import glob
+import os
+
+# Worker model. "sync" (the default) handles one request per process;
+# "gevent" runs each request in a greenlet so a process can wait on up to
+# worker_connections slow SMTP, Twilio or database calls at once. Size
+# DB_POOL_SIZE/DB_MAX_OVERFLOW for it: greenlets queue on the pool.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+# Read here as well as by the app, which splits PASSWORD_HASH_POOL_SIZE
+# between this many workers.
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+
+# Prometheus multiprocess mode: each worker writes its metrics to
+# PROMETHEUS_MULTIPROC_DIR and /metrics aggregates them. The directory must
+# start empty and dead workers' gauges must be dropped.
+multiproc_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+
+def on_starting(server):
+    if multiproc_dir:
+        os.makedirs(multiproc_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(multiproc_dir, "*.db")):
+            os.remove(path)
+
+
+def post_fork(server, worker):
+    if "gevent" in server.cfg.worker_class_str:
+        # gevent patches sockets but not libpq; without this a Postgres
+        # query blocks every greenlet in the worker.
+        try:
+            from psycogreen.gevent import patch_psycopg
+        except ImportError:
+            server.log.warning("psycogreen is not installed; Postgres queries will block gevent workers")
+        else:
+            patch_psycopg()
+
+
+def child_exit(server, worker):
+    if multiproc_dir:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
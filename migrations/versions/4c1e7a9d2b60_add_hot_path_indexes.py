@@ -0,0 +1,46 @@
+"""Add indexes for hot query paths
+
+Revision ID: 4c1e7a9d2b60
+Revises: beb6f3458e30
+Create Date: 2026-10-19 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c1e7a9d2b60'
+down_revision = 'beb6f3458e30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('document', schema=None) as batch_op:
+        batch_op.create_index('ix_document_user_id_end_date', ['user_id', 'end_date'], unique=False)
+        batch_op.create_index(batch_op.f('ix_document_end_date'), ['end_date'], unique=False)
+
+    with op.batch_alter_table('vehicle', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_vehicle_user_id'), ['user_id'], unique=False)
+
+    with op.batch_alter_table('log', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_log_timestamp'), ['timestamp'], unique=False)
+
+    with op.batch_alter_table('feedback', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_feedback_timestamp'), ['timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('feedback', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_feedback_timestamp'))
+
+    with op.batch_alter_table('log', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_log_timestamp'))
+
+    with op.batch_alter_table('vehicle', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_vehicle_user_id'))
+
+    with op.batch_alter_table('document', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_document_end_date'))
+        batch_op.drop_index('ix_document_user_id_end_date')
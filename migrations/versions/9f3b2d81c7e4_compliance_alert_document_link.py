@@ -0,0 +1,36 @@
+"""Link compliance alerts to documents
+
+Revision ID: 9f3b2d81c7e4
+Revises: 4c1e7a9d2b60
+Create Date: 2026-10-19 11:40:02.531877
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f3b2d81c7e4'
+down_revision = '4c1e7a9d2b60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('compliance_alert', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('document_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()))
+        batch_op.add_column(sa.Column('resolved_at', sa.DateTime(), nullable=True))
+        batch_op.create_foreign_key('fk_compliance_alert_document_id', 'document', ['document_id'], ['id'], ondelete='CASCADE')
+        batch_op.create_index('ix_compliance_alert_user_id_resolved_at', ['user_id', 'resolved_at', 'created_at'], unique=False)
+        batch_op.create_index('ix_compliance_alert_document_id_resolved_at', ['document_id', 'resolved_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('compliance_alert', schema=None) as batch_op:
+        batch_op.drop_index('ix_compliance_alert_document_id_resolved_at')
+        batch_op.drop_index('ix_compliance_alert_user_id_resolved_at')
+        batch_op.drop_constraint('fk_compliance_alert_document_id', type_='foreignkey')
+        batch_op.drop_column('resolved_at')
+        batch_op.drop_column('created_at')
+        batch_op.drop_column('document_id')
@@ -0,0 +1,51 @@
+"""Delivery status callbacks and suppressed recipients
+
+Revision ID: a2d8e6f0b4c9
+Revises: f1c7d9e3a5b8
+Create Date: 2026-10-19 23:12:08.417305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a2d8e6f0b4c9'
+down_revision = 'f1c7d9e3a5b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('delivery_status',
+    sa.Column('provider_message_id', sa.String(length=255), nullable=False),
+    sa.Column('channel', sa.String(length=10), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('rank', sa.SmallInteger(), nullable=False),
+    sa.Column('error_code', sa.String(length=20), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('provider_message_id')
+    )
+    op.create_table('suppressed_recipient',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('channel', sa.String(length=10), nullable=False),
+    sa.Column('recipient', sa.String(length=120), nullable=False),
+    sa.Column('reason', sa.String(length=20), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('channel', 'recipient', name='uq_suppressed_recipient_channel_recipient')
+    )
+    with op.batch_alter_table('outbound_message', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('provider_message_id', sa.String(length=255), nullable=True))
+        batch_op.create_index(batch_op.f('ix_outbound_message_provider_message_id'), ['provider_message_id'], unique=True)
+        batch_op.create_index('ix_outbound_message_status_sent_at', ['status', 'sent_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('outbound_message', schema=None) as batch_op:
+        batch_op.drop_index('ix_outbound_message_status_sent_at')
+        batch_op.drop_index(batch_op.f('ix_outbound_message_provider_message_id'))
+        batch_op.drop_column('provider_message_id')
+
+    op.drop_table('suppressed_recipient')
+    op.drop_table('delivery_status')
@@ -0,0 +1,32 @@
+"""Staging table for delivery status callbacks
+
+Revision ID: a9c1e5f7b3d2
+Revises: f4b8d0a2c6e9
+Create Date: 2026-10-20 10:02:41.538206
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9c1e5f7b3d2'
+down_revision = 'f4b8d0a2c6e9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('delivery_event',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('provider_message_id', sa.String(length=255), nullable=False),
+    sa.Column('channel', sa.String(length=10), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('error_code', sa.String(length=20), nullable=True),
+    sa.Column('received_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('delivery_event')
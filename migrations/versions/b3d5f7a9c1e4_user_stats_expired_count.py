@@ -0,0 +1,60 @@
+"""Count expired documents apart from expiring ones in user_stats
+
+Revision ID: b3d5f7a9c1e4
+Revises: a9c1e5f7b3d2
+Create Date: 2026-10-20 11:27:50.114382
+
+"""
+import os
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.backfill import add_column, backfill, enforce_not_null
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3d5f7a9c1e4'
+down_revision = 'a9c1e5f7b3d2'
+branch_labels = None
+depends_on = None
+
+BACKFILL = 'user_stats:expired_count'
+
+
+def upgrade():
+    add_column('user_stats', sa.Column('expired_count', sa.Integer()))
+    add_column('user_stats', sa.Column('expired_before', sa.DateTime()))
+
+    # expiring_count used to include expired documents; recount both.
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    horizon = today + timedelta(days=int(os.environ.get("USER_STATS_EXPIRING_DAYS", 30)))
+    document = sa.table('document', sa.column('user_id'), sa.column('end_date'))
+    documents = sa.select(sa.func.count()).select_from(document).where(
+        document.c.user_id == sa.literal_column('user_stats.user_id')
+    )
+    backfill(
+        'user_stats',
+        {
+            'expired_before': sa.literal(today, sa.DateTime()),
+            'expiring_before': sa.literal(horizon, sa.DateTime()),
+            'expired_count': documents.where(document.c.end_date < today).scalar_subquery(),
+            'expiring_count': documents.where(
+                document.c.end_date >= today, document.c.end_date < horizon
+            ).scalar_subquery(),
+        },
+        key='user_id',
+        name=BACKFILL,
+    )
+    enforce_not_null('user_stats', 'expired_count', sa.Integer())
+    enforce_not_null('user_stats', 'expired_before', sa.DateTime())
+
+
+def downgrade():
+    # expiring_count goes back to including expired documents.
+    op.execute('UPDATE user_stats SET expiring_count = expiring_count + expired_count')
+    op.execute(sa.text('DELETE FROM backfill_progress WHERE name = :name').bindparams(name=BACKFILL))
+    with op.batch_alter_table('user_stats', schema=None) as batch_op:
+        batch_op.drop_column('expired_before')
+        batch_op.drop_column('expired_count')
@@ -0,0 +1,32 @@
+"""Content-addressed document files
+
+Revision ID: b7d4e2a91f05
+Revises: 9f3b2d81c7e4
+Create Date: 2026-10-19 17:45:12.208314
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d4e2a91f05'
+down_revision = '9f3b2d81c7e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('document', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('file_name', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('file_mimetype', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('file_size', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_document_file_path'), ['file_path'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('document', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_document_file_path'))
+        batch_op.drop_column('file_size')
+        batch_op.drop_column('file_mimetype')
+        batch_op.drop_column('file_name')
@@ -0,0 +1,65 @@
+"""ON DELETE rules for user-owned rows and deferred account purge
+
+Revision ID: b9e1c5d3f7a2
+Revises: a2d8e6f0b4c9
+Create Date: 2026-10-20 01:37:52.904116
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9e1c5d3f7a2'
+down_revision = 'a2d8e6f0b4c9'
+branch_labels = None
+depends_on = None
+
+# The initial migration left these foreign keys unnamed. This convention
+# gives them PostgreSQL's default names, and the same names in SQLite's
+# batch mode, so they can be dropped on both.
+naming_convention = {"fk": "%(table_name)s_%(column_0_name)s_fkey"}
+
+RULES = {
+    'vehicle': 'CASCADE',
+    'document': 'CASCADE',
+    'compliance_alert': 'CASCADE',
+    'feedback': 'CASCADE',
+    'log': 'SET NULL',
+}
+
+
+def _replace_user_fks(rules):
+    for table, ondelete in rules.items():
+        name = f'{table}_user_id_fkey'
+        with op.batch_alter_table(table, schema=None, naming_convention=naming_convention) as batch_op:
+            batch_op.drop_constraint(name, type_='foreignkey')
+            batch_op.create_foreign_key(name, 'user', ['user_id'], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_user_deleted_at'), ['deleted_at'], unique=False)
+
+    _replace_user_fks(RULES)
+
+    with op.batch_alter_table('feedback', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_feedback_user_id'), ['user_id'], unique=False)
+
+    with op.batch_alter_table('log', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_log_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('log', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_log_user_id'))
+
+    with op.batch_alter_table('feedback', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_feedback_user_id'))
+
+    _replace_user_fks({table: None for table in RULES})
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_deleted_at'))
+        batch_op.drop_column('deleted_at')
@@ -0,0 +1,26 @@
+"""Document preview status
+
+Revision ID: c3e8f1a5d7b2
+Revises: b7d4e2a91f05
+Create Date: 2026-10-19 18:20:47.913025
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e8f1a5d7b2'
+down_revision = 'b7d4e2a91f05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('document', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('preview_status', sa.String(length=10), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('document', schema=None) as batch_op:
+        batch_op.drop_column('preview_status')
@@ -0,0 +1,55 @@
+"""Append-only document history
+
+Revision ID: c4f2a8d6e0b1
+Revises: b9e1c5d3f7a2
+Create Date: 2026-10-20 03:18:40.552917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f2a8d6e0b1'
+down_revision = 'b9e1c5d3f7a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('document_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('document_id', sa.Integer(), nullable=False),
+    sa.Column('vehicle_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('change', sa.String(length=10), nullable=False),
+    sa.Column('document_type', sa.String(length=50), nullable=False),
+    sa.Column('serial_number', sa.String(length=100), nullable=False),
+    sa.Column('start_date', sa.DateTime(), nullable=False),
+    sa.Column('end_date', sa.DateTime(), nullable=False),
+    sa.Column('valid_from', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('document_version', schema=None) as batch_op:
+        batch_op.create_index('ix_document_version_document_id_valid_from', ['document_id', 'valid_from', 'id'], unique=False)
+        batch_op.create_index('ix_document_version_vehicle_id_valid_from', ['vehicle_id', 'valid_from', 'id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_document_version_user_id'), ['user_id'], unique=False)
+
+    # Earlier edits and renewals are lost; existing documents start their
+    # history as created, in their current state, when they were posted.
+    op.execute(
+        "INSERT INTO document_version (document_id, vehicle_id, user_id, change, document_type, "
+        "serial_number, start_date, end_date, valid_from) "
+        "SELECT id, vehicle_id, user_id, 'created', document_type, serial_number, start_date, "
+        "end_date, date_posted FROM document"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('document_version', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_document_version_user_id'))
+        batch_op.drop_index('ix_document_version_vehicle_id_valid_from')
+        batch_op.drop_index('ix_document_version_document_id_valid_from')
+
+    op.drop_table('document_version')
@@ -0,0 +1,26 @@
+"""Document file encoding
+
+Revision ID: d5a9c3e7f1b4
+Revises: c3e8f1a5d7b2
+Create Date: 2026-10-19 19:05:12.481203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a9c3e7f1b4'
+down_revision = 'c3e8f1a5d7b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('document', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('file_encoding', sa.String(length=10), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('document', schema=None) as batch_op:
+        batch_op.drop_column('file_encoding')
@@ -0,0 +1,64 @@
+"""Archive table for long-expired documents
+
+Revision ID: d7e3b1f9a5c2
+Revises: c4f2a8d6e0b1
+Create Date: 2026-10-20 05:02:11.384620
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7e3b1f9a5c2'
+down_revision = 'c4f2a8d6e0b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('archived_document',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('document_type', sa.String(length=50), nullable=False),
+    sa.Column('serial_number', sa.String(length=100), nullable=False),
+    sa.Column('start_date', sa.DateTime(), nullable=False),
+    sa.Column('end_date', sa.DateTime(), nullable=False),
+    sa.Column('date_posted', sa.DateTime(), nullable=False),
+    sa.Column('vehicle_id', sa.Integer(), nullable=False),
+    sa.Column('additional_info', sa.Text(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('file_path', sa.String(length=300), nullable=True),
+    sa.Column('file_name', sa.String(length=255), nullable=True),
+    sa.Column('file_mimetype', sa.String(length=100), nullable=True),
+    sa.Column('file_size', sa.Integer(), nullable=True),
+    sa.Column('preview_status', sa.String(length=10), nullable=True),
+    sa.Column('file_encoding', sa.String(length=10), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['vehicle_id'], ['vehicle.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('archived_document', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_archived_document_file_path'), ['file_path'], unique=False)
+        batch_op.create_index('ix_archived_document_user_id_end_date', ['user_id', 'end_date'], unique=False)
+        batch_op.create_index('ix_archived_document_vehicle_id_end_date', ['vehicle_id', 'end_date'], unique=False)
+
+    # SQLite hands the highest rowid out again once that row is deleted;
+    # AUTOINCREMENT stops it, so an archived document's id stays its own.
+    if op.get_bind().dialect.name == 'sqlite':
+        with op.batch_alter_table('document', recreate='always', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+            pass
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        with op.batch_alter_table('document', recreate='always') as batch_op:
+            pass
+
+    with op.batch_alter_table('archived_document', schema=None) as batch_op:
+        batch_op.drop_index('ix_archived_document_vehicle_id_end_date')
+        batch_op.drop_index('ix_archived_document_user_id_end_date')
+        batch_op.drop_index(batch_op.f('ix_archived_document_file_path'))
+
+    op.drop_table('archived_document')
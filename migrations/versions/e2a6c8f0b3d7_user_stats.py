@@ -0,0 +1,52 @@
+"""Per-user vehicle and document counts
+
+Revision ID: e2a6c8f0b3d7
+Revises: d7e3b1f9a5c2
+Create Date: 2026-10-20 06:41:27.905318
+
+"""
+import os
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a6c8f0b3d7'
+down_revision = 'd7e3b1f9a5c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('vehicle_count', sa.Integer(), nullable=False),
+    sa.Column('document_count', sa.Integer(), nullable=False),
+    sa.Column('expiring_count', sa.Integer(), nullable=False),
+    sa.Column('expiring_before', sa.DateTime(), nullable=False),
+    sa.Column('reconciled_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+    now = datetime.utcnow()
+    days = int(os.environ.get("USER_STATS_EXPIRING_DAYS", 30))
+    horizon = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=days)
+    op.get_bind().execute(
+        sa.text(
+            'INSERT INTO user_stats (user_id, vehicle_count, document_count, expiring_count, '
+            'expiring_before, reconciled_at) '
+            'SELECT id, '
+            '(SELECT count(*) FROM vehicle WHERE vehicle.user_id = "user".id), '
+            '(SELECT count(*) FROM document WHERE document.user_id = "user".id), '
+            '(SELECT count(*) FROM document WHERE document.user_id = "user".id AND document.end_date < :horizon), '
+            ':horizon, :now FROM "user"'
+        ).bindparams(sa.bindparam('horizon', type_=sa.DateTime()), sa.bindparam('now', type_=sa.DateTime())),
+        {"horizon": horizon, "now": now},
+    )
+
+
+def downgrade():
+    op.drop_table('user_stats')
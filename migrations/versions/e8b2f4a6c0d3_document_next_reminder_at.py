@@ -0,0 +1,30 @@
+"""Document next reminder time
+
+Revision ID: e8b2f4a6c0d3
+Revises: d5a9c3e7f1b4
+Create Date: 2026-10-19 20:12:36.207415
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b2f4a6c0d3'
+down_revision = 'd5a9c3e7f1b4'
+branch_labels = None
+depends_on = None
+
+
+# Existing documents get their time from "flask schedule-reminders", which
+# needs the app's thresholds and timezone.
+def upgrade():
+    with op.batch_alter_table('document', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('next_reminder_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_document_next_reminder_at'), ['next_reminder_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('document', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_document_next_reminder_at'))
+        batch_op.drop_column('next_reminder_at')
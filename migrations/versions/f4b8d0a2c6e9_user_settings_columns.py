@@ -0,0 +1,50 @@
+"""Notification and privacy settings columns, with batched backfill progress
+
+Revision ID: f4b8d0a2c6e9
+Revises: e2a6c8f0b3d7
+Create Date: 2026-10-20 08:15:03.671942
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.backfill import add_column_with_backfill
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4b8d0a2c6e9'
+down_revision = 'e2a6c8f0b3d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Already committed if an earlier run was interrupted during a backfill.
+    if not sa.inspect(op.get_bind()).has_table('backfill_progress'):
+        op.create_table('backfill_progress',
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('last_id', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+        )
+
+    # Existing users keep getting reminders and start out private.
+    add_column_with_backfill(
+        'user',
+        sa.Column('notifications_enabled', sa.Boolean(), server_default=sa.true()),
+        sa.true(),
+    )
+    add_column_with_backfill(
+        'user',
+        sa.Column('privacy_settings', sa.String(length=10), server_default='private'),
+        sa.literal('private'),
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('privacy_settings')
+        batch_op.drop_column('notifications_enabled')
+
+    op.drop_table('backfill_progress')
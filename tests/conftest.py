@@ -0,0 +1,36 @@
+import pytest
+
+from app import create_app, db
+from app.config import Config
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    # A throwaway app on its own SQLite file, with in-memory TTL stores.
+    def make(**overrides):
+        class TestConfig(Config):
+            TESTING = True
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'app.db'}"
+            WTF_CSRF_ENABLED = False
+            MAIL_SUPPRESS_SEND = True
+            SERVER_NAME = "localhost"
+            SCHEDULER_ENABLED = False
+            # get_store() caches stores by URL, so each test gets its own.
+            OTP_STORE_URL = f"memory://{tmp_path.name}"
+            RATELIMIT_STORE_URL = f"memory://{tmp_path.name}"
+            COMPLIANCE_CACHE_STORE_URL = f"memory://{tmp_path.name}"
+            DOCUMENT_STORE_PATH = str(tmp_path / "documents")
+
+        for key, value in overrides.items():
+            setattr(TestConfig, key, value)
+        app = create_app(TestConfig)
+        with app.app_context():
+            db.create_all()
+        return app
+
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app import db
+from app.archive import archive_expired
+from app.compliance import generate_compliance_alerts
+from app.models import ArchivedDocument, ComplianceAlert, Document, User, Vehicle
+
+
+def add_document(vehicle, document_type, ended_days_ago):
+    now = datetime.utcnow()
+    document = Document(
+        document_type=document_type,
+        serial_number=f"{document_type}-{ended_days_ago}",
+        start_date=now - timedelta(days=ended_days_ago + 365),
+        end_date=now - timedelta(days=ended_days_ago),
+        vehicle=vehicle,
+        user_id=vehicle.owner.id,
+    )
+    db.session.add(document)
+    return document
+
+
+def test_only_superseded_documents_are_archived(make_app):
+    app = make_app(DOCUMENT_ARCHIVE_BATCH_SIZE=1)
+    with app.app_context():
+        user = User(username="alice", email="a@example.com", password="x" * 60)
+        truck = Vehicle(name="Truck", vehicle_number="KA-1", owner=user)
+        van = Vehicle(name="Van", vehicle_number="KA-2", owner=user)
+        db.session.add_all([user, truck, van])
+        db.session.flush()
+        replaced = [add_document(truck, "Insurance", 800), add_document(truck, "Insurance", 500)]
+        add_document(truck, "Insurance", -100)
+        never_renewed = add_document(truck, "Pollution", 600)
+        # A newer document on another vehicle doesn't replace it.
+        other_vehicle = add_document(van, "Insurance", 700)
+        db.session.commit()
+        replaced = [d.id for d in replaced]
+        kept = [never_renewed.id, other_vehicle.id]
+        generate_compliance_alerts()
+        db.session.commit()
+
+        assert archive_expired() == 2
+        archived = db.session.scalars(select(ArchivedDocument.id)).all()
+        assert sorted(archived) == replaced
+        assert all(db.session.get(Document, document_id) for document_id in kept)
+        alerts = db.session.scalars(select(ComplianceAlert.document_id)).all()
+        assert sorted(alerts) == sorted(kept)
@@ -0,0 +1,64 @@
+import importlib.util
+import logging
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+import sqlalchemy as sa
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+
+from app import backfill
+
+MIGRATION = Path(__file__).parent.parent / "migrations" / "versions" / "f4b8d0a2c6e9_user_settings_columns.py"
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture
+def user_settings():
+    spec = importlib.util.spec_from_file_location("user_settings_columns", MIGRATION)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def migrate(engine, step):
+    with engine.connect() as connection:
+        # One transaction around the migration, as on PostgreSQL; the
+        # backfill's autocommit block commits what ran before it.
+        context = MigrationContext.configure(connection, opts={"transactional_ddl": True})
+        with Operations.context(context), context.begin_transaction():
+            step()
+
+
+def test_interrupted_backfill_resumes_when_rerun(tmp_path, monkeypatch, caplog, user_settings):
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    with engine.begin() as connection:
+        connection.execute(sa.text('CREATE TABLE "user" (id INTEGER PRIMARY KEY, username VARCHAR(20))'))
+        connection.execute(sa.text('INSERT INTO "user" (username) VALUES ' + ", ".join(f"('u{n}')" for n in range(5))))
+    monkeypatch.setenv("BACKFILL_BATCH_SIZE", "2")
+
+    def stop(seconds):
+        raise Interrupted
+
+    monkeypatch.setattr(backfill, "time", SimpleNamespace(sleep=stop))
+    with pytest.raises(Interrupted):
+        migrate(engine, user_settings.upgrade)
+    with engine.connect() as connection:
+        assert connection.scalar(sa.text("SELECT last_id FROM backfill_progress")) == 2
+
+    monkeypatch.setattr(backfill, "time", SimpleNamespace(sleep=lambda seconds: None))
+    with caplog.at_level(logging.INFO):
+        migrate(engine, user_settings.upgrade)
+    assert "Resuming backfill user:notifications_enabled after id 2" in caplog.text
+
+    columns = {column["name"]: column for column in sa.inspect(engine).get_columns("user")}
+    assert not columns["notifications_enabled"]["nullable"]
+    assert not columns["privacy_settings"]["nullable"]
+    with engine.connect() as connection:
+        rows = connection.execute(sa.text('SELECT notifications_enabled, privacy_settings FROM "user"')).all()
+        assert rows == [(1, "private")] * 5
+        assert connection.scalar(sa.text("SELECT count(*) FROM backfill_progress WHERE completed_at IS NULL")) == 0
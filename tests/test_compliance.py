@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app import db
+from app.compliance import build_compliance_summary, generate_compliance_alerts
+from app.models import ComplianceAlert, Document, User, Vehicle
+
+
+def add_document(vehicle, document_type, ends_in_days):
+    now = datetime.utcnow()
+    document = Document(
+        document_type=document_type,
+        serial_number=f"{document_type}-{ends_in_days}",
+        start_date=now - timedelta(days=365),
+        end_date=now + timedelta(days=ends_in_days),
+        vehicle=vehicle,
+        user_id=vehicle.owner.id,
+    )
+    db.session.add(document)
+    return document
+
+
+def open_alerts():
+    return db.session.scalars(
+        select(ComplianceAlert.document_id).where(ComplianceAlert.resolved_at.is_(None))
+    ).all()
+
+
+def test_replaced_documents_get_no_alerts(app):
+    with app.app_context():
+        user = User(username="alice", email="a@example.com", password="x" * 60)
+        truck = Vehicle(name="Truck", vehicle_number="KA-1", owner=user)
+        db.session.add_all([user, truck])
+        db.session.flush()
+        add_document(truck, "Insurance", -10)
+        add_document(truck, "Insurance", 365)
+        lapsed = add_document(truck, "Pollution", -5)
+        db.session.commit()
+
+        generate_compliance_alerts()
+        db.session.commit()
+        assert open_alerts() == [lapsed.id]
+
+        # Uploading a replacement resolves the alert on the old document.
+        add_document(truck, "Pollution", 180)
+        db.session.commit()
+        assert generate_compliance_alerts() == (0, 1)
+        db.session.commit()
+        assert open_alerts() == []
+
+
+def test_replaced_documents_are_not_counted_as_expired(app):
+    with app.app_context():
+        user = User(username="alice", email="a@example.com", password="x" * 60)
+        truck = Vehicle(name="Truck", vehicle_number="KA-1", owner=user)
+        db.session.add_all([user, truck])
+        db.session.flush()
+        add_document(truck, "Insurance", -400)
+        add_document(truck, "Insurance", -10)
+        add_document(truck, "Insurance", 20)
+        add_document(truck, "Pollution", -5)
+        db.session.commit()
+
+        summary = build_compliance_summary(user.id)
+        assert summary["totals"]["expired"] == 1
+        assert summary["by_type"]["Insurance"]["expired"] == 0
+        assert summary["by_type"]["Insurance"]["within_30"] == 1
+        assert summary["vehicles"][0]["counts"]["expired"] == 1
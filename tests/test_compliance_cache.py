@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.compliance import _version_key, get_compliance_summary
+from app.models import Document, User, Vehicle
+from app.purge import delete_vehicle
+from app.ttl_store import get_store
+
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    return make_app(COMPLIANCE_CACHE_STORE_URL=f"sqlite:///{tmp_path / 'ttl.db'}")
+
+
+@pytest.fixture
+def user_id(app):
+    with app.app_context():
+        user = User(username="alice", email="a@example.com", password="x" * 60)
+        vehicle = Vehicle(name="Truck", vehicle_number="KA-1", owner=user)
+        now = datetime.utcnow()
+        db.session.add_all([user, vehicle])
+        db.session.flush()
+        db.session.add(
+            Document(
+                document_type="Insurance",
+                serial_number="1",
+                start_date=now - timedelta(days=300),
+                end_date=now - timedelta(days=1),
+                vehicle=vehicle,
+                user_id=user.id,
+            )
+        )
+        db.session.commit()
+        return user.id
+
+
+def expired(user_id):
+    return get_compliance_summary(user_id)["totals"]["expired"]
+
+
+def test_write_in_another_worker_invalidates_cached_summary(app, user_id):
+    with app.app_context():
+        assert expired(user_id) == 1
+        # A statement the ORM events don't see: the cached copy is served.
+        db.session.execute(db.update(Document).values(end_date=datetime.utcnow() + timedelta(days=365)))
+        db.session.commit()
+        assert expired(user_id) == 1
+        # Another worker replacing the shared version token.
+        get_store("COMPLIANCE_CACHE_STORE_URL").set(_version_key(user_id), "other-worker", 60)
+        assert expired(user_id) == 0
+
+
+def test_orm_write_invalidates_after_commit(app, user_id):
+    with app.app_context():
+        assert expired(user_id) == 1
+        document = Document.query.first()
+        document.end_date = datetime.utcnow() + timedelta(days=365)
+        db.session.flush()
+        assert expired(user_id) == 1
+        db.session.commit()
+        assert expired(user_id) == 0
+
+
+def test_rolled_back_write_keeps_cache(app, user_id):
+    with app.app_context():
+        token = get_store("COMPLIANCE_CACHE_STORE_URL").get(_version_key(user_id))
+        Document.query.first().end_date = datetime.utcnow() + timedelta(days=365)
+        db.session.flush()
+        db.session.rollback()
+        assert get_store("COMPLIANCE_CACHE_STORE_URL").get(_version_key(user_id)) == token
+
+
+def test_bulk_vehicle_delete_invalidates(app, user_id):
+    with app.app_context():
+        assert expired(user_id) == 1
+        delete_vehicle(Vehicle.query.first().id)
+        db.session.commit()
+        assert expired(user_id) == 0
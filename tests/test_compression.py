@@ -0,0 +1,90 @@
+import io
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from app import db, storage
+from app.compression import compress_all
+from app.models import Document, User, Vehicle
+from app.storage import attach_file, get_store
+
+PDF = b"%PDF-1.4\n" + b"0 0 obj << /Type /Page >> endobj\n" * 2000
+JPEG = b"\xff\xd8\xff\xe0" + bytes(range(256)) * 40
+
+
+@pytest.fixture
+def vehicle(app):
+    with app.app_context():
+        user = User(username="alice", email="a@example.com", password="x" * 60)
+        vehicle = Vehicle(name="Truck", vehicle_number="KA-1", owner=user)
+        db.session.add_all([user, vehicle])
+        db.session.commit()
+        yield vehicle
+
+
+def add_document(vehicle, content, codec):
+    # Stores content with codec, as an upload made while it was configured.
+    get_store().codec = codec
+    now = datetime.utcnow()
+    document = Document(
+        document_type="Insurance",
+        serial_number=str(len(vehicle.documents)),
+        start_date=now,
+        end_date=now + timedelta(days=365),
+        vehicle=vehicle,
+        user_id=vehicle.owner.id,
+    )
+    db.session.add(document)
+    db.session.flush()
+    attach_file(document, io.BytesIO(content), "scan")
+    db.session.commit()
+    return document
+
+
+def encodings():
+    return db.session.scalars(select(Document.file_encoding).order_by(Document.id)).all()
+
+
+def test_recompress_round_trip(vehicle):
+    document = add_document(vehicle, PDF, None)
+    document.file_encoding = None
+    db.session.commit()
+
+    get_store().codec = "gzip"
+    stats = compress_all()
+    assert stats["files"] == 1
+    assert stats["after_bytes"] < stats["before_bytes"] == len(PDF)
+    assert encodings() == ["gzip"]
+    assert get_store().locate(document.file_path)[1] == "gzip"
+    with get_store().open(document.file_path) as f:
+        assert f.read() == PDF
+
+
+def test_mixed_encodings_move_to_the_current_codec(vehicle):
+    gzipped = add_document(vehicle, PDF + b"1", "gzip")
+    plain = add_document(vehicle, PDF + b"2", None)
+    plain.file_encoding = None
+    photo = add_document(vehicle, JPEG, "zstd")
+    # The same content shared by two documents is recompressed once.
+    shared = add_document(vehicle, PDF + b"1", "gzip")
+    db.session.commit()
+    assert encodings() == ["gzip", None, "identity", "gzip"]
+
+    get_store().codec = "zstd"
+    assert compress_all()["files"] == 2
+    assert encodings() == ["zstd", "zstd", "identity", "zstd"]
+    for document, content in ((gzipped, PDF + b"1"), (plain, PDF + b"2"), (photo, JPEG), (shared, PDF + b"1")):
+        with get_store().open(document.file_path) as f:
+            assert f.read() == content
+    assert compress_all()["files"] == 0
+
+
+def test_zstd_files_wait_for_zstandard(vehicle, monkeypatch):
+    add_document(vehicle, PDF, "zstd")
+    # Without zstandard the configured codec falls back to gzip, and zstd
+    # files can't be read to recompress them.
+    monkeypatch.setattr(storage, "_zstandard", lambda: None)
+    get_store().codec = "gzip"
+    assert compress_all()["files"] == 0
+    assert encodings() == ["zstd"]
@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, update
+
+from app import db
+from app.counters import get_user_stats, reconcile_user_stats, remove_documents
+from app.models import Document, User, UserStats, Vehicle
+
+
+def add_document(vehicle, serial_number, ends_in_days):
+    now = datetime.utcnow()
+    document = Document(
+        document_type="Insurance",
+        serial_number=serial_number,
+        start_date=now - timedelta(days=365),
+        end_date=now + timedelta(days=ends_in_days),
+        vehicle=vehicle,
+        user_id=vehicle.owner.id,
+    )
+    db.session.add(document)
+    return document
+
+
+def counts(user):
+    db.session.expire_all()
+    stats = get_user_stats(user.id)
+    return stats.document_count, stats.expired_count, stats.expiring_count
+
+
+def test_expired_documents_are_not_counted_as_expiring(app):
+    with app.app_context():
+        user = User(username="alice", email="a@example.com", password="x" * 60)
+        truck = Vehicle(name="Truck", vehicle_number="KA-1", owner=user)
+        db.session.add_all([user, truck])
+        db.session.flush()
+        lapsed = add_document(truck, "lapsed", -5)
+        soon = add_document(truck, "soon", 10)
+        add_document(truck, "later", 90)
+        db.session.commit()
+        assert counts(user) == (3, 1, 1)
+
+        # Renewing the lapsed document moves it out of both counts.
+        lapsed = db.session.get(Document, lapsed.id)
+        lapsed.end_date = datetime.utcnow() + timedelta(days=365)
+        db.session.commit()
+        assert counts(user) == (3, 0, 1)
+
+        db.session.delete(soon)
+        db.session.commit()
+        assert counts(user) == (2, 0, 0)
+
+        add_document(truck, "old", -30)
+        db.session.commit()
+        remove_documents(Document.serial_number == "old")
+        db.session.execute(delete(Document).where(Document.serial_number == "old"))
+        db.session.commit()
+        assert counts(user) == (2, 0, 0)
+
+
+def test_reconcile_repairs_both_counts(app):
+    with app.app_context():
+        user = User(username="alice", email="a@example.com", password="x" * 60)
+        truck = Vehicle(name="Truck", vehicle_number="KA-1", owner=user)
+        db.session.add_all([user, truck])
+        db.session.flush()
+        add_document(truck, "lapsed", -5)
+        add_document(truck, "soon", 10)
+        db.session.commit()
+        db.session.execute(update(UserStats).values(expired_count=0, expiring_count=2))
+        db.session.commit()
+
+        assert reconcile_user_stats() == 1
+        assert counts(user) == (2, 1, 1)
+        assert reconcile_user_stats() == 0
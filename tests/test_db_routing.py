@@ -0,0 +1,66 @@
+import pytest
+from flask import request
+from sqlalchemy import select
+
+from app import db
+from app.db_routing import REPLICA_PREFIX, sync_sqlite_replicas
+from app.models import User, Vehicle
+
+
+def vehicle_names():
+    return ",".join(db.session.scalars(select(Vehicle.name).order_by(Vehicle.id)))
+
+
+def names_view():
+    # Reads, optionally writes, then reads again.
+    before = vehicle_names()
+    if "add" in request.args:
+        user = db.session.scalar(select(User))
+        db.session.add(Vehicle(name=request.args["add"], vehicle_number=request.args["add"], owner=user))
+        db.session.commit()
+        return f"{before} -> {vehicle_names()}"
+    return before
+
+
+@pytest.fixture
+def make_routed_app(make_app, tmp_path):
+    def make(**overrides):
+        app = make_app(
+            DATABASE_REPLICA_URLS=[f"sqlite:///{tmp_path / 'replica.db'}"],
+            DB_REPLICA_ENDPOINTS=["names"],
+            **overrides,
+        )
+        app.add_url_rule("/names", "names", names_view, methods=["GET", "POST"])
+        with app.app_context():
+            user = User(username="alice", email="a@example.com", password="x" * 60)
+            db.session.add(Vehicle(name="Truck", vehicle_number="KA-1", owner=user))
+            db.session.commit()
+            sync_sqlite_replicas(app, db.engines)
+            # The replica hasn't caught up with this one yet.
+            db.session.add(Vehicle(name="Van", vehicle_number="KA-2", owner=user))
+            db.session.commit()
+        return app
+
+    yield make
+    # The shared db object keeps a MetaData per bind key it has seen.
+    for key in [key for key in db.metadatas if key and key.startswith(REPLICA_PREFIX)]:
+        del db.metadatas[key]
+
+
+def test_reads_go_to_the_replica_until_the_request_writes(make_routed_app):
+    client = make_routed_app(DB_READ_YOUR_WRITES_SECONDS=5).test_client()
+    assert client.get("/names").text == "Truck"
+    assert client.get("/names?add=Bus").text == "Truck -> Truck,Van,Bus"
+    # Pinned to the primary for DB_READ_YOUR_WRITES_SECONDS after the write.
+    assert client.get("/names").text == "Truck,Van,Bus"
+
+
+def test_writes_and_non_get_requests_use_the_primary(make_routed_app):
+    client = make_routed_app(DB_READ_YOUR_WRITES_SECONDS=0).test_client()
+    assert client.post("/names").text == "Truck,Van"
+
+
+def test_without_read_your_writes_the_next_request_reads_the_replica(make_routed_app):
+    client = make_routed_app(DB_READ_YOUR_WRITES_SECONDS=0).test_client()
+    assert client.get("/names?add=Bus").text == "Truck -> Truck,Van,Bus"
+    assert client.get("/names").text == "Truck"
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from app import db, outbox
+from app.delivery import flush_events
+from app.models import DeliveryEvent, DeliveryStatus, OutboundMessage, SuppressedRecipient
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app(DELIVERY_CALLBACK_TOKEN="secret")
+
+
+def callback(app, sid, status, error_code=None):
+    data = {"MessageSid": sid, "MessageStatus": status}
+    if error_code:
+        data["ErrorCode"] = error_code
+    return app.test_client().post("/notifications/status/sms?token=secret", data=data).status_code
+
+
+def queue(number):
+    message = OutboundMessage(
+        channel="sms", recipient=number, body="Reminder", not_before=datetime.utcnow() - timedelta(minutes=1)
+    )
+    db.session.add(message)
+    db.session.commit()
+    return message.id
+
+
+def suppressed():
+    return db.session.scalars(select(SuppressedRecipient.recipient)).all()
+
+
+def test_callbacks_are_staged_then_flushed(app):
+    assert callback(app, "SM1", "sent") == 204
+    assert callback(app, "SM1", "delivered") == 204
+    assert callback(app, "SM2", "sent") == 204
+    with app.app_context():
+        assert db.session.query(DeliveryEvent).count() == 3
+        assert db.session.query(DeliveryStatus).count() == 0
+        assert flush_events() == 3
+        assert db.session.query(DeliveryEvent).count() == 0
+        assert db.session.get(DeliveryStatus, "SM1").status == "delivered"
+        assert db.session.get(DeliveryStatus, "SM2").status == "sent"
+
+
+def test_bounce_after_send_suppresses_recipient(app, monkeypatch):
+    monkeypatch.setattr(outbox, "_send", lambda message: "SM1")
+    with app.app_context():
+        assert outbox.deliver(queue("+15550001"))
+    callback(app, "SM1", "undelivered", "30006")
+    with app.app_context():
+        flush_events()
+        assert suppressed() == ["+15550001"]
+
+
+def test_bounce_before_send_commits_suppresses_recipient(app, monkeypatch):
+    callback(app, "SM1", "undelivered", "30006")
+    with app.app_context():
+        flush_events()
+        assert suppressed() == []
+        monkeypatch.setattr(outbox, "_send", lambda message: "SM1")
+        assert outbox.deliver(queue("+15550001"))
+        assert suppressed() == ["+15550001"]
+
+
+def test_delivered_message_is_not_suppressed(app, monkeypatch):
+    monkeypatch.setattr(outbox, "_send", lambda message: "SM1")
+    callback(app, "SM1", "delivered")
+    with app.app_context():
+        flush_events()
+        assert outbox.deliver(queue("+15550001"))
+        assert suppressed() == []
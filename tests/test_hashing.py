@@ -0,0 +1,44 @@
+import time
+
+import pytest
+
+from app import db, hashing
+from app.hashing import HashingBusy, _run, hash_password, pool_size
+from app.models import User
+
+
+@pytest.fixture(autouse=True)
+def shutdown_pool():
+    yield
+    if hashing._pool is not None:
+        hashing._pool.shutdown(cancel_futures=True)
+        hashing._pool = None
+
+
+def test_pool_is_split_between_workers():
+    assert pool_size({"PASSWORD_HASH_POOL_SIZE": 8, "WEB_CONCURRENCY": 4}) == 2
+    assert pool_size({"PASSWORD_HASH_POOL_SIZE": 2, "WEB_CONCURRENCY": 4}) == 1
+    assert pool_size({"PASSWORD_HASH_POOL_SIZE": 0, "WEB_CONCURRENCY": 4}) == 0
+
+
+def test_timeout_is_a_retryable_503(make_app):
+    app = make_app(PASSWORD_HASH_POOL_SIZE=1, PASSWORD_HASH_TIMEOUT=0.05)
+    with app.app_context():
+        with pytest.raises(HashingBusy) as excinfo:
+            _run(time.sleep, 1)
+    assert excinfo.value.code == 503
+    assert excinfo.value.retry_after == 1
+
+
+def test_login_returns_503_when_hashing_times_out(make_app):
+    app = make_app(PASSWORD_HASH_POOL_SIZE=0)
+    with app.app_context():
+        db.session.add(User(username="alice", email="a@example.com", password=hash_password("secret")))
+        db.session.commit()
+    app.config.update(PASSWORD_HASH_POOL_SIZE=1, PASSWORD_HASH_TIMEOUT=0.001)
+
+    response = app.test_client().post(
+        "/login", data={"email": "a@example.com", "password": "secret", "submit": "Login"}
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,43 @@
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError, TimeoutError
+
+from app import db
+
+
+def test_failed_statement_leaves_no_start_time(make_app):
+    app = make_app(METRICS_ENABLED=True, SQL_PROFILER_ENABLED=True)
+    with app.app_context(), db.engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM no_such_table"))
+        assert conn.info["query_started"] == []
+        assert conn.info["profiler_started"] == []
+        conn.execute(text("SELECT 1"))
+        assert conn.info["query_started"] == []
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_pool_metrics_come_from_pool_events(make_app):
+    app = make_app(
+        METRICS_ENABLED=True,
+        SQLALCHEMY_ENGINE_OPTIONS={"pool_size": 1, "max_overflow": 1, "pool_timeout": 0.1},
+    )
+    app.add_url_rule("/query", "query", lambda: str(db.session.scalar(text("SELECT 1"))))
+    overflows = sample("docuflex_db_pool_overflow_checkouts_total", bind="default")
+    timeouts = sample("docuflex_db_pool_timeouts_total")
+    with app.app_context():
+        first, second = db.engine.connect(), db.engine.connect()
+        assert sample("docuflex_db_pool_checked_out", bind="default") == 2
+        assert sample("docuflex_db_pool_overflow_checkouts_total", bind="default") == overflows + 1
+
+        with pytest.raises(TimeoutError):
+            app.test_client().get("/query")
+        assert sample("docuflex_db_pool_timeouts_total") == timeouts + 1
+
+        first.close()
+        second.close()
+        assert sample("docuflex_db_pool_checked_out", bind="default") == 0
@@ -0,0 +1,48 @@
+import smtplib
+
+import pytest
+from requests.exceptions import ConnectionError, ConnectTimeout, ReadTimeout
+from twilio.base.exceptions import TwilioRestException
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from app.notification_utils import is_sms_transient, is_transient, retry_transient
+
+
+def refused():
+    reason = NewConnectionError(None, "Connection refused")
+    return ConnectionError(MaxRetryError(None, "/Messages.json", reason))
+
+
+def test_email_retries_on_temporary_smtp_failures():
+    assert is_transient(smtplib.SMTPResponseException(451, b"try later"))
+    assert not is_transient(smtplib.SMTPResponseException(550, b"no such user"))
+    assert is_transient(ConnectionRefusedError())
+
+
+@pytest.mark.parametrize(
+    "error, retry",
+    [
+        (TwilioRestException(429, "/Messages.json"), True),
+        (TwilioRestException(503, "/Messages.json"), False),
+        (TwilioRestException(400, "/Messages.json"), False),
+        (ConnectTimeout(), True),
+        (refused(), True),
+        (ReadTimeout(), False),
+        (ConnectionError(ProtocolError("Connection aborted")), False),
+    ],
+)
+def test_sms_retries_only_when_twilio_cannot_have_accepted(error, retry):
+    assert is_sms_transient(error) is retry
+
+
+def test_sms_5xx_is_not_retried(app):
+    calls = []
+
+    @retry_transient("sms", retry_if=is_sms_transient)
+    def send():
+        calls.append(1)
+        raise TwilioRestException(503, "/Messages.json")
+
+    with app.app_context(), pytest.raises(TwilioRestException):
+        send()
+    assert len(calls) == 1
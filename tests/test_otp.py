@@ -0,0 +1,86 @@
+import time
+
+import pytest
+
+from app.otp import check_otp, consume_grant, grant, has_grant, issue_otp
+from app.ttl_store import MemoryStore, SQLiteStore
+
+
+@pytest.fixture
+def ctx(make_app):
+    app = make_app(OTP_TTL=60, OTP_MAX_ATTEMPTS=3)
+    with app.test_request_context():
+        yield app
+
+
+def test_correct_code_succeeds_once(ctx):
+    code = issue_otp("delete_vehicle:1", 7, payload={"vehicle_id": 1})
+    result = check_otp("delete_vehicle:1", 7, code)
+    assert result.ok and result.payload == {"vehicle_id": 1}
+    assert check_otp("delete_vehicle:1", 7, code).reason == "expired"
+
+
+def test_code_is_bound_to_purpose_and_subject(ctx):
+    code = issue_otp("delete_vehicle:1", 7)
+    assert check_otp("delete_vehicle:2", 7, code).reason == "expired"
+    assert check_otp("delete_vehicle:1", 8, code).reason == "expired"
+    assert check_otp("delete_vehicle:1", 7, code).ok
+
+
+def test_code_expires(ctx):
+    ctx.config["OTP_TTL"] = 0.05
+    code = issue_otp("login", 7)
+    time.sleep(0.1)
+    assert check_otp("login", 7, code).reason == "expired"
+
+
+def test_attempt_limit_locks_the_code(ctx):
+    code = issue_otp("login", 7)
+    wrong = "000000"  # codes are 100000-999999
+    assert check_otp("login", 7, wrong).reason == "invalid"
+    assert check_otp("login", 7, wrong).reason == "invalid"
+    assert check_otp("login", 7, wrong).reason == "locked"
+    # The right code no longer works once the limit is reached.
+    assert check_otp("login", 7, code).reason == "locked"
+
+
+def test_new_code_resets_attempts(ctx):
+    issue_otp("login", 7)
+    for _ in range(3):
+        check_otp("login", 7, "000000")
+    code = issue_otp("login", 7)
+    assert check_otp("login", 7, code).ok
+
+
+def test_grant_is_consumed_once(ctx):
+    assert not has_grant("delete_vehicle:1", 7)
+    grant("delete_vehicle:1", 7)
+    assert has_grant("delete_vehicle:1", 7)
+    assert not has_grant("delete_vehicle:1", 8)
+    assert consume_grant("delete_vehicle:1", 7)
+    assert not consume_grant("delete_vehicle:1", 7)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStore()
+    return SQLiteStore(str(tmp_path / "ttl.db"))
+
+
+def test_store_expiry_and_pop(store):
+    store.set("a", "1", 60)
+    store.set("b", "2", 0.05)
+    assert store.get("a") == "1"
+    assert store.pop("a") == "1"
+    assert store.pop("a") is None
+    time.sleep(0.1)
+    assert store.get("b") is None
+    assert store.pop("b") is None
+
+
+def test_store_incr_restarts_after_expiry(store):
+    assert store.incr("n", 0.05) == 1
+    assert store.incr("n", 0.05) == 2
+    time.sleep(0.1)
+    assert store.incr("n", 60) == 1
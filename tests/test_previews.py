@@ -0,0 +1,116 @@
+import io
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from PIL import Image
+
+from app import db, previews
+from app.models import Document, User, Vehicle
+from app.previews import generate_previews
+from app.storage import attach_file, get_store
+
+
+@pytest.fixture(autouse=True)
+def shutdown_pool():
+    yield
+    if previews._pool is not None:
+        previews._pool.shutdown(cancel_futures=True)
+        previews._pool = None
+
+
+def photo():
+    buffer = io.BytesIO()
+    Image.new("RGB", (1600, 1200), "navy").save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def make_document(app):
+    # Adds a document with content attached; returns its id.
+    with app.app_context():
+        user = User(username="alice", email="a@example.com", password="x" * 60)
+        db.session.add(Vehicle(name="Truck", vehicle_number="KA-1", owner=user))
+        db.session.commit()
+
+    def make(content):
+        with app.app_context():
+            vehicle = db.session.get(Vehicle, 1)
+            now = datetime.utcnow()
+            document = Document(
+                document_type="Insurance",
+                serial_number=str(len(vehicle.documents)),
+                start_date=now,
+                end_date=now + timedelta(days=365),
+                vehicle=vehicle,
+                user_id=vehicle.user_id,
+            )
+            db.session.add(document)
+            db.session.flush()
+            attach_file(document, io.BytesIO(content), "scan")
+            db.session.commit()
+            return document.id
+
+    return make
+
+
+@pytest.fixture
+def client(app, make_document):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = "1"
+        session["_fresh"] = True
+    return client
+
+
+def preview_status(app, document_id):
+    with app.app_context():
+        return db.session.get(Document, document_id).preview_status
+
+
+def test_renditions_are_rendered_once_and_served_with_long_cache_headers(app, client, make_document):
+    document_id = make_document(photo())
+    assert client.get(f"/profile/documents/{document_id}/thumb").status_code == 404
+
+    with app.app_context():
+        assert generate_previews() == 1
+        digest = db.session.get(Document, document_id).file_path
+        with Image.open(get_store().path(digest, "thumb")) as thumb:
+            assert max(thumb.size) == app.config["THUMBNAIL_SIZE"]
+    assert preview_status(app, document_id) == "ready"
+    assert f"/profile/documents/{document_id}/thumb" in client.get("/vehicle/1").text
+
+    response = client.get(f"/profile/documents/{document_id}/thumb")
+    assert response.status_code == 200
+    assert response.mimetype == "image/jpeg"
+    assert "immutable" in response.headers["Cache-Control"]
+    assert "max-age=31536000" in response.headers["Cache-Control"]
+    again = client.get(f"/profile/documents/{document_id}/thumb", headers={"If-None-Match": response.headers["ETag"]})
+    assert again.status_code == 304
+
+
+def test_same_file_reuses_cached_renditions(app, make_document):
+    first = make_document(photo())
+    with app.app_context():
+        generate_previews()
+        digest = db.session.get(Document, first).file_path
+        rendered = os.path.getmtime(get_store().path(digest, "preview"))
+
+    second = make_document(photo())
+    assert preview_status(app, second) == "ready"
+    with app.app_context():
+        assert generate_previews() == 0
+        assert os.path.getmtime(get_store().path(digest, "preview")) == rendered
+
+
+def test_unrenderable_file_falls_back_to_no_thumbnail(app, client, make_document):
+    document_id = make_document(b"%PDF-1.4\nnot really a PDF\n" * 100)
+    with app.app_context():
+        assert generate_previews() == 1
+        assert generate_previews() == 0
+    assert preview_status(app, document_id) == "failed"
+    assert client.get(f"/profile/documents/{document_id}/preview").status_code == 404
+
+    page = client.get("/vehicle/1").text
+    assert "Insurance - Expires" in page
+    assert f"/profile/documents/{document_id}/thumb" not in page
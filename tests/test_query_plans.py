@@ -0,0 +1,8 @@
+from benchmarks.query_plans import check, seed
+
+
+def test_hot_queries_use_an_index(app):
+    # The same check as "python -m benchmarks.query_plans", on SQLite.
+    with app.app_context():
+        seed()
+        assert check() == {}
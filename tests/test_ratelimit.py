@@ -0,0 +1,111 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app import ratelimit
+from app.ratelimit import _hit, acquire_send_slot, parse_limit, send_window
+from app.ttl_store import MemoryStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=600.0)
+
+    def sleep(seconds):
+        clock.now += seconds
+
+    monkeypatch.setattr(ratelimit, "time", SimpleNamespace(time=lambda: clock.now, sleep=sleep))
+    return clock
+
+
+def test_parse_limit():
+    assert parse_limit("20/minute") == (20, 60)
+    assert parse_limit("5/15minutes") == (5, 900)
+    with pytest.raises(ValueError):
+        parse_limit("5 per minute")
+
+
+def test_hit_blocks_until_the_window_ends(clock):
+    store = MemoryStore()
+    assert [_hit(store, "k", 5, 60) for _ in range(5)] == [None] * 5
+    assert _hit(store, "k", 5, 60) == 61
+    clock.now = 630.0
+    assert _hit(store, "k", 5, 60) == 31
+
+
+def test_previous_window_counts_by_its_overlap(clock):
+    store = MemoryStore()
+    for _ in range(6):
+        _hit(store, "k", 5, 60)
+    # Halfway through the next window the 6 earlier hits weigh 3.
+    clock.now = 690.0
+    assert _hit(store, "k", 5, 60) is None
+    assert _hit(store, "k", 5, 60) is None
+    assert _hit(store, "k", 5, 60) == 31
+    # A full window later they no longer count.
+    clock.now = 780.0
+    assert [_hit(store, "k", 5, 60) for _ in range(5)] == [None] * 5
+
+
+def login(client, address, email="a@example.com"):
+    return client.post(
+        "/login",
+        data={"email": email, "password": "wrong", "submit": "Login"},
+        environ_base={"REMOTE_ADDR": address},
+    ).status_code
+
+
+def test_failed_logins_lock_out_only_the_sending_address(make_app):
+    app = make_app(
+        RATELIMIT_PER_ACCOUNT="5/15minutes",
+        RATELIMIT_PER_IP="100/minute",
+        PASSWORD_HASH_POOL_SIZE=0,
+    )
+    client = app.test_client()
+    assert [login(client, "10.0.0.1") for _ in range(5)] == [200] * 5
+    assert login(client, "10.0.0.1") == 429
+    assert login(client, "10.0.0.2") == 200
+    assert login(client, "10.0.0.1", email="b@example.com") == 200
+
+
+def test_refused_requests_do_not_count_toward_the_route_limit(make_app):
+    app = make_app(RATELIMIT_PER_ROUTE="30/minute", RATELIMIT_PER_IP="5/minute", PASSWORD_HASH_POOL_SIZE=0)
+    client = app.test_client()
+    codes = [login(client, "10.0.0.1", email=f"{n}@example.com") for n in range(40)]
+    assert codes == [200] * 5 + [429] * 35
+    assert login(client, "10.0.0.2") == 200
+
+
+def test_send_window():
+    assert send_window(10) == (1, 10)
+    assert send_window(2.5) == (1, 2)
+    assert send_window(0.5) == (2, 1)
+    assert send_window(0.3) == (4, 1)
+
+
+def send_times(app, clock, *bulk):
+    with app.app_context():
+        times = []
+        for flag in bulk:
+            acquire_send_slot("twilio", bulk=flag)
+            times.append(clock.now)
+        return times
+
+
+def test_fractional_rate_spaces_sends(make_app, clock):
+    app = make_app(SEND_RATE_LIMITS={"twilio": 0.5})
+    assert send_times(app, clock, False, False, False) == [600.0, 602.0, 604.0]
+
+
+def test_bulk_keeps_a_send_free_for_interactive(make_app, clock):
+    app = make_app(SEND_RATE_LIMITS={"twilio": 4}, BULK_SEND_SHARE=1.0)
+    # Three bulk sends fill the second except for one interactive send.
+    assert send_times(app, clock, True, True, True, False, True) == [600.0] * 4 + [601.0]
+
+
+def test_bulk_skips_windows_at_one_send_per_second(make_app, clock):
+    app = make_app(SEND_RATE_LIMITS={"twilio": 1})
+    # Bulk sends take every other second, so an OTP waits at most a second.
+    assert send_times(app, clock, True, True, True) == [600.0, 602.0, 604.0]
+    clock.now = 604.5
+    assert send_times(app, clock, False) == [605.0]
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db, routes
+from app.models import Document, OutboundMessage, User, Vehicle
+from app.reminders import send_due_reminders
+
+
+@pytest.fixture
+def document_id(app):
+    with app.app_context():
+        user = User(username="alice", email="a@example.com", password="x" * 60)
+        vehicle = Vehicle(name="Truck", vehicle_number="KA-1", owner=user)
+        db.session.add_all([user, vehicle])
+        db.session.flush()
+        document = Document(
+            document_type="Insurance",
+            serial_number="1",
+            start_date=datetime.utcnow() - timedelta(days=300),
+            end_date=datetime.utcnow() + timedelta(days=5),
+            vehicle=vehicle,
+            user_id=user.id,
+        )
+        db.session.add(document)
+        db.session.flush()
+        document.next_reminder_at = datetime.utcnow() - timedelta(minutes=1)
+        db.session.commit()
+        return document.id
+
+
+def test_due_reminder_is_queued_and_rescheduled(app, document_id):
+    with app.app_context():
+        due_at = db.session.get(Document, document_id).next_reminder_at
+        assert send_due_reminders() == 1
+        assert db.session.query(OutboundMessage).count() == 1
+        assert db.session.get(Document, document_id).next_reminder_at > due_at
+
+
+def test_failed_reminder_stays_due(app, document_id, monkeypatch):
+    def fail(document):
+        routes.enqueue("email", "a@example.com", "body")
+        raise RuntimeError("template error")
+
+    monkeypatch.setattr(routes, "notify_user", fail)
+    with app.app_context():
+        due_at = db.session.get(Document, document_id).next_reminder_at
+        assert send_due_reminders() == 0
+        assert db.session.query(OutboundMessage).count() == 0
+        assert db.session.get(Document, document_id).next_reminder_at == due_at
@@ -0,0 +1,109 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db, storage
+from app.models import Document, User, Vehicle
+from app.storage import get_store
+
+PDF = b"%PDF-1.4\n" + b"0 0 obj << /Type /Page >> endobj\n" * 2000
+JPEG = b"\xff\xd8\xff\xe0" + bytes(range(256)) * 40
+
+
+@pytest.fixture
+def documents(app):
+    # Two documents belonging to a logged-in user; returns their ids.
+    with app.app_context():
+        user = User(username="alice", email="a@example.com", password="x" * 60)
+        truck = Vehicle(name="Truck", vehicle_number="KA-1", owner=user)
+        db.session.add_all([user, truck])
+        db.session.flush()
+        now = datetime.utcnow()
+        docs = [
+            Document(
+                document_type=document_type,
+                serial_number=document_type,
+                start_date=now,
+                end_date=now + timedelta(days=365),
+                vehicle=truck,
+                user_id=user.id,
+            )
+            for document_type in ("Insurance", "Permit")
+        ]
+        db.session.add_all(docs)
+        db.session.commit()
+        return [doc.id for doc in docs]
+
+
+@pytest.fixture
+def client(app, documents):
+    with app.app_context():
+        user_id = db.session.get(Document, documents[0]).user_id
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+    return client
+
+
+def upload(client, document_id, content, filename="scan"):
+    return client.put(f"/profile/documents/{document_id}/file?filename={filename}", data=content)
+
+
+def stored_path(app, digest):
+    with app.app_context():
+        return get_store().locate(digest)[0]
+
+
+def test_upload_stores_the_file_under_its_digest(app, client, documents):
+    response = upload(client, documents[0], PDF, "policy.pdf")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["size"] == len(PDF)
+    assert body["mimetype"] == "application/pdf"
+    with app.app_context():
+        document = db.session.get(Document, documents[0])
+        assert (document.file_path, document.file_name) == (body["sha256"], "policy.pdf")
+        with get_store().open(document.file_path) as f:
+            assert f.read() == PDF
+
+    download = client.get(f"/profile/download_document/{documents[0]}")
+    assert download.status_code == 200
+    assert download.data == PDF
+
+
+def test_unsupported_upload_is_rejected(client, documents):
+    response = upload(client, documents[0], b"plain text")
+    assert response.status_code == 400
+    assert response.get_json()["success"] is False
+
+
+def test_same_content_is_stored_once(app, client, documents):
+    first = upload(client, documents[0], JPEG).get_json()["sha256"]
+    second = upload(client, documents[1], JPEG).get_json()["sha256"]
+    assert first == second
+    path = stored_path(app, first)
+    assert os.listdir(os.path.dirname(path)) == [os.path.basename(path)]
+
+
+@pytest.mark.parametrize("content", [JPEG, PDF], ids=["stored as is", "compressed"])
+def test_range_request_returns_partial_content(client, documents, content):
+    upload(client, documents[0], content)
+    response = client.get(f"/profile/download_document/{documents[0]}", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes 100-199/{len(content)}"
+    assert response.data == content[100:200]
+
+
+def test_delete_keeps_a_file_another_document_uses(app, client, documents, monkeypatch):
+    monkeypatch.setattr(storage, "RELEASE_GRACE_SECONDS", 0)
+    digest = upload(client, documents[0], JPEG).get_json()["sha256"]
+    upload(client, documents[1], JPEG)
+
+    client.post(f"/profile/delete_document/{documents[0]}")
+    assert stored_path(app, digest) is not None
+    assert client.get(f"/profile/download_document/{documents[1]}").data == JPEG
+
+    client.post(f"/profile/delete_document/{documents[1]}")
+    assert stored_path(app, digest) is None